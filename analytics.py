@@ -0,0 +1,242 @@
+"""Call-quality analytics over stored ping history.
+
+analyze() takes the raw samples of a period as (epoch seconds, latency ms or
+None for a lost probe) rows and recomputes, per sample, the RFC 3550 jitter
+and MOS the live view would have shown. It then summarizes loss bursts and
+outages, and averages the series into at most `points` chart points.
+
+Every step is a vectorized NumPy pass. The per-row loop gives the same
+result; it is the reference the tests compare against, the baseline in
+benchmarks/bench_analytics.py, and the fallback when a source checkout lacks
+NumPy. Unlike the live stream, MOS uses the loss over
+the trailing LOSS_WINDOW samples rather than since the probe started.
+"""
+
+import math
+import time
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:  # analyze() falls back to the Python loop
+    np = None
+
+JITTER_GAIN = 1 / 16
+LOSS_WINDOW = 60
+# A loss burst this long (about 5 s at the 1 s ping interval) is an outage
+OUTAGE_MIN_SAMPLES = 5
+SERIES_POINTS = 500
+_EWMA_BLOCK = 256
+
+
+def calculate_mos(latency, loss, jitter):
+    if latency is None:
+        return 1.0
+    eff_latency = latency + (jitter * 2) + 10
+    id_imp = eff_latency / 40 if eff_latency < 160 else (eff_latency - 120) / 10
+    r_factor = max(0, min(94.2, 94.2 - id_imp - (loss * 2.5)))
+    mos = (
+        1
+        + (0.035 * r_factor)
+        + (r_factor * (r_factor - 60) * (100 - r_factor) * 0.000007)
+    )
+    return round(max(1.0, min(5.0, mos)), 2)
+
+
+def _timestamp(epoch):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(epoch))
+
+
+def _round(value):
+    return None if value is None or math.isnan(value) else round(float(value), 2)
+
+
+def _bucket_edges(n, points):
+    step = max(1, math.ceil(n / points))
+    return list(range(0, n, step)) + [n]
+
+
+def _outages(ts, bursts):
+    outages = []
+    for start, end in bursts:
+        if end - start < OUTAGE_MIN_SAMPLES:
+            continue
+        # Ends at the first reply after the burst, or the last loss if ongoing
+        recovered = ts[end] if end < len(ts) else ts[end - 1]
+        outages.append(
+            {
+                "start": _timestamp(ts[start]),
+                "end": _timestamp(recovered),
+                "duration": int(recovered - ts[start]),
+                "lost": int(end - start),
+            }
+        )
+    return outages
+
+
+def _report(ts, n, lost, jitter, mos, lengths, bursts, series):
+    return {
+        "samples": n,
+        "lost": lost,
+        "loss": round(lost / n * 100, 2) if n else 0,
+        "jitter": jitter,
+        "mos": mos,
+        "loss_bursts": {
+            "count": len(lengths),
+            "longest": max(lengths, default=0),
+            "mean_length": round(sum(lengths) / len(lengths), 2) if lengths else 0,
+        },
+        "outages": _outages(ts, bursts),
+        "series": series,
+    }
+
+
+def _ewma(x, gain):
+    """y[i] = (1 - gain) * y[i-1] + gain * x[i], y[-1] = 0, vectorized.
+
+    Within fixed-size blocks the recurrence is a scaled cumulative sum; only
+    the carry between blocks is sequential, one step per block.
+    """
+    a = 1 - gain
+    n = len(x)
+    blocks = np.pad(x, (0, -n % _EWMA_BLOCK)).reshape(-1, _EWMA_BLOCK)
+    k = np.arange(_EWMA_BLOCK)
+    within = gain * a**k * np.cumsum(blocks * a ** (-k), axis=1)
+    carry = np.empty(len(blocks))
+    state, block_decay = 0.0, a**_EWMA_BLOCK
+    for i, end in enumerate(within[:, -1]):
+        carry[i] = state
+        state = block_decay * state + end
+    return (within + carry[:, None] * a ** (k + 1)).ravel()[:n]
+
+
+def _mos_array(latency, loss, jitter):
+    eff_latency = latency + jitter * 2 + 10
+    id_imp = np.where(eff_latency < 160, eff_latency / 40, (eff_latency - 120) / 10)
+    r = np.clip(94.2 - id_imp - loss * 2.5, 0, 94.2)
+    mos = np.clip(1 + 0.035 * r + r * (r - 60) * (100 - r) * 0.000007, 1.0, 5.0)
+    return np.where(np.isnan(latency), 1.0, np.round(mos, 2))
+
+
+def _bucket_means(values, weights, edges):
+    totals = np.add.reduceat(values, edges[:-1])
+    counts = np.add.reduceat(weights, edges[:-1])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return totals / counts
+
+
+def _analyze_numpy(rows, points):
+    data = np.asarray(rows, dtype=float).reshape(-1, 2)
+    ts, latency = data[:, 0], data[:, 1]
+    n = len(ts)
+    lost_mask = np.isnan(latency)
+    received = latency[~lost_mask]
+
+    # Jitter only moves on consecutive replies; losses carry the last value
+    jitter_received = np.zeros(len(received))
+    if len(received) > 1:
+        jitter_received[1:] = _ewma(np.abs(np.diff(received)), JITTER_GAIN)
+    last_reply = np.cumsum(~lost_mask) - 1
+    jitter = np.where(last_reply >= 0, jitter_received[last_reply.clip(0)], 0.0)
+
+    lost_count = np.cumsum(lost_mask)
+    window_lost = lost_count - np.concatenate(
+        (np.zeros(min(n, LOSS_WINDOW)), lost_count[:-LOSS_WINDOW])
+    )
+    window_size = np.minimum(np.arange(1, n + 1), LOSS_WINDOW)
+    mos = _mos_array(latency, window_lost / window_size * 100, jitter)
+
+    edges_flags = np.diff(np.concatenate(([0], lost_mask.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges_flags == 1), np.flatnonzero(edges_flags == -1)
+    lengths = (ends - starts).tolist()
+
+    edges = np.array(_bucket_edges(n, points))
+    replies = (~lost_mask).astype(float)
+    ones = np.ones(n)
+    series = {
+        "timestamp": [_timestamp(t) for t in ts[edges[:-1]]],
+        "latency": [
+            _round(v)
+            for v in _bucket_means(np.where(lost_mask, 0, latency), replies, edges)
+        ],
+        "jitter": [_round(v) for v in _bucket_means(jitter, ones, edges)],
+        "mos": [_round(v) for v in _bucket_means(mos, ones, edges)],
+        "loss": [
+            _round(v * 100) for v in _bucket_means(lost_mask.astype(float), ones, edges)
+        ],
+    }
+    return _report(
+        ts,
+        n,
+        int(lost_mask.sum()),
+        {"mean": _round(jitter.mean()), "max": _round(jitter.max())},
+        {"mean": _round(mos.mean()), "min": _round(mos.min())},
+        lengths,
+        zip(starts.tolist(), ends.tolist()),
+        series,
+    )
+
+
+def _analyze_python(rows, points):
+    ts, latencies, jitters, scores = [], [], [], []
+    bursts, burst_start = [], None
+    jitter, prev, lost_total = 0.0, None, 0
+    window, window_lost = deque(), 0
+    for i, (t, latency) in enumerate(rows):
+        lost = latency is None
+        window.append(lost)
+        window_lost += lost
+        if len(window) > LOSS_WINDOW:
+            window_lost -= window.popleft()
+        if lost:
+            lost_total += 1
+            if burst_start is None:
+                burst_start = i
+        else:
+            if prev is not None:
+                jitter += (abs(latency - prev) - jitter) * JITTER_GAIN
+            prev = latency
+            if burst_start is not None:
+                bursts.append((burst_start, i))
+                burst_start = None
+        ts.append(t)
+        latencies.append(latency)
+        jitters.append(jitter)
+        scores.append(calculate_mos(latency, window_lost / len(window) * 100, jitter))
+    n = len(ts)
+    if burst_start is not None:
+        bursts.append((burst_start, n))
+
+    edges = _bucket_edges(n, points)
+    series = {"timestamp": [], "latency": [], "jitter": [], "mos": [], "loss": []}
+    for lo, hi in zip(edges, edges[1:]):
+        replies = [v for v in latencies[lo:hi] if v is not None]
+        series["timestamp"].append(_timestamp(ts[lo]))
+        series["latency"].append(
+            _round(sum(replies) / len(replies)) if replies else None
+        )
+        series["jitter"].append(_round(sum(jitters[lo:hi]) / (hi - lo)))
+        series["mos"].append(_round(sum(scores[lo:hi]) / (hi - lo)))
+        series["loss"].append(_round((hi - lo - len(replies)) / (hi - lo) * 100))
+    return _report(
+        ts,
+        n,
+        lost_total,
+        {"mean": _round(sum(jitters) / n), "max": _round(max(jitters))},
+        {"mean": _round(sum(scores) / n), "min": _round(min(scores))},
+        [end - start for start, end in bursts],
+        bursts,
+        series,
+    )
+
+
+def analyze(rows, points=SERIES_POINTS, use_numpy=True):
+    """Analyze (epoch seconds, latency or None) rows in time order.
+
+    rows may also be an (n, 2) float array with NaN for lost probes.
+    """
+    if len(rows) == 0:
+        return None
+    if use_numpy and np is not None:
+        return _analyze_numpy(rows, points)
+    return _analyze_python(rows, points)
@@ -2,63 +2,68 @@ import eventlet
 
 eventlet.monkey_patch()
 
+import analytics
 import database
+import emitter
+import gc
+import greenlet
+import hub
+from analytics import calculate_mos
+import icmp_engine
+import ip_info
+import ipc
+import latency_sketch
+import metrics
+import ping_parser
+import profiling
+from ip_info import get_ip_info, get_ip_info_async, ip_info_cache
+import retention
+import scheduler
+import atexit
+import signal
+import socket
 import subprocess
+import sys
+import time
 import re
 import threading
 import csv
 import io
+import itertools
 import os
-import requests
-from flask import Flask, render_template, request, jsonify, make_response
-from flask_socketio import SocketIO, emit
-
-ip_info_cache = {}
-
-
-def get_ip_info(ip):
-    if not ip or ip == "*":
-        return {"isp": "-", "location": "-"}
-    if ip in ip_info_cache:
-        return ip_info_cache[ip]
-    if (
-        ip.startswith("10.")
-        or ip.startswith("192.168.")
-        or (ip.startswith("172.") and 16 <= int(ip.split(".")[1]) <= 31)
-    ):
-        info = {"isp": "Local Network", "location": "Private IP"}
-    else:
-        try:
-            resp = requests.get(f"http://ip-api.com/json/{ip}", timeout=2)
-            data = resp.json()
-            if data.get("status") == "success":
-                info = {
-                    "isp": data.get("isp", "Unknown ISP"),
-                    "location": f"{data.get('city', '')}, {data.get('countryCode', '')}".strip(
-                        ", "
-                    ),
-                }
-            else:
-                info = {"isp": "Unknown ISP", "location": "Unknown"}
-        except Exception as e:
-            print(f"Error looking up IP {ip}: {e}")
-            info = {"isp": "Unknown ISP", "location": "Unknown"}
-    ip_info_cache[ip] = info
-    return info
-
-
-def calculate_mos(latency, loss, jitter):
-    if latency is None:
-        return 1.0
-    eff_latency = latency + (jitter * 2) + 10
-    id_imp = eff_latency / 40 if eff_latency < 160 else (eff_latency - 120) / 10
-    r_factor = max(0, min(94.2, 94.2 - id_imp - (loss * 2.5)))
-    mos = (
-        1
-        + (0.035 * r_factor)
-        + (r_factor * (r_factor - 60) * (100 - r_factor) * 0.000007)
-    )
-    return round(max(1.0, min(5.0, mos)), 2)
+from datetime import datetime, timezone
+from flask import Flask, Response, render_template, request, jsonify
+from flask_socketio import SocketIO, emit, join_room, leave_room
+
+# "auto" uses the in-process ICMP engine when the kernel allows it,
+# "icmp" requires it, "subprocess" always runs /usr/bin/ping.
+PROBE_ENGINE = os.environ.get("PACKET_TESTER_PROBE_ENGINE", "auto")
+PING_INTERVAL = 1.0
+
+# Per-hop probing: echoes per hop per cycle, spacing between them, how many
+# hops of one target are probed at once, and the pause between cycles.
+HOP_PROBE_COUNT = int(os.environ.get("PACKET_TESTER_HOP_PROBE_COUNT", "3"))
+HOP_PROBE_INTERVAL = float(os.environ.get("PACKET_TESTER_HOP_PROBE_INTERVAL", "0.2"))
+HOP_PROBE_CONCURRENCY = int(os.environ.get("PACKET_TESTER_HOP_PROBE_CONCURRENCY", "8"))
+HOP_REFRESH_INTERVAL = float(os.environ.get("PACKET_TESTER_HOP_REFRESH_INTERVAL", "5"))
+TRACEPATH_MAX_HOPS = 15
+# Route verification: every PATH_CHECK_INTERVAL seconds each recorded hop's TTL
+# gets one ping; tracepath only runs again when a different hop answers.
+# 0 disables the checks.
+PATH_CHECK_INTERVAL = float(os.environ.get("PACKET_TESTER_PATH_CHECK_INTERVAL", "60"))
+
+# Collector mode: every active target in the database is probed from startup,
+# browser or not. Newly found targets are started spread across the stagger
+# window rather than all in the same second.
+COLLECTOR_MODE = os.environ.get("PACKET_TESTER_COLLECTOR", "0") == "1"
+COLLECTOR_STAGGER = float(os.environ.get("PACKET_TESTER_COLLECTOR_STAGGER", "10"))
+COLLECTOR_SYNC_INTERVAL = float(
+    os.environ.get("PACKET_TESTER_COLLECTOR_SYNC_INTERVAL", "30")
+)
+# Multi-process layout: --workers N runs one collector (--collector), which
+# owns every probe, plus N web workers (--web) sharing port 5000 through
+# SO_REUSEPORT. Results reach the workers over the ipc.IPC_SOCKET channel.
+WEB_WORKERS = int(os.environ.get("PACKET_TESTER_WEB_WORKERS", "0"))
 
 
 app = Flask(
@@ -79,16 +84,46 @@ try:
 except Exception as e:
     print(f"CRITICAL ERROR: Failed to initialize database: {e}")
 
+# One probe per target, shared by every session watching it. active_tasks maps
+# target -> that probe's process handles, subscribers maps target -> sids, and
+# latest_results keeps the last ping/hop payloads to replay to late joiners.
 active_tasks = {}
+subscribers = {}
+latest_results = {}
+# Targets the collector keeps probing with or without subscribers. In
+# collector mode these are the database's active targets; sessions only
+# subscribe to their results.
+pinned = set()
+# Set at startup when unprivileged ICMP sockets are usable; None means each
+# target gets its own ping subprocess.
+probe_engine = None
+retention_engine = retention.RetentionEngine()
+# Rolling p50/p95/p99 per target id, checkpointed to the database
+sketches = latency_sketch.SketchStore()
+# Warns when something keeps the event loop from switching greenlets
+stall_monitor = hub.StallMonitor()
+# Preallocated per-target and internal metrics for /metrics
+probe_metrics = metrics.Registry()
+# Global cap on probes in flight and packets per second, fair across targets
+probe_scheduler = scheduler.ProbeScheduler()
+# Opt-in per-stage timings of the probe loops, see /api/debug/stages
+stage_timers = profiling.StageTimers()
+stage = stage_timers.stage
+# Ping/hop updates reach clients as one coalesced "batch" frame per tick
+frames = emitter.FrameEmitter(socketio, stage=stage)
+# Set in the collector process when it serves web workers
+ipc_server = None
+# Set in web worker processes; they never probe themselves
+ipc_client = None
+# Collector side: target -> IPC connections of workers with a viewer on it
+remote_watchers = {}
 
 
 @app.route("/api/health")
 def health():
     db_status = "OK"
     try:
-        conn = database.get_db()
-        conn.execute("SELECT 1").fetchone()
-        conn.close()
+        database.check_connection()
     except Exception as e:
         db_status = f"Error: {e}"
 
@@ -107,6 +142,22 @@ def health():
             "status": "up",
             "database": db_status,
             "db_path": database.DB_PATH,
+            "writer": database.get_writer_stats(),
+            "hub": dict(stall_monitor.stats(), blocking=hub.pool_stats()),
+            "retention": retention_engine.last_report,
+            "ip_info_cache": ip_info_cache.stats(),
+            "emitter": frames.stats(),
+            "scheduler": {
+                k: v for k, v in probe_scheduler.stats().items() if k != "targets"
+            },
+            "ipc": (
+                ipc_server.stats()
+                if ipc_server
+                else {"connected": ipc_client.connected} if ipc_client else None
+            ),
+            "ip_dataset_ranges": (
+                len(ip_info.offline_resolver) if ip_info.offline_resolver else None
+            ),
             "static_folder": app.static_folder,
             "static_files": static_files,
             "cwd": os.getcwd(),
@@ -116,15 +167,121 @@ def health():
 
 
 def parse_ping(line):
-    match = re.search(r"time=([\d\.]+) ms", line)
-    return float(match.group(1)) if match else None
+    parsed = ping_parser.parse(line)
+    return parsed.rtt if parsed is not None else None
+
+
+class PingStats:
+    """Running loss and RFC 3550-style jitter for one ping stream."""
+
+    def __init__(self):
+        self.total_sent = 0
+        self.total_received = 0
+        self.prev_latency = None
+        self.jitter = 0
+
+    def record(self, latency, received=True):
+        self.total_sent += 1
+        if received:
+            self.total_received += 1
+            if latency is not None and self.prev_latency is not None:
+                self.jitter = (
+                    self.jitter + (abs(latency - self.prev_latency) - self.jitter) / 16
+                )
+            self.prev_latency = latency
+
+    @property
+    def loss(self):
+        return ((self.total_sent - self.total_received) / self.total_sent) * 100
+
+
+def target_room(target):
+    return f"target:{target}"
+
+
+def publish_ping(target, target_id, stats, latency, raw, timestamp=None):
+    loss = stats.loss
+    with stage("mos"):
+        mos = calculate_mos(latency, loss, stats.jitter)
+    with stage("save"):
+        database.save_ping(target_id, latency, round(loss, 2), timestamp)
+    with stage("sketch"):
+        sketch = sketches.record(target_id, latency)
+    payload = {
+        "target": target,
+        "latency": latency,
+        "loss": round(loss, 2),
+        "jitter": round(stats.jitter, 2),
+        "mos": mos,
+        "total_sent": stats.total_sent,
+        "total_received": stats.total_received,
+        "percentiles": sketch.summary(),
+        "raw": raw,
+    }
+    with stage("deliver"):
+        deliver("ping", target, target, payload)
+
+
+def publish_hop(target, payload):
+    deliver("hop", target, payload["ip"], payload)
+
+
+def deliver(kind, target, key, payload):
+    """Hand a ping/hop result to local sessions and any web workers."""
+    latest = latest_results.setdefault(target, {"hops": {}})
+    if kind == "ping":
+        latest["ping"] = payload
+        probe_metrics.observe_ping(
+            target,
+            payload["latency"],
+            payload["loss"],
+            payload["jitter"],
+            payload["mos"],
+        )
+    else:
+        latest["hops"][key] = payload
+    frames.publish(subscribers.get(target, ()), kind, target, key, payload)
+    if ipc_server is not None:
+        ipc_server.publish(ipc_result(kind, target, key, payload))
+
+
+def ipc_result(kind, target, key, payload):
+    return {"type": kind, "target": target, "key": key, "payload": payload}
+
+
+def publish_error(target, message):
+    socketio.emit("error", {"message": message}, to=target_room(target))
+    if ipc_server is not None:
+        ipc_server.publish({"type": "error", "target": target, "message": message})
+
+
+def run_ping(target):
+    if probe_engine is not None and not probe_engine.failed:
+        if not run_ping_icmp(target):
+            return
+        print(f"ICMP engine failed, falling back to ping for {target}")
+    # A ping -i 1 process runs until stopped: it reserves its packet rate
+    # rather than holding one of the slots the short probes share
+    pps = 1 / PING_INTERVAL
+    if not probe_scheduler.reserve(pps):
+        print(f"Probe rate budget exhausted, not starting ping for {target}")
+        publish_error(
+            target,
+            "Probe rate budget exhausted; raise PACKET_TESTER_PROBE_RATE",
+        )
+        return
+    try:
+        run_ping_process(target)
+    finally:
+        probe_scheduler.unreserve(pps)
 
 
-def run_ping(target, sid):
+def run_ping_process(target):
     try:
         target_id = database.get_or_create_target(target)
         process = subprocess.Popen(
-            ["/usr/bin/ping", "-i", "1", target],
+            # -D: timestamp each line; -O: report a missing reply before the next send
+            ["/usr/bin/ping", "-D", "-O", "-i", "1", target],
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
@@ -133,155 +290,392 @@ def run_ping(target, sid):
         eventlet.sleep(0.5)
         if process.poll() is not None and "Mock" not in str(type(process)):
             stderr_out = process.stdout.read()
-            socketio.emit("error", {"message": f"Ping failed: {stderr_out}"}, to=sid)
+            publish_error(target, f"Ping failed: {stderr_out}")
             return
     except Exception as e:
-        socketio.emit("error", {"message": f"Failed to start ping: {e}"}, to=sid)
+        publish_error(target, f"Failed to start ping: {e}")
         return
 
-    if sid not in active_tasks:
+    probe = active_tasks.get(target)
+    if probe is None:
         process.terminate()
         return
-    active_tasks[sid].setdefault(target, {})["ping"] = process
+    probe["ping"] = process
 
-    total_sent, total_received, prev_latency, jitter = 0, 0, None, 0
+    stats = PingStats()
+    sequence = ping_parser.SequenceTracker()
     try:
         for line in iter(process.stdout.readline, ""):
-            if sid not in active_tasks or target not in active_tasks[sid]:
+            probe_metrics.lines_parsed += 1
+            if active_tasks.get(target) is not probe:
                 process.terminate()
                 break
-            if "64 bytes from" in line:
-                total_sent += 1
-                total_received += 1
-                latency = parse_ping(line)
-                if prev_latency is not None:
-                    jitter = jitter + (abs(latency - prev_latency) - jitter) / 16
-                prev_latency = latency
-                loss = ((total_sent - total_received) / total_sent) * 100
-                mos = calculate_mos(latency, loss, jitter)
-                database.save_ping(target_id, latency, round(loss, 2))
-                socketio.emit(
-                    "ping_result",
-                    {
-                        "target": target,
-                        "latency": latency,
-                        "loss": round(loss, 2),
-                        "jitter": round(jitter, 2),
-                        "mos": mos,
-                        "total_sent": total_sent,
-                        "total_received": total_received,
-                        "raw": line.strip(),
-                    },
-                    to=sid,
-                )
-            elif any(
-                x in line.lower() for x in ["timeout", "request timeout", "no answer"]
-            ):
-                total_sent += 1
-                loss = ((total_sent - total_received) / total_sent) * 100
-                mos = calculate_mos(None, loss, jitter)
-                database.save_ping(target_id, None, round(loss, 2))
-                socketio.emit(
-                    "ping_result",
-                    {
-                        "target": target,
-                        "latency": None,
-                        "loss": round(loss, 2),
-                        "jitter": round(jitter, 2),
-                        "mos": mos,
-                        "total_sent": total_sent,
-                        "total_received": total_received,
-                        "raw": "Request timeout",
-                    },
-                    to=sid,
+            with stage("parse"):
+                parsed = ping_parser.parse(line)
+            if parsed is None:
+                continue
+            missed = sequence.advance(parsed.seq)
+            if missed is None:
+                continue  # duplicate or late reply, already counted
+            stamp = parsed.timestamp or time.time()
+            # Probes that printed nothing at all, one per PING_INTERVAL before this
+            for i in range(missed, 0, -1):
+                stats.record(None, received=False)
+                publish_ping(
+                    target,
+                    target_id,
+                    stats,
+                    None,
+                    "Request timeout",
+                    stamp - i * PING_INTERVAL,
                 )
+            if parsed.kind == ping_parser.REPLY:
+                stats.record(parsed.rtt)
+                publish_ping(target, target_id, stats, parsed.rtt, line.strip(), stamp)
+            else:
+                stats.record(None, received=False)
+                publish_ping(target, target_id, stats, None, "Request timeout", stamp)
     except Exception as e:
         print(f"ERROR in ping loop: {e}")
     finally:
         process.wait()
 
 
-def run_hop_analysis(target, sid):
+class IcmpTask:
+    """Stands in for the ping Popen in active_tasks so stop_target_tasks works."""
+
+    def __init__(self):
+        self.stopped = False
+
+    def terminate(self):
+        self.stopped = True
+
+
+def run_ping_icmp(target):
+    """Probe over the ICMP engine; True if the engine failed while running."""
     try:
         target_id = database.get_or_create_target(target)
-        process = subprocess.Popen(
-            ["/usr/bin/tracepath", "-n", "-m", "15", target],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-        )
+        family, address = probe_engine.resolve(target)
     except Exception as e:
+        publish_error(target, f"Failed to start ping: {e}")
+        return
+
+    probe = active_tasks.get(target)
+    if probe is None:
         return
-    hops = []
+    task = IcmpTask()
+    probe["ping"] = task
+
+    stats = PingStats()
+    next_send = time.monotonic()
     try:
-        for line in iter(process.stdout.readline, ""):
-            if sid not in active_tasks or target not in active_tasks[sid]:
-                process.terminate()
+        while not task.stopped:
+            if active_tasks.get(target) is not probe:
                 break
-            match = re.search(r"^\s*(\d+):\s+([a-fA-F\d\.:]+)", line)
-            if match:
+            if probe_engine.failed:
+                # Hand the target over to a ping process
+                return True
+            with probe_scheduler.slot(target), stage("icmp_probe"):
+                result = probe_engine.probe(address, family)
+            if result is not None:
+                latency = result["rtt_ms"]
+                stats.record(latency)
+                raw = (
+                    f"{result['bytes']} bytes from {address}: icmp_seq={result['seq']}"
+                    f" ttl={result['ttl']} time={latency} ms"
+                )
+                publish_ping(
+                    target, target_id, stats, latency, raw, result["received_at"]
+                )
+            else:
+                stats.record(None, received=False)
+                publish_ping(target, target_id, stats, None, "Request timeout")
+            # Fixed 1 s cadence like ping -i 1, independent of the reply time
+            next_send += PING_INTERVAL
+            eventlet.sleep(max(0, next_send - time.monotonic()))
+    except Exception as e:
+        print(f"ERROR in ICMP ping loop: {e}")
+
+
+def probe_hop(target, ip):
+    """Send HOP_PROBE_COUNT echoes to one hop; returns (sent, latencies, received)."""
+    with probe_scheduler.slot(target, HOP_PROBE_COUNT):
+        return send_hop_probes(ip)
+
+
+def send_hop_probes(ip):
+    family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+    # Hosts without IPv6 ICMP sockets still probe IPv6 hops with ping
+    if probe_engine is not None and probe_engine.supports(family):
+        lats = []
+        for i in range(HOP_PROBE_COUNT):
+            if i:
+                eventlet.sleep(HOP_PROBE_INTERVAL)
+            result = probe_engine.probe(ip, family)
+            if result is not None:
+                lats.append(result["rtt_ms"])
+        return HOP_PROBE_COUNT, lats, len(lats)
+
+    ping_proc = subprocess.run(
+        [
+            "/usr/bin/ping",
+            "-c",
+            str(HOP_PROBE_COUNT),
+            "-i",
+            str(HOP_PROBE_INTERVAL),
+            "-W",
+            "1",
+            ip,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    received, lats = 0, []
+    for line in ping_proc.stdout.split("\n"):
+        if "bytes from" in line:
+            received += 1
+            m = re.search(r"time=([\d\.]+)", line)
+            if m:
+                lats.append(float(m.group(1)))
+    return HOP_PROBE_COUNT, lats, received
+
+
+def enrich_hop(target, probe, hop, info):
+    hop.update(info)
+    if active_tasks.get(target) is not probe:
+        return
+    latest = latest_results.get(target, {}).get("hops", {}).get(hop["ip"], {})
+    payload = {
+        "target": target,
+        "num": hop["num"],
+        "ip": hop["ip"],
+        "loss": latest.get("loss", 0),
+        "avg_latency": latest.get("avg_latency", 0),
+    }
+    payload.update(info)
+    publish_hop(target, payload)
+
+
+def discover_path(target, probe, known=None):
+    """Run tracepath once, publishing each hop as soon as it appears.
+
+    Hops already in `known` (ip -> hop) keep their lookup results and are
+    only republished if their TTL moved. Returns the hop list, or None if
+    tracepath could not start or the target was stopped meanwhile.
+    """
+    known = known or {}
+    # tracepath holds a slot, charged its maximum hop count, until it exits
+    probe_scheduler.acquire(target, TRACEPATH_MAX_HOPS)
+    trace_started = time.perf_counter_ns()
+    try:
+        try:
+            process = subprocess.Popen(
+                ["/usr/bin/tracepath", "-n", "-m", str(TRACEPATH_MAX_HOPS), target],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+            )
+        except Exception as e:
+            return None
+        probe["tracepath"] = process
+        hops = []
+        try:
+            for line in iter(process.stdout.readline, ""):
+                probe_metrics.lines_parsed += 1
+                if active_tasks.get(target) is not probe:
+                    process.terminate()
+                    return None
+                match = re.search(r"^\s*(\d+):\s+([a-fA-F\d\.:]+)", line)
+                if not match:
+                    continue
                 hop_num, hop_ip = match.group(1), match.group(2)
-                if hop_ip not in [h["ip"] for h in hops]:
-                    info = get_ip_info(hop_ip)
-                    hops.append({"num": hop_num, "ip": hop_ip, **info})
-                    socketio.emit(
-                        "hop_update",
-                        {
-                            "target": target,
-                            "num": hop_num,
-                            "ip": hop_ip,
-                            "isp": info["isp"],
-                            "location": info["location"],
-                            "loss": 0,
-                            "avg_latency": 0,
-                        },
-                        to=sid,
+                if hop_ip in [h["ip"] for h in hops]:
+                    continue
+                previous = known.get(hop_ip)
+                if previous is not None:
+                    hop = dict(previous, num=hop_num)
+                    hops.append(hop)
+                    if previous["num"] != hop_num:
+                        latest = latest_results.get(target, {}).get("hops", {})
+                        publish_hop(
+                            target, dict(latest.get(hop_ip, {}), **hop, target=target)
+                        )
+                    continue
+                # Emit the hop straight away; ISP/location follow when the
+                # lookup completes instead of stalling discovery
+                hop = {"num": hop_num, "ip": hop_ip}
+                hop.update(
+                    get_ip_info_async(
+                        hop_ip,
+                        lambda info, hop=hop: enrich_hop(target, probe, hop, info),
                     )
-        while sid in active_tasks and target in active_tasks[sid]:
-            for hop in hops:
-                if sid not in active_tasks or target not in active_tasks[sid]:
-                    break
-                ping_proc = subprocess.run(
-                    ["/usr/bin/ping", "-c", "3", "-W", "1", hop["ip"]],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    text=True,
                 )
-                sent, received, lats = 3, 0, []
-                for line in ping_proc.stdout.split("\n"):
-                    if "bytes from" in line:
-                        received += 1
-                        m = re.search(r"time=([\d\.]+)", line)
-                        if m:
-                            lats.append(float(m.group(1)))
-                loss = ((sent - received) / sent) * 100
-                avg_lat = sum(lats) / len(lats) if lats else 0
-                database.save_hop(
-                    target_id,
-                    int(hop["num"]),
-                    hop["ip"],
-                    round(avg_lat, 2),
-                    round(loss, 2),
-                )
-                socketio.emit(
-                    "hop_update",
+                hops.append(hop)
+                publish_hop(
+                    target,
                     {
                         "target": target,
-                        "num": hop["num"],
-                        "ip": hop["ip"],
-                        "isp": hop.get("isp", "-"),
-                        "location": hop.get("location", "-"),
-                        "loss": round(loss, 2),
-                        "avg_latency": round(avg_lat, 2),
+                        "num": hop_num,
+                        "ip": hop_ip,
+                        "isp": hop["isp"],
+                        "location": hop["location"],
+                        "loss": 0,
+                        "avg_latency": 0,
                     },
-                    to=sid,
                 )
-            eventlet.sleep(5)
+        finally:
+            process.wait()
+        stage_timers.record("tracepath", trace_started)
+        return hops
+    finally:
+        probe_scheduler.release()
+
+
+def probe_ttl(target, ttl):
+    """(ip, reached_target) for whoever answers one echo sent with `ttl`."""
+    with probe_scheduler.slot(target):
+        result = subprocess.run(
+            [
+                "/usr/bin/ping",
+                "-n",
+                "-c",
+                "1",
+                "-t",
+                str(ttl),
+                "-W",
+                "1",
+                target,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+        )
+    return ping_parser.responder(result.stdout)
+
+
+def route_of(hops):
+    return [(int(hop["num"]), hop["ip"]) for hop in hops]
+
+
+def path_diverged(target, hops):
+    """Whether one probe per recorded TTL finds a hop other than the recorded one.
+
+    Silent TTLs prove nothing (routers rate-limit time-exceeded replies), so
+    only a different responder, or the target answering early, counts.
+    """
+    expected = dict(route_of(hops))
+    if not expected:
+        return True  # nothing to compare against; look again
+    last = max(expected)
+    ttls = range(1, last + 1)
+    pool = eventlet.GreenPool(HOP_PROBE_CONCURRENCY)
+    for ttl, answer in zip(ttls, list(pool.imap(lambda t: probe_ttl(target, t), ttls))):
+        if answer is None:
+            continue
+        ip, reached = answer
+        if (reached and ttl < last) or (ttl in expected and ip != expected[ttl]):
+            return True
+    return False
+
+
+def track_path(target, target_id, hops):
+    """Record the route; on a change, tell the target's sessions."""
+    route = route_of(hops)
+    previous = database.record_path(target_id, route)
+    if previous is None:
+        return
+    probe_metrics.path_changes += 1
+    publish_path_change(
+        target,
+        {
+            "target": target,
+            "at": time.time(),
+            "hops": [{"ttl": ttl, "ip": ip} for ttl, ip in route],
+            "changes": database.path_changes(previous, route),
+        },
+    )
+
+
+def publish_path_change(target, event):
+    apply_path_change(target, event)
+    if ipc_server is not None:
+        ipc_server.publish({"type": "path_change", "target": target, "event": event})
+
+
+def apply_path_change(target, event):
+    # Hops that left the route would otherwise be replayed to late joiners
+    current = {hop["ip"] for hop in event["hops"]}
+    hops = latest_results.get(target, {}).get("hops", {})
+    for ip in [ip for ip in hops if ip not in current]:
+        del hops[ip]
+    socketio.emit("path_change", event, to=target_room(target))
+
+
+def run_hop_analysis(target):
+    try:
+        target_id = database.get_or_create_target(target)
+    except Exception as e:
+        return
+    probe = active_tasks.get(target)
+    if probe is None:
+        return
+    try:
+        hops = discover_path(target, probe)
+        if hops is None:
+            return
+        track_path(target, target_id, hops)
+        pool = eventlet.GreenPool(HOP_PROBE_CONCURRENCY)
+
+        def probe_if_running(hop):
+            if active_tasks.get(target) is not probe:
+                return None
+            with stage("hop_probe"):
+                return probe_hop(target, hop["ip"])
+
+        next_check = time.monotonic() + PATH_CHECK_INTERVAL
+        while active_tasks.get(target) is probe:
+            # All hops are probed concurrently, so a cycle takes about one
+            # probe window rather than the sum of them
+            for hop, result in zip(hops, pool.imap(probe_if_running, hops)):
+                if result is None:
+                    continue
+                sent, lats, received = result
+                loss = ((sent - received) / sent) * 100
+                avg_lat = sum(lats) / len(lats) if lats else 0
+                with stage("hop_save"):
+                    database.save_hop(
+                        target_id,
+                        int(hop["num"]),
+                        hop["ip"],
+                        round(avg_lat, 2),
+                        round(loss, 2),
+                    )
+                with stage("hop_deliver"):
+                    publish_hop(
+                        target,
+                        {
+                            "target": target,
+                            "num": hop["num"],
+                            "ip": hop["ip"],
+                            "isp": hop.get("isp", "-"),
+                            "location": hop.get("location", "-"),
+                            "loss": round(loss, 2),
+                            "avg_latency": round(avg_lat, 2),
+                        },
+                    )
+            if PATH_CHECK_INTERVAL and time.monotonic() >= next_check:
+                with stage("path_check"):
+                    diverged = path_diverged(target, hops)
+                if diverged and active_tasks.get(target) is probe:
+                    known = {hop["ip"]: hop for hop in hops}
+                    hops = discover_path(target, probe, known) or hops
+                track_path(target, target_id, hops)
+                next_check = time.monotonic() + PATH_CHECK_INTERVAL
+            eventlet.sleep(HOP_REFRESH_INTERVAL)
     except Exception as e:
         print(f"ERROR in hop analysis: {e}")
-    finally:
-        process.wait()
 
 
 @app.route("/")
@@ -291,10 +685,28 @@ def index():
 
 @app.route("/api/history/<path:target>")
 def get_history(target):
-    history = database.get_history(target, request.args.get("hours", 24, type=int))
+    try:
+        history = database.get_history(
+            target,
+            request.args.get("hours", 24, type=int),
+            request.args.get("resolution", "auto"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(history)
 
 
+@app.route("/api/paths/<path:target>")
+def get_path_history(target):
+    """Routes the target's probes took, oldest first, with what changed."""
+    hours = request.args.get("hours", 24 * 7, type=int)
+    if hours <= 0:
+        return jsonify({"error": "hours must be positive"}), 400
+    return jsonify(
+        {"target": target, "paths": database.get_path_history(target, hours)}
+    )
+
+
 @app.route("/api/active-targets")
 def get_active_targets():
     return jsonify(database.get_active_targets())
@@ -302,25 +714,450 @@ def get_active_targets():
 
 @app.route("/api/clear-history/<path:target>", methods=["POST"])
 def clear_history(target):
+    target_id = database.get_target_id(target)
     database.clear_target_history(target)
+    if target_id is not None:
+        sketches.reset(target_id)
+    if ipc_client is not None:
+        ipc_client.send({"type": "reset", "target": target})
     return jsonify({"status": "success"})
 
 
+@app.route("/api/analytics/<path:target>")
+def get_analytics(target):
+    target_id = database.get_target_id(target)
+    if target_id is None:
+        return jsonify({"error": f"Unknown target {target}"}), 404
+    points = request.args.get("points", analytics.SERIES_POINTS, type=int)
+    if points < 1:
+        return jsonify({"error": "points must be positive"}), 400
+    # Raw samples older than the retention window are gone anyway
+    hours = min(
+        request.args.get("hours", 24, type=int), retention.RAW_RETENTION_DAYS * 24
+    )
+    samples = database.get_samples(target_id, hours)
+    # A week at 1 Hz is ~600k samples: too much work for the hub thread
+    report = hub.call(analytics.analyze, samples, points)
+    return jsonify(report or {"samples": 0})
+
+
+@app.route("/api/stats/<path:target>")
+def get_stats(target):
+    target_id = database.get_target_id(target)
+    if target_id is None:
+        return jsonify({"error": f"Unknown target {target}"}), 404
+    # Running targets answer from memory, others from their last checkpoint
+    sketch = sketches.get(target_id, cache=target in active_tasks)
+    stats = {
+        "target": target,
+        "precision": latency_sketch.PRECISION,
+        "slot_seconds": latency_sketch.SLOT_SECONDS,
+        "windows": sketch.summary(),
+    }
+    window = request.args.get("histogram")
+    if window:
+        if window not in latency_sketch.WINDOWS:
+            return jsonify({"error": f"Unknown window {window}"}), 400
+        stats["histogram"] = sketch.windows[window].buckets()
+    return jsonify(stats)
+
+
+def count_greenlets():
+    # Walks the heap, so only done at scrape time
+    return sum(isinstance(o, greenlet.greenlet) for o in gc.get_objects())
+
+
+def writer_metric(read):
+    writer = database.get_writer()
+    return read(writer) if writer is not None else None
+
+
+def register_metrics(registry):
+    stat = registry.register
+    stat(
+        "ping_lines_parsed_total",
+        "counter",
+        "Lines read from ping and tracepath output",
+        lambda: registry.lines_parsed,
+    )
+    stat(
+        "path_changes_total",
+        "counter",
+        "Route changes confirmed by tracepath",
+        lambda: registry.path_changes,
+    )
+    stat(
+        "db_insert_seconds",
+        "histogram",
+        "Time to write one batch of samples",
+        lambda: writer_metric(lambda w: w.flush_seconds),
+    )
+    stat(
+        "db_batch_rows",
+        "histogram",
+        "Rows per sample batch",
+        lambda: writer_metric(lambda w: w.batch_rows),
+    )
+    stat(
+        "db_queue_rows",
+        "gauge",
+        "Samples waiting for the writer",
+        lambda: writer_metric(lambda w: w.queue_depth()),
+    )
+    stat(
+        "db_dropped_rows_total",
+        "counter",
+        "Samples dropped because the writer queue was full",
+        lambda: writer_metric(lambda w: w.dropped),
+    )
+    stat(
+        "db_write_errors_total",
+        "counter",
+        "Failed sample batch writes",
+        lambda: writer_metric(lambda w: w.errors),
+    )
+    stat("emit_frames_total", "counter", "Batch frames sent", lambda: frames.frames)
+    stat(
+        "emit_bytes_total",
+        "counter",
+        "Batch frame bytes sent (with PACKET_TESTER_EMIT_MEASURE_BYTES=1)",
+        lambda: frames.bytes if frames.measure_bytes else None,
+    )
+    stat(
+        "emit_sessions",
+        "gauge",
+        "Connected dashboard sessions",
+        lambda: len(frames.sessions),
+    )
+    stat("probe_targets", "gauge", "Targets being probed", lambda: len(active_tasks))
+    stat(
+        "probes_in_flight",
+        "gauge",
+        "Probe sockets and processes holding a scheduler slot",
+        lambda: probe_scheduler.active,
+    )
+    stat(
+        "probe_streams",
+        "gauge",
+        "Long-running ping processes holding a rate reservation",
+        lambda: probe_scheduler.streams,
+    )
+    stat(
+        "probes_queued",
+        "gauge",
+        "Probes waiting for a scheduler slot",
+        lambda: sum(len(w) for w in probe_scheduler.queues.values()),
+    )
+    stat(
+        "ip_cache_hits_total",
+        "counter",
+        "IP metadata cache hits",
+        lambda: ip_info_cache.hits,
+    )
+    stat(
+        "ip_cache_misses_total",
+        "counter",
+        "IP metadata cache misses",
+        lambda: ip_info_cache.misses,
+    )
+    stat(
+        "ip_cache_hit_ratio",
+        "gauge",
+        "IP metadata cache hit rate",
+        lambda: ip_info_cache.stats()["hit_rate"],
+    )
+    stat("greenlets", "gauge", "Live greenlets", count_greenlets)
+    stat(
+        "event_loop_stalls_total",
+        "counter",
+        "Event loop stalls above the threshold",
+        lambda: stall_monitor.stalls,
+    )
+    stat(
+        "event_loop_max_lag_seconds",
+        "gauge",
+        "Largest event loop lag seen",
+        lambda: stall_monitor.max_lag_ms / 1000,
+    )
+
+
+register_metrics(probe_metrics)
+
+
+@app.route("/metrics")
+def get_metrics():
+    return Response(probe_metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.route("/api/debug/stages", methods=["GET", "POST"])
+def debug_stages():
+    if request.method == "POST":
+        body = request.get_json(silent=True) or {}
+        if "enabled" in body:
+            stage_timers.enabled = bool(body["enabled"])
+        if body.get("reset"):
+            stage_timers.reset()
+    return jsonify(stage_timers.summary())
+
+
+# One capture at a time; each holds a native thread for its duration
+profile_capture = eventlet.semaphore.Semaphore(1)
+
+
+@app.route("/api/debug/profile")
+def debug_profile():
+    seconds = request.args.get("seconds", 30, type=float)
+    if not 0 < seconds <= profiling.MAX_CAPTURE_SECONDS:
+        return (
+            jsonify(
+                {"error": f"seconds must be in (0, {profiling.MAX_CAPTURE_SECONDS}]"}
+            ),
+            400,
+        )
+    interval = request.args.get("interval", profiling.SAMPLE_INTERVAL, type=float)
+    if not profile_capture.acquire(blocking=False):
+        return jsonify({"error": "A capture is already running"}), 409
+    try:
+        stacks, samples = hub.call(
+            profiling.sample_stacks, hub.hub_thread, seconds, interval
+        )
+    finally:
+        profile_capture.release()
+    if request.args.get("format") == "json":
+        return jsonify(
+            {
+                "seconds": seconds,
+                "interval": interval,
+                "samples": samples,
+                "top": profiling.top_functions(stacks),
+            }
+        )
+    return Response(
+        profiling.folded(stacks),
+        content_type="text/plain",
+        headers={"Content-Disposition": "attachment; filename=profile.folded"},
+    )
+
+
+@app.route("/api/scheduler")
+def get_scheduler():
+    return jsonify(probe_scheduler.stats())
+
+
+EXPORT_FIELDS = ["timestamp", "latency", "loss", "hop_num", "ip"]
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+
+def parse_time_arg(value):
+    """Normalise an ISO-8601 query argument to the UTC format stored in SQLite."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
 @app.route("/api/export-csv/<path:target>")
 def export_csv(target):
-    data = database.get_raw_data(target)
-    if not data:
+    try:
+        start = parse_time_arg(request.args.get("start"))
+        end = parse_time_arg(request.args.get("end"))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid start/end: {e}"}), 400
+    include_hops = request.args.get("hops", "1") != "0"
+
+    rows = database.iter_export_rows(target, start, end, include_hops)
+    first = next(rows, None)
+    if first is None:
         return "No data found", 404
-    si = io.StringIO()
-    cw = csv.DictWriter(si, fieldnames=["timestamp", "latency", "loss"])
-    cw.writeheader()
-    cw.writerows(data)
-    output = make_response(si.getvalue())
-    output.headers["Content-Disposition"] = (
-        f"attachment; filename={target}_network_data.csv"
+    return Response(
+        stream_csv(itertools.chain([first], rows)),
+        content_type="text/csv",
+        headers={
+            "Content-Disposition": f"attachment; filename={target}_network_data.csv"
+        },
     )
-    output.headers["Content-type"] = "text/csv"
-    return output
+
+
+def subscribe(sid, target):
+    """Add a session to a target's audience, starting the probe for the first."""
+    join_room(target_room(target), sid=sid)
+    frames.session(sid)
+    subscribers.setdefault(target, set()).add(sid)
+    if COLLECTOR_MODE:
+        pinned.add(target)
+    if ipc_client is not None:
+        # The collector owns the probe; ask for a snapshot if we have none
+        ipc_client.send(
+            {
+                "type": "start",
+                "target": target,
+                "snapshot": target not in latest_results,
+            }
+        )
+    elif target not in active_tasks:
+        start_target_tasks(target)
+        return
+    # Probe already running: the newcomer's next frame carries the latest state
+    latest = latest_results.get(target, {})
+    if "ping" in latest:
+        frames.publish((sid,), "ping", target, target, latest["ping"])
+    for ip, hop in latest.get("hops", {}).items():
+        frames.publish((sid,), "hop", target, ip, hop)
+
+
+def unsubscribe(sid, target):
+    """Remove a session; returns True when it was the target's last subscriber."""
+    leave_room(target_room(target), sid=sid)
+    sids = subscribers.get(target)
+    if sids is None:
+        return False
+    sids.discard(sid)
+    frames.forget(sid, target)
+    if sids:
+        return False
+    del subscribers[target]
+    if target not in pinned and ipc_client is None:
+        stop_target_tasks(target)
+    return True
+
+
+def start_target_tasks(target):
+    active_tasks[target] = {}
+    eventlet.spawn(run_ping, target)
+    eventlet.spawn(run_hop_analysis, target)
+
+
+def ensure_target_running(target):
+    if target in pinned and target not in active_tasks:
+        start_target_tasks(target)
+
+
+def unpin_target(target):
+    pinned.discard(target)
+    if target not in subscribers:
+        stop_target_tasks(target)
+
+
+def sync_active_targets(stagger=COLLECTOR_STAGGER):
+    """Pin the database's active targets and unpin deactivated ones.
+
+    Targets not yet running are started at evenly spaced offsets across the
+    stagger window. Returns the newly pinned targets.
+    """
+    active = database.get_active_targets()
+    for target in pinned - set(active):
+        unpin_target(target)
+    new = [t for t in active if t not in pinned]
+    for i, target in enumerate(new):
+        pinned.add(target)
+        eventlet.spawn_after(i * stagger / len(new), ensure_target_running, target)
+    return new
+
+
+def run_collector(interval=COLLECTOR_SYNC_INTERVAL):
+    # Re-reading the table picks up targets added or removed elsewhere
+    while True:
+        try:
+            started = sync_active_targets()
+            if started:
+                print(f"Collector: resuming {len(started)} targets")
+        except Exception as e:
+            print(f"ERROR in collector: {e}")
+        eventlet.sleep(interval)
+
+
+def stop_target_tasks(target):
+    tasks = active_tasks.pop(target, None) or {}
+    latest_results.pop(target, None)
+    probe_scheduler.forget(target)
+    probe_metrics.forget(target)
+    if ipc_server is not None:
+        ipc_server.publish({"type": "stopped", "target": target})
+    target_id = database.get_target_id(target)
+    if target_id is not None:
+        sketches.release(target_id)
+    for _, p in tasks.items():
+        try:
+            p.terminate()
+        except:
+            pass
+
+
+def handle_ipc_command(conn, message):
+    """Collector side: a web worker starts, stops or resets a target."""
+    kind, target = message.get("type"), message.get("target")
+    if not target:
+        return
+    if kind == "start":
+        remote_watchers.setdefault(target, set()).add(conn)
+        pinned.add(target)
+        ensure_target_running(target)
+        if message.get("snapshot"):
+            latest = latest_results.get(target, {})
+            if "ping" in latest:
+                conn.send(ipc_result("ping", target, target, latest["ping"]))
+            for ip, hop in latest.get("hops", {}).items():
+                conn.send(ipc_result("hop", target, ip, hop))
+    elif kind == "stop":
+        watchers = remote_watchers.get(target, set())
+        watchers.discard(conn)
+        if not watchers:
+            remote_watchers.pop(target, None)
+            database.deactivate_target(target)
+            unpin_target(target)
+    elif kind == "reset":
+        target_id = database.get_target_id(target)
+        if target_id is not None:
+            sketches.reset(target_id)
+
+
+def handle_ipc_disconnect(conn):
+    # Like a browser disconnecting: the targets stay pinned until stopped
+    for target in list(remote_watchers):
+        remote_watchers[target].discard(conn)
+        if not remote_watchers[target]:
+            del remote_watchers[target]
+
+
+def handle_ipc_message(message):
+    """Web worker side: a result or state change from the collector."""
+    kind, target = message.get("type"), message.get("target")
+    if kind in ("ping", "hop"):
+        deliver(kind, target, message["key"], message["payload"])
+    elif kind == "error":
+        socketio.emit("error", {"message": message["message"]}, to=target_room(target))
+    elif kind == "path_change":
+        apply_path_change(target, message["event"])
+    elif kind == "stopped":
+        latest_results.pop(target, None)
+        probe_metrics.forget(target)
+
+
+def resubscribe_all():
+    # After (re)connecting, the collector learns what this worker is showing
+    for target in subscribers:
+        ipc_client.send(
+            {
+                "type": "start",
+                "target": target,
+                "snapshot": target not in latest_results,
+            }
+        )
 
 
 @socketio.on("start_test")
@@ -329,24 +1166,30 @@ def handle_start_test(data):
         target = data.get("target")
         if not target:
             return
-        sid = request.sid
-        active_tasks.setdefault(sid, {})
         database.get_or_create_target(target)
-        stop_target_tasks(sid, target)
-        active_tasks[sid][target] = {}
-        eventlet.spawn(run_ping, target, sid)
-        eventlet.spawn(run_hop_analysis, target, sid)
+        frames.session(request.sid, include_raw=bool(data.get("raw")))
+        subscribe(request.sid, target)
     except Exception as e:
-        socketio.emit("error", {"message": f"Server error: {e}"})
+        socketio.emit("error", {"message": f"Server error: {e}"}, to=request.sid)
 
 
 @socketio.on("stop_test")
 def handle_stop_test(data):
     try:
         target = data.get("target")
-        if target:
+        if not target:
+            return
+        unsubscribe(request.sid, target)
+        # Even a sid that never subscribed (a stale tab after a restart, or a
+        # target started over REST) may stop a target nobody else watches
+        if target not in subscribers:
+            if ipc_client is not None:
+                # Other workers may still be watching; the collector decides
+                ipc_client.send({"type": "stop", "target": target})
+                return
+            # Only forget the target once nobody is watching it any more
             database.deactivate_target(target)
-            stop_target_tasks(request.sid, target)
+            unpin_target(target)
     except Exception as e:
         print(f"ERROR: {e}")
 
@@ -359,21 +1202,108 @@ def handle_connect():
 @socketio.on("disconnect")
 def handle_disconnect():
     sid = request.sid
-    if sid in active_tasks:
-        for target in list(active_tasks[sid].keys()):
-            stop_target_tasks(sid, target)
-        del active_tasks[sid]
+    for target in [t for t, sids in subscribers.items() if sid in sids]:
+        unsubscribe(sid, target)
+    frames.remove_session(sid)
+
+
+def shutdown(*_):
+    # Raising SystemExit lets atexit flush the sample writer under systemd stop
+    sys.exit(0)
 
 
-def stop_target_tasks(sid, target):
-    if sid in active_tasks and target in active_tasks[sid]:
-        tasks = active_tasks[sid].pop(target)
-        for _, p in tasks.items():
-            try:
-                p.terminate()
-            except:
-                pass
+def start_probe_engine():
+    global probe_engine
+    if PROBE_ENGINE == "subprocess":
+        return None
+    if PROBE_ENGINE == "auto" and not icmp_engine.IcmpProbeEngine.available():
+        print("ICMP sockets not permitted (net.ipv4.ping_group_range); using ping")
+        return None
+    probe_engine = icmp_engine.IcmpProbeEngine()
+    probe_engine.start()
+    atexit.register(probe_engine.stop)
+    return probe_engine
+
+
+def start_services():
+    stall_monitor.start()
+    print(f"Loaded {ip_info_cache.load()} cached IP lookups")
+    ip_info.load_offline_resolver()
+    database.start_writer()
+    start_probe_engine()
+    atexit.register(database.stop_writer)
+    retention_engine.start()
+    sketches.start()
+    atexit.register(sketches.stop)
+    signal.signal(signal.SIGTERM, shutdown)
+
+
+def start_ipc_server():
+    global ipc_server
+    ipc_server = ipc.IpcServer(
+        on_command=handle_ipc_command, on_disconnect=handle_ipc_disconnect
+    )
+    ipc_server.start()
+    atexit.register(ipc_server.stop)
+    print(f"Collector: serving web workers on {ipc_server.path}")
+
+
+def start_ipc_client():
+    global ipc_client
+    ipc_client = ipc.IpcClient(
+        on_message=handle_ipc_message, on_connect=resubscribe_all
+    )
+    ipc_client.start()
+    atexit.register(ipc_client.stop)
+
+
+def run_workers(count):
+    """Supervise one collector and `count` web workers until one exits."""
+    script = os.path.abspath(__file__)
+    children = [subprocess.Popen([sys.executable, script, "--collector"])]
+    children += [
+        subprocess.Popen([sys.executable, script, "--web"]) for _ in range(count)
+    ]
+
+    def forward(signum, _):
+        for child in children:
+            if child.poll() is None:
+                child.send_signal(signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    try:
+        while all(child.poll() is None for child in children):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for child in children:
+            if child.poll() is None:
+                child.terminate()
+        for child in children:
+            child.wait()
+    return max(child.returncode or 0 for child in children)
 
 
 if __name__ == "__main__":
+    if "--workers" in sys.argv:
+        WEB_WORKERS = int(sys.argv[sys.argv.index("--workers") + 1])
+    if WEB_WORKERS and not {"--collector", "--web"} & set(sys.argv):
+        sys.exit(run_workers(WEB_WORKERS))
+    if "--web" in sys.argv:
+        # Serve sessions only; probes, storage and retention live in the collector
+        signal.signal(signal.SIGTERM, shutdown)
+        stall_monitor.start()
+        start_ipc_client()
+    else:
+        start_services()
+    if "--collector" in sys.argv:
+        # Headless: probe and store, no web server
+        COLLECTOR_MODE = True
+        start_ipc_server()
+        run_collector()
+    if COLLECTOR_MODE:
+        eventlet.spawn(run_collector)
+    frames.start()
+    # eventlet.listen sets SO_REUSEPORT, so several --web workers share the port
     socketio.run(app, debug=False, host="0.0.0.0", port=5000)
@@ -0,0 +1,45 @@
+"""Vectorized history analytics vs. the per-row Python loop.
+
+python benchmarks/bench_analytics.py [samples]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+
+
+def main():
+    if analytics.np is None:
+        sys.exit("NumPy is not installed; only the Python loop is available")
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(1)
+    start = 1_700_000_000
+    rows = [
+        (start + i, None if rng.random() < 0.02 else rng.uniform(10, 60))
+        for i in range(n)
+    ]
+
+    timings = {}
+    cases = (
+        ("python", rows, False),
+        ("numpy", rows, True),
+        # Same, minus building the array from a million Python tuples
+        ("numpy (array input)", analytics.np.asarray(rows, dtype=float), True),
+    )
+    for label, data, use_numpy in cases:
+        began = time.perf_counter()
+        analytics.analyze(data, use_numpy=use_numpy)
+        timings[label] = time.perf_counter() - began
+        print(
+            f"{label:>20}: {timings[label]:.3f}s for {n} samples "
+            f"({timings['python'] / timings[label]:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
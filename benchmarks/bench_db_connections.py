@@ -0,0 +1,58 @@
+"""Per-call latency of pooled connections vs. connecting on every call.
+
+    python benchmarks/bench_db_connections.py [iterations]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+def legacy_get_active_targets():
+    # The pre-pool access pattern: connect, set WAL, query, close
+    conn = sqlite3.connect(database.DB_PATH, timeout=20)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    try:
+        return [
+            r[0]
+            for r in conn.execute("SELECT address FROM targets WHERE is_active = 1")
+        ]
+    finally:
+        conn.close()
+
+
+def time_calls(fn, iterations):
+    fn()  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        database.init_db()
+        for i in range(50):
+            database.get_or_create_target(f"10.0.0.{i}")
+
+        legacy = time_calls(legacy_get_active_targets, iterations)
+        pooled = time_calls(database.get_active_targets, iterations)
+        database._get_pool().close()
+
+    print(f"iterations:        {iterations}")
+    print(f"connect-per-call:  {legacy:8.1f} us/call")
+    print(f"pooled:            {pooled:8.1f} us/call")
+    print(f"speedup:           {legacy / pooled:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Frames and bytes sent to one dashboard with and without batching.
+
+python benchmarks/bench_emitter.py [targets] [seconds]
+
+Simulates each target's 1 Hz ping plus a 10-hop refresh every 5 s, with the
+emitter flushing on its configured tick.
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emitter import EMIT_INTERVAL, FrameEmitter
+
+
+class NullSocketIO:
+    def emit(self, *args, **kwargs):
+        pass
+
+
+def main():
+    targets = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    rng = random.Random(1)
+    frames = FrameEmitter(NullSocketIO(), measure_bytes=True)
+    session = frames.session("sid")
+    ticks_per_second = round(1 / EMIT_INTERVAL)
+    for second in range(seconds):
+        for tick in range(ticks_per_second):
+            # Spread each target's ping over the second, as real probes drift
+            for t in range(tick, targets, ticks_per_second):
+                latency = round(rng.uniform(10, 30), 3)
+                frames.publish(
+                    ("sid",),
+                    "ping",
+                    f"10.1.{t // 256}.{t % 256}",
+                    f"10.1.{t // 256}.{t % 256}",
+                    {
+                        "target": f"10.1.{t // 256}.{t % 256}",
+                        "latency": latency,
+                        "loss": 0.0,
+                        "jitter": round(rng.uniform(0, 2), 2),
+                        "mos": 4.4,
+                        "total_sent": second + 1,
+                        "total_received": second + 1,
+                        "raw": f"64 bytes from 10.1.0.1: icmp_seq={second} ttl=60 "
+                        f"time={latency} ms",
+                    },
+                )
+                if second % 5 == 0 and tick == 0:
+                    for n in range(1, 11):
+                        frames.publish(
+                            ("sid",),
+                            "hop",
+                            f"10.1.{t // 256}.{t % 256}",
+                            f"172.16.0.{n}",
+                            {
+                                "target": f"10.1.{t // 256}.{t % 256}",
+                                "num": str(n),
+                                "ip": f"172.16.0.{n}",
+                                "isp": "Example ISP",
+                                "location": "Somewhere, US",
+                                "loss": 0,
+                                "avg_latency": round(rng.uniform(1, 20), 2),
+                            },
+                        )
+            now = second + tick * EMIT_INTERVAL
+            frames.flush(now=now)
+            # A fast client: every frame is acked 20 ms after it is sent
+            if session.in_flight is not None:
+                frames.ack("sid", session.in_flight[0], now=now + 0.02)
+    stats = frames.stats()
+    print(
+        f"{targets} targets, {seconds}s: "
+        f"{stats['unbatched_frames']} -> {stats['frames']} frames "
+        f"({stats['frame_reduction']:.1%} fewer), "
+        f"{stats['unbatched_bytes']} -> {stats['bytes']} bytes "
+        f"({stats['byte_reduction']:.1%} fewer)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Offline range-index lookups per second vs. a linear scan of the ranges.
+
+python benchmarks/bench_ip_ranges.py [ranges] [lookups]
+"""
+
+import os
+import random
+import socket
+import struct
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ip_ranges import OfflineResolver
+
+
+def write_dataset(path, count):
+    # Contiguous /24s with a handful of distinct ASNs, like real ASN datasets
+    with open(path, "w") as f:
+        f.write("start_ip,end_ip,asn,isp,city,country\n")
+        for i in range(count):
+            start = 0x01000000 + i * 256
+            f.write(
+                f"{socket.inet_ntoa(struct.pack('!I', start))},"
+                f"{socket.inet_ntoa(struct.pack('!I', start + 255))},"
+                f"{i % 500},ISP {i % 500},City,US\n"
+            )
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "ranges.csv")
+        write_dataset(path, count)
+        resolver = OfflineResolver(path)
+        resolver.load()
+
+    rng = random.Random(1)
+    ips = [
+        socket.inet_ntoa(struct.pack("!I", 0x01000000 + rng.randrange(count * 256)))
+        for _ in range(lookups)
+    ]
+    started = time.perf_counter()
+    for ip in ips:
+        resolver.lookup(ip)
+    elapsed = time.perf_counter() - started
+    print(f"bisect: {elapsed / lookups * 1e6:.2f} us/lookup over {count} ranges")
+
+    v4 = resolver._indexes[0]
+    ranges = list(zip(v4.starts, v4.ends))
+    sample = [int.from_bytes(socket.inet_aton(ip), "big") for ip in ips[:200]]
+    started = time.perf_counter()
+    for value in sample:
+        next(i for i, (s, e) in enumerate(ranges) if s <= value <= e)
+    linear = (time.perf_counter() - started) / len(sample)
+    print(f"linear: {linear * 1e6:.2f} us/lookup ({linear / (elapsed / lookups):.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
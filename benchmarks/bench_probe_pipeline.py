@@ -0,0 +1,275 @@
+"""How many targets one process sustains, through the real probe loops.
+
+python benchmarks/bench_probe_pipeline.py [options]
+
+Every target gets the app's real run_ping and run_hop_analysis, fed by
+benchmarks/fake_probes.py instead of ping/tracepath. Samples go through the
+real writer into a temporary database, and one dashboard session, acked
+instantly, is subscribed to every target. After --warmup seconds the run is
+measured for --seconds and reports:
+
+  lines_per_sec          probe output lines parsed
+  rows_per_sec           ping/hop rows committed by the writer
+  frames_per_sec         batch frames emitted
+  samples_emitted_per_sec  ping samples delivered inside those frames
+  p50/p99_emit_latency_ms  time from a ping line being printed to its sample
+                           leaving in a frame
+  rss_mb, peak_rss_mb
+
+The probe scheduler is unlimited unless --concurrency/--pps are given, so the
+numbers describe the process rather than the budget.
+
+--save-baseline writes the result to benchmarks/baselines/<scenario>.json;
+--compare checks a run against that file and exits 1 when a metric is worse
+by more than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+
+# Point the app at a scratch database before it initializes one on import
+_tmp = tempfile.mkdtemp(prefix="packet-tester-bench-")
+database.DB_PATH = os.path.join(_tmp, "bench.db")
+
+import eventlet
+
+import app
+import scheduler
+from emitter import FrameEmitter
+from fake_probes import FakeProbes
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+# Metric -> which direction is better; the rest are informational
+COMPARED = {
+    "lines_per_sec": "higher",
+    "rows_per_sec": "higher",
+    "samples_emitted_per_sec": "higher",
+    "p99_emit_latency_ms": "lower",
+    "peak_rss_mb": "lower",
+}
+
+
+class AckingSocketIO:
+    """Stands in for the dashboard: records frames and acks them at once."""
+
+    def __init__(self, probes):
+        self.probes = probes
+        self.emit_latencies = []
+        self.samples = 0
+        self.recording = False
+
+    def emit(self, event, frame, to=None, callback=None):
+        now = time.monotonic()
+        for target, delta in frame.get("ping", {}).items():
+            batch = len(delta.get("latencies", ()))
+            last = delta.get("total_sent")
+            produced = self.probes.produced.get(target, ())
+            if last is None or not batch:
+                continue
+            self.samples += batch
+            if self.recording:
+                self.emit_latencies.extend(
+                    (now - produced[n - 1]) * 1000
+                    for n in range(last - batch + 1, last + 1)
+                    if 0 < n <= len(produced)
+                )
+        if callback is not None:
+            callback()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def snapshot(probes, sio, writer, frames):
+    return {
+        "time": time.monotonic(),
+        "lines": app.probe_metrics.lines_parsed,
+        "rows": writer.rows_written,
+        "frames": frames.frames,
+        "samples": sio.samples,
+    }
+
+
+def run(args):
+    probes = FakeProbes(
+        rate=args.rate,
+        latency_ms=args.latency,
+        timeout_rate=args.timeout_rate,
+        burst_every=args.burst_every,
+        burst_length=args.burst_length,
+        hops=args.hops,
+        hop_loss=args.hop_loss,
+        replay=args.replay,
+        seed=args.seed,
+    )
+    probes.install()
+    writer = database.start_writer()
+    app.probe_engine = None
+    app.probe_scheduler = scheduler.ProbeScheduler(
+        max_concurrent=args.concurrency or 10**9, rate=args.pps
+    )
+    sio = AckingSocketIO(probes)
+    app.frames = frames = FrameEmitter(sio)
+    frames.session("bench")
+    frames.start()
+    app.stall_monitor.start()
+
+    targets = [
+        f"10.{200 + i // 65536}.{i // 256 % 256}.{i % 256}" for i in range(args.targets)
+    ]
+    for target in targets:
+        app.subscribers[target] = {"bench"}
+        app.start_target_tasks(target)
+
+    eventlet.sleep(args.warmup)
+    sio.recording = True
+    start = snapshot(probes, sio, writer, frames)
+    eventlet.sleep(args.seconds)
+    end = snapshot(probes, sio, writer, frames)
+    sio.recording = False
+
+    for target in targets:
+        app.stop_target_tasks(target)
+    frames.stop()
+    app.stall_monitor.stop()
+    database.stop_writer()
+    probes.uninstall()
+
+    elapsed = end["time"] - start["time"]
+    rate = lambda key: round((end[key] - start[key]) / elapsed, 1)
+    latencies = sio.emit_latencies
+    return {
+        "lines_per_sec": rate("lines"),
+        "rows_per_sec": rate("rows"),
+        "frames_per_sec": rate("frames"),
+        "samples_emitted_per_sec": rate("samples"),
+        "p50_emit_latency_ms": round(percentile(latencies, 50) or 0, 2),
+        "p99_emit_latency_ms": round(percentile(latencies, 99) or 0, 2),
+        "rss_mb": round(rss_mb(), 1),
+        "peak_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+        "event_loop_max_lag_ms": round(app.stall_monitor.max_lag_ms, 1),
+    }
+
+
+def commit():
+    try:
+        return (
+            subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=ROOT,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+            or None
+        )
+    except OSError:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing each compared metric; second value is True on regression."""
+    lines, regressed = [], False
+    for metric, better in COMPARED.items():
+        old, new = baseline["results"].get(metric), results.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if better == "higher" else change
+        flag = "REGRESSION" if worse > tolerance else "ok"
+        regressed |= worse > tolerance
+        lines.append(f"  {metric:26} {old:>10} -> {new:>10}  {change:+.1%}  {flag}")
+    return lines, regressed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--scenario", default="default")
+    parser.add_argument("--targets", type=int, default=200)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument(
+        "--rate", type=float, default=1.0, help="ping lines/s per target"
+    )
+    parser.add_argument("--latency", type=float, default=20.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.01)
+    parser.add_argument("--burst-every", type=float, default=30, help="seconds")
+    parser.add_argument("--burst-length", type=int, default=5, help="lost probes")
+    parser.add_argument("--hops", type=int, default=10)
+    parser.add_argument("--hop-loss", type=float, default=0.02)
+    parser.add_argument("--replay", help="recorded ping output to loop instead")
+    parser.add_argument("--concurrency", type=int, default=0)
+    parser.add_argument("--pps", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    params = {
+        k: v
+        for k, v in vars(args).items()
+        if k not in ("save_baseline", "compare", "tolerance")
+    }
+    results = run(args)
+    report = {
+        "scenario": args.scenario,
+        "commit": commit(),
+        "python": platform.python_version(),
+        "params": params,
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+
+    path = os.path.join(BASELINE_DIR, f"{args.scenario}.json")
+    status = 0
+    if args.compare:
+        if not os.path.exists(path):
+            print(f"No baseline at {path}")
+            return 2
+        with open(path) as f:
+            baseline = json.load(f)
+        if baseline["params"] != params:
+            print("Warning: baseline was recorded with different parameters")
+        lines, regressed = compare(results, baseline, args.tolerance)
+        print(f"Against {baseline.get('commit')}:")
+        print("\n".join(lines))
+        status = 1 if regressed else 0
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {path}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
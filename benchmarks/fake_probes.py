@@ -0,0 +1,250 @@
+"""Synthetic or recorded ping/tracepath output for driving the real probe loops.
+
+FakeProbes.install() replaces subprocess.Popen and subprocess.run in the app.
+`ping -i 1 <target>` then becomes a paced stream of reply, timeout and
+loss-burst lines. `tracepath` prints a path of `hops` hops ending at the
+target, and the per-hop `ping -c N` returns after the time the real probe
+would take. A TTL-limited `ping -t N` is answered by hop N's "Time to live
+exceeded", or by the target once N reaches it. With `route_change_every`, the
+middle hop swaps address every that many seconds. Output is seeded, so a
+scenario replays identically.
+
+With `replay`, ping lines come from a recorded file instead and loop forever,
+icmp_seq continuing to count up across loops. Lines prefixed with `ping -D` timestamps ("[1697049600.123456] 64 bytes ...")
+keep their recorded spacing divided by `rate`, which acts as a speed-up;
+untimed lines are spaced 1/rate apart.
+
+Every line that produces a sample (reply or timeout) is timestamped in
+`produced[target]`, indexed by its position in the target's sample sequence.
+That lets a consumer measure sample-to-emit latency from the `total_sent` in
+emitted frames. When ping is run with -D (or with `timestamps`), those lines
+also carry the wall-clock time they were printed as a `ping -D` prefix.
+"""
+
+import random
+import re
+import subprocess
+import time
+
+import eventlet
+
+_D_TIMESTAMP = re.compile(r"^\[(\d+\.\d+)\]\s*")
+_SEQ = re.compile(r"icmp_seq=(\d+)")
+
+
+class _Stdout:
+    def __init__(self, lines):
+        self._lines = lines
+
+    def readline(self):
+        return next(self._lines, "")
+
+    def read(self):
+        return "".join(self._lines)
+
+
+class FakeProcess:
+    def __init__(self, lines):
+        self.stdout = _Stdout(lines)
+        self.returncode = None
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        self.returncode = -15
+
+    def kill(self):
+        self.terminate()
+
+    def wait(self, timeout=None):
+        self.returncode = 0 if self.returncode is None else self.returncode
+        return self.returncode
+
+
+class FakeProbes:
+    def __init__(
+        self,
+        rate=1.0,
+        latency_ms=20.0,
+        jitter_ms=3.0,
+        timeout_rate=0.0,
+        burst_every=0.0,
+        burst_length=0,
+        hops=10,
+        hop_loss=0.0,
+        replay=None,
+        seed=1,
+        timestamps=False,
+        route_change_every=0.0,
+    ):
+        self.rate = rate
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.timeout_rate = timeout_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.hops = hops
+        self.hop_loss = hop_loss
+        self.replay = self._load(replay) if replay else None
+        self.seed = seed
+        self.timestamps = timestamps
+        self.route_change_every = route_change_every
+        self.started = time.monotonic()
+        self.lines = 0
+        self.produced = {}
+        self._rngs = {}
+        self._saved = None
+
+    @staticmethod
+    def _load(path):
+        """[(delay before line in seconds, line)] from a recorded ping run."""
+        entries, previous = [], None
+        with open(path) as f:
+            for line in f:
+                match = _D_TIMESTAMP.match(line)
+                stamp = float(match.group(1)) if match else None
+                delay = stamp - previous if stamp and previous else None
+                previous = stamp or previous
+                entries.append((delay, line[match.end() :] if match else line))
+        return entries
+
+    def _rng(self, key):
+        # One stream per key for the life of the fake, so repeated probes of a
+        # hop draw fresh values but a rerun draws the same ones
+        rng = self._rngs.get(key)
+        if rng is None:
+            rng = self._rngs[key] = random.Random(f"{self.seed}:{key}")
+        return rng
+
+    def install(self, module=subprocess):
+        self._saved = (module, module.Popen, module.run)
+        module.Popen = self.popen
+        module.run = self.run
+
+    def uninstall(self):
+        if self._saved:
+            module, module.Popen, module.run = self._saved
+            self._saved = None
+
+    def popen(self, argv, **kwargs):
+        target = argv[-1]
+        if "tracepath" in argv[0]:
+            return FakeProcess(self._tracepath(target))
+        rng = random.Random(f"{self.seed}:{target}")
+        stamped = self.timestamps or "-D" in argv
+        if self.replay:
+            return FakeProcess(self._replayed(target, stamped))
+        return FakeProcess(self._ping(target, rng, stamped))
+
+    def hop_ip(self, target, n):
+        if n >= self.hops:
+            return target
+        octets = target.split(".")[-2:] if "." in target else ["0", "0"]
+        if self.route_change_every and n == (self.hops + 1) // 2:
+            elapsed = time.monotonic() - self.started
+            if int(elapsed // self.route_change_every) % 2:
+                n += 100
+        return f"10.{octets[0]}.{octets[1]}.{n}"
+
+    def run(self, argv, **kwargs):
+        if "-t" in argv:
+            return self._ttl_probe(argv)
+        # ping -c N -i I -W 1 <hop>
+        count = int(argv[argv.index("-c") + 1])
+        interval = float(argv[argv.index("-i") + 1])
+        eventlet.sleep(interval * (count - 1) + self.latency_ms / 1000)
+        rng = self._rng(argv[-1])
+        lines = [
+            f"64 bytes from {argv[-1]}: icmp_seq={i + 1} ttl=60 "
+            f"time={max(0.1, rng.gauss(self.latency_ms / 2, self.jitter_ms)):.3f} ms"
+            for i in range(count)
+            if rng.random() >= self.hop_loss
+        ]
+        self.lines += len(lines)
+        return subprocess.CompletedProcess(argv, 0, stdout="\n".join(lines))
+
+    def _ttl_probe(self, argv):
+        # ping -n -c 1 -t TTL -W 1 <target>
+        ttl, target = int(argv[argv.index("-t") + 1]), argv[-1]
+        eventlet.sleep(self.latency_ms / 1000 * min(ttl, self.hops) / self.hops)
+        self.lines += 1
+        if self._rng(f"{target}:ttl").random() < self.hop_loss:
+            output = ""
+        elif ttl >= self.hops:
+            output = (
+                f"64 bytes from {target}: icmp_seq=1 ttl=60 "
+                f"time={self.latency_ms:.3f} ms\n"
+            )
+        else:
+            ip = self.hop_ip(target, ttl)
+            output = f"From {ip} icmp_seq=1 Time to live exceeded\n"
+        return subprocess.CompletedProcess(argv, 0, stdout=output)
+
+    def _emit(self, target, line, stamped=False):
+        self.lines += 1
+        if "bytes from" in line or "no answer" in line:
+            self.produced.setdefault(target, []).append(time.monotonic())
+            if stamped:
+                return f"[{time.time():.6f}] {line}"
+        return line
+
+    def _paced(self, target, entries, stamped):
+        # Sleep to each line's slot on a fixed schedule, so slow consumers
+        # show up as lag instead of silently lowering the rate
+        next_at = time.monotonic()
+        for delay, line in entries:
+            next_at += delay
+            eventlet.sleep(max(0, next_at - time.monotonic()))
+            yield self._emit(target, line, stamped)
+
+    def _ping(self, target, rng, stamped):
+        def entries():
+            yield 0, f"PING {target} ({target}) 56(84) bytes of data.\n"
+            seq, burst_left = 0, 0
+            next_burst = self.burst_every
+            while True:
+                seq += 1
+                elapsed = seq / self.rate
+                if self.burst_every and elapsed >= next_burst:
+                    burst_left = self.burst_length
+                    next_burst += self.burst_every
+                if burst_left or rng.random() < self.timeout_rate:
+                    burst_left = max(0, burst_left - 1)
+                    line = f"no answer yet for icmp_seq={seq}\n"
+                else:
+                    latency = max(0.1, rng.gauss(self.latency_ms, self.jitter_ms))
+                    line = (
+                        f"64 bytes from {target}: icmp_seq={seq} ttl=60 "
+                        f"time={latency:.3f} ms\n"
+                    )
+                yield 1 / self.rate, line
+
+        return self._paced(target, entries(), stamped)
+
+    def _replayed(self, target, stamped):
+        seqs = [int(m.group(1)) for _, line in self.replay for m in _SEQ.finditer(line)]
+        span = max(seqs, default=0)
+
+        def entries():
+            offset = 0
+            while True:
+                # Keep icmp_seq increasing across loops, as a long ping run would
+                shift = lambda m: f"icmp_seq={(int(m.group(1)) + offset) % 65536}"
+                for delay, line in self.replay:
+                    delay = 1 / self.rate if delay is None else delay / self.rate
+                    yield delay, _SEQ.sub(shift, line)
+                offset += span
+
+        return self._paced(target, entries(), stamped)
+
+    def _tracepath(self, target):
+        def lines():
+            yield self._emit(target, " 1?: [LOCALHOST]     pmtu 1500\n")
+            for n in range(1, self.hops + 1):
+                eventlet.sleep(0.01)
+                ip = self.hop_ip(target, n)
+                yield self._emit(target, f" {n}:  {ip}   {n * 1.5:.3f}ms\n")
+            yield self._emit(target, f"     Resume: pmtu 1500 hops {self.hops}\n")
+
+        return lines()
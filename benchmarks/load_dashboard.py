@@ -0,0 +1,320 @@
+"""Many dashboard sessions against one server, fed by fake probes.
+
+python benchmarks/load_dashboard.py [--operators 50] [--targets-per 20] ...
+
+Starts benchmarks/serve_fake.py (the app with fake probes in place of
+ping/tracepath and a scratch database) as a subprocess, then opens one Socket.IO
+client per operator. Each client subscribes to --targets-per targets drawn
+from a shared pool of --pool, asking for raw lines, and acks every "batch"
+frame like the dashboard does. Every --churn seconds each operator stops one
+of its targets and starts another.
+
+The fake prints `ping -D` timestamps, so a client can tell how long a sample
+took from the probe's stdout to its socket. The report covers:
+
+  connect_ms              time for Socket.IO connect() to complete
+  fanout_ms               wall time from a ping line being printed to the
+                          frame carrying it arriving at a client
+  frames/samples per sec  received by all clients
+  dropped_sessions        failed connects, server-side disconnects and
+                          sessions that went --stall seconds without a frame
+  server_cpu_percent, server_rss_mb  sampled from /proc every second
+
+Clients use WebSocket when the websocket-client package is installed and
+long-polling otherwise; the report says which.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+import socketio
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+_D_TIMESTAMP = re.compile(r"^\[(\d+\.\d+)\]")
+TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 2)
+
+
+def summary(values):
+    return {
+        "p50": percentile(values, 50),
+        "p99": percentile(values, 99),
+        "max": round(max(values), 2) if values else None,
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Operator:
+    """One dashboard: a Socket.IO client watching a few targets."""
+
+    def __init__(self, name, url, targets, pool, rng, stall):
+        self.name = name
+        self.url = url
+        self.targets = list(targets)
+        self.pool = pool
+        self.rng = rng
+        self.stall = stall
+        self.client = socketio.Client(reconnection=False)
+        self.client.on("batch", self.on_batch)
+        self.client.on("disconnect", self.on_disconnect)
+        self.lock = threading.Lock()
+        self.connect_ms = None
+        self.error = None
+        self.closing = False
+        self.dropped = None
+        self.frames = 0
+        self.samples = 0
+        self.fanout_ms = []
+        self.last_frame = None
+        self.churned = 0
+
+    def connect(self):
+        started = time.monotonic()
+        try:
+            self.client.connect(self.url, wait_timeout=30)
+        except Exception as e:
+            self.error = str(e)
+            self.dropped = "connect failed"
+            return
+        self.connect_ms = (time.monotonic() - started) * 1000
+        self.last_frame = time.monotonic()
+        for target in self.targets:
+            self.client.emit("start_test", {"target": target, "raw": True})
+
+    def on_batch(self, frame):
+        now = time.time()
+        with self.lock:
+            self.frames += 1
+            self.last_frame = time.monotonic()
+            for delta in frame.get("ping", {}).values():
+                for line in delta.get("raw") or ():
+                    self.samples += 1
+                    match = _D_TIMESTAMP.match(line or "")
+                    if match:
+                        self.fanout_ms.append((now - float(match.group(1))) * 1000)
+        return True  # ack, so the server sends the next frame
+
+    def on_disconnect(self, *_):
+        if not self.closing and self.dropped is None:
+            self.dropped = "disconnected by server"
+
+    def churn(self):
+        if not self.client.connected or not self.targets:
+            return
+        old = self.targets.pop(self.rng.randrange(len(self.targets)))
+        new = self.rng.choice([t for t in self.pool if t not in self.targets])
+        self.client.emit("stop_test", {"target": old})
+        self.client.emit("start_test", {"target": new, "raw": True})
+        self.targets.append(new)
+        self.churned += 1
+
+    def check_stalled(self, now):
+        if (
+            self.dropped is None
+            and self.last_frame
+            and now - self.last_frame > self.stall
+        ):
+            self.dropped = f"no frame for {self.stall:g}s"
+
+    def close(self):
+        self.closing = True
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
+
+
+class ServerSampler:
+    """CPU and RSS of the server process, read from /proc once a second."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.cpu_percent = []
+        self.rss_mb = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _read(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{self.pid}/statm") as f:
+            rss = int(f.read().split()[1]) * PAGE_MB
+        # utime and stime are fields 14 and 15 of stat, 12 and 13 after the name
+        return (int(fields[11]) + int(fields[12])) / TICKS, rss
+
+    def _run(self):
+        previous, at = self._read()[0], time.monotonic()
+        while not self._stop.wait(1.0):
+            try:
+                cpu, rss = self._read()
+            except OSError:
+                return
+            now = time.monotonic()
+            self.cpu_percent.append((cpu - previous) / (now - at) * 100)
+            self.rss_mb.append(rss)
+            previous, at = cpu, now
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def start_server(args, port, log):
+    argv = [sys.executable, os.path.join(HERE, "serve_fake.py"), "--port", str(port)]
+    for option in ("rate", "timeout_rate", "hops", "seed"):
+        argv += [f"--{option.replace('_', '-')}", str(getattr(args, option))]
+    server = subprocess.Popen(argv, stdout=log, stderr=subprocess.STDOUT, cwd=ROOT)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/api/health", timeout=1).ok:
+                return server
+        except requests.RequestException:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("server did not become healthy within 30s")
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    pool = [
+        f"10.{210 + i // 65536}.{i // 256 % 256}.{i % 256}" for i in range(args.pool)
+    ]
+    port = args.port or free_port()
+    url = f"http://127.0.0.1:{port}"
+    log = tempfile.NamedTemporaryFile(
+        mode="w", prefix="packet-tester-load-", suffix=".log", delete=False
+    )
+    server = start_server(args, port, log)
+    sampler = ServerSampler(server.pid)
+    sampler.start()
+    operators = [
+        Operator(
+            f"op{i}",
+            url,
+            rng.sample(pool, min(args.targets_per, len(pool))),
+            pool,
+            random.Random(f"{args.seed}:{i}"),
+            args.stall,
+        )
+        for i in range(args.operators)
+    ]
+    try:
+        connecting = [threading.Thread(target=op.connect) for op in operators]
+        for thread in connecting:
+            thread.start()
+            time.sleep(args.ramp / max(1, len(operators)))
+        for thread in connecting:
+            thread.join()
+
+        time.sleep(args.warmup)
+        for op in operators:
+            with op.lock:
+                op.frames, op.samples, op.fanout_ms = 0, 0, []
+        started = time.monotonic()
+        next_churn = started + args.churn if args.churn else None
+        while time.monotonic() - started < args.seconds:
+            time.sleep(0.5)
+            now = time.monotonic()
+            for op in operators:
+                op.check_stalled(now)
+            if next_churn and now >= next_churn:
+                for op in operators:
+                    op.churn()
+                next_churn += args.churn
+        elapsed = time.monotonic() - started
+    finally:
+        for op in operators:
+            op.close()
+        sampler.stop()
+        server.terminate()
+        server.wait()
+        log.close()
+
+    connected = [op for op in operators if op.connect_ms is not None]
+    fanout = [ms for op in operators for ms in op.fanout_ms]
+    dropped = [op for op in operators if op.dropped]
+    return {
+        "sessions": len(operators),
+        "connected": len(connected),
+        "transport": connected[0].client.transport() if connected else None,
+        "connect_ms": summary([op.connect_ms for op in connected]),
+        "frames_per_sec": round(sum(op.frames for op in operators) / elapsed, 1),
+        "samples_per_sec": round(sum(op.samples for op in operators) / elapsed, 1),
+        "fanout_ms": summary(fanout),
+        "churn_ops": sum(op.churned for op in operators),
+        "dropped_sessions": len(dropped),
+        "drop_reasons": sorted({op.dropped for op in dropped}),
+        "server_cpu_percent": {
+            "mean": (
+                round(sum(sampler.cpu_percent) / len(sampler.cpu_percent), 1)
+                if sampler.cpu_percent
+                else None
+            ),
+            "max": round(max(sampler.cpu_percent), 1) if sampler.cpu_percent else None,
+        },
+        "server_rss_mb": {
+            "last": round(sampler.rss_mb[-1], 1) if sampler.rss_mb else None,
+            "peak": round(max(sampler.rss_mb), 1) if sampler.rss_mb else None,
+        },
+        "server_log": log.name,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--operators", type=int, default=50)
+    parser.add_argument("--targets-per", type=int, default=20)
+    parser.add_argument("--pool", type=int, default=200, help="distinct targets")
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--ramp", type=float, default=2, help="seconds to connect all")
+    parser.add_argument("--churn", type=float, default=5, help="seconds, 0 disables")
+    parser.add_argument("--stall", type=float, default=15)
+    parser.add_argument(
+        "--rate", type=float, default=1.0, help="ping lines/s per target"
+    )
+    parser.add_argument("--timeout-rate", type=float, default=0.01)
+    parser.add_argument("--hops", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    report = run(parse_args(argv))
+    print(json.dumps(report, indent=2))
+    return 1 if report["dropped_sessions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+"""The app with fake probes and a scratch database, for load tests and UI work.
+
+python benchmarks/serve_fake.py [--port 5000] [--rate 1] [--timeout-rate 0.01]
+
+Every target the dashboard starts is fed by benchmarks/fake_probes.py, with
+`ping -D` timestamps on the raw lines, so nothing is sent on the network.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+import database
+
+database.DB_PATH = os.path.join(
+    tempfile.mkdtemp(prefix="packet-tester-fake-"), "fake.db"
+)
+
+import app
+from fake_probes import FakeProbes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument(
+        "--rate", type=float, default=1.0, help="ping lines/s per target"
+    )
+    parser.add_argument("--timeout-rate", type=float, default=0.01)
+    parser.add_argument("--hops", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    FakeProbes(
+        rate=args.rate,
+        timeout_rate=args.timeout_rate,
+        hops=args.hops,
+        seed=args.seed,
+        timestamps=True,
+    ).install()
+    app.PROBE_ENGINE = "subprocess"
+    app.start_services()
+    app.frames.start()
+    app.socketio.run(app.app, host="127.0.0.1", port=args.port, log_output=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,418 @@
+import heapq
+import json
 import sqlite3
 import os
-from datetime import datetime
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import metrics
+from hub import blocking
+
+# The pool and the writer are shared with native threads even when the app has
+# monkey-patched threading, so they need the real primitives
+from hub import real_threading as threading
 
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "network_data.db")
 
+# Write-behind tuning: a batch is flushed once it reaches WRITER_BATCH_SIZE rows
+# or WRITER_FLUSH_INTERVAL seconds after the previous flush, whichever is first.
+WRITER_BATCH_SIZE = int(os.environ.get("PACKET_TESTER_WRITER_BATCH_SIZE", "500"))
+WRITER_FLUSH_INTERVAL = float(
+    os.environ.get("PACKET_TESTER_WRITER_FLUSH_INTERVAL", "1.0")
+)
+# Rows held while the database is unavailable; beyond that the oldest are dropped
+WRITER_MAX_QUEUE = int(os.environ.get("PACKET_TESTER_WRITER_MAX_QUEUE", "100000"))
+
+# Connection pool tuning
+DB_POOL_SIZE = int(os.environ.get("PACKET_TESTER_DB_POOL_SIZE", "8"))
+DB_CACHE_SIZE_KB = int(os.environ.get("PACKET_TESTER_DB_CACHE_SIZE_KB", "8192"))
+DB_MMAP_SIZE = int(os.environ.get("PACKET_TESTER_DB_MMAP_SIZE", str(256 * 1024**2)))
+DB_STATEMENT_CACHE = 128
+
+# Applied once when a connection is opened, not on every use
+PRAGMAS = (
+    # Must precede journal_mode to take effect on a new file; older databases
+    # need a one-off vacuum_database() to switch
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}",
+    f"PRAGMA mmap_size={DB_MMAP_SIZE}",
+    "PRAGMA temp_store=MEMORY",
+)
+
+_writer = None
+_pool = None
+
+
+def _connect(path):
+    conn = sqlite3.connect(
+        path,
+        timeout=20,
+        check_same_thread=False,
+        cached_statements=DB_STATEMENT_CACHE,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
 
 def get_db():
     try:
-        conn = sqlite3.connect(DB_PATH, timeout=20)
-        conn.row_factory = sqlite3.Row
-        # Enable WAL mode for better concurrency
-        conn.execute("PRAGMA journal_mode=WAL")
-        return conn
+        return _connect(DB_PATH)
     except Exception as e:
         print(f"DATABASE ERROR: Failed to connect to {DB_PATH}: {e}")
         raise
 
 
+class ConnectionPool:
+    """Keeps up to `size` open connections and hands them out one caller at a time.
+
+    A greenlet or thread holds a connection exclusively for the duration of a
+    `with pool.connection()` block, so each connection keeps its pragmas and
+    its prepared-statement cache across calls.
+    """
+
+    def __init__(self, path, size=DB_POOL_SIZE):
+        self.path = path
+        self.size = size
+        self.created = 0
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = _connect(self.path)
+                self.created += 1
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                with self._lock:
+                    if self._closed:
+                        conn.close()
+                    else:
+                        self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+def _get_pool():
+    global _pool
+    # Rebuild the pool if DB_PATH has been repointed (tests do this per case)
+    if _pool is None or _pool.path != DB_PATH:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+
+def connection():
+    """Borrow a pooled connection: `with database.connection() as conn: ...`"""
+    return _get_pool().connection()
+
+
+# Rollup resolutions: table name and bucket width. get_history picks the
+# coarsest one whose row count still gives a readable chart for the span.
+ROLLUPS = {
+    "1m": ("pings_1m", "+1 minute", "%Y-%m-%d %H:%M:00"),
+    "1h": ("pings_1h", "+1 hour", "%Y-%m-%d %H:00:00"),
+}
+RAW_HISTORY_MAX_HOURS = 6
+MINUTE_HISTORY_MAX_HOURS = 72
+
+ROLLUP_COLUMNS = (
+    "samples",
+    "lost",
+    "latency_min",
+    "latency_avg",
+    "latency_max",
+    "latency_p95",
+    "jitter",
+)
+
+
+def _rollup_table_sql(table):
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            target_id INTEGER NOT NULL,
+            bucket TIMESTAMP NOT NULL,
+            samples INTEGER NOT NULL,
+            lost INTEGER NOT NULL,
+            latency_min REAL,
+            latency_avg REAL,
+            latency_max REAL,
+            latency_p95 REAL,
+            jitter REAL,
+            PRIMARY KEY (target_id, bucket)
+        ) WITHOUT ROWID
+    """
+
+
+def _minute_bucket(timestamp):
+    return timestamp[:16] + ":00"
+
+
+def _hour_bucket(timestamp):
+    return timestamp[:13] + ":00:00"
+
+
+def _percentile(values, pct):
+    # Nearest-rank percentile over an already sorted list
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def summarize_latencies(latencies):
+    """Rollup row for an ordered list of latencies (None for a lost probe)."""
+    received = [lat for lat in latencies if lat is not None]
+    samples, lost = len(latencies), len(latencies) - len(received)
+    if not received:
+        return (samples, lost, None, None, None, None, None)
+    ordered = sorted(received)
+    deltas = [abs(b - a) for a, b in zip(received, received[1:])]
+    return (
+        samples,
+        lost,
+        ordered[0],
+        sum(received) / len(received),
+        ordered[-1],
+        _percentile(ordered, 95),
+        sum(deltas) / len(deltas) if deltas else 0.0,
+    )
+
+
+def merge_rollups(rows):
+    """Combine finer rollup rows (ROLLUP_COLUMNS order) into one coarser row.
+
+    min/max/avg/jitter are exact (weighted by received samples). p95 is the
+    received-weighted 95th percentile of the finer p95 values, which is an
+    approximation: the raw samples are not revisited.
+    """
+    samples = sum(r[0] for r in rows)
+    lost = sum(r[1] for r in rows)
+    weighted = [(r[1:], r[0] - r[1]) for r in rows if r[0] - r[1] > 0]
+    if not weighted:
+        return (samples, lost, None, None, None, None, None)
+    received = sum(w for _, w in weighted)
+    p95s = sorted((r[4], w) for r, w in weighted)
+    target, seen, p95 = received * 0.95, 0, p95s[-1][0]
+    for value, w in p95s:
+        seen += w
+        if seen >= target:
+            p95 = value
+            break
+    return (
+        samples,
+        lost,
+        min(r[1] for r, _ in weighted),
+        sum(r[2] * w for r, w in weighted) / received,
+        max(r[3] for r, _ in weighted),
+        p95,
+        sum((r[5] or 0) * w for r, w in weighted) / received,
+    )
+
+
+def _write_rollup(conn, table, target_id, bucket, row):
+    conn.execute(
+        f"INSERT OR REPLACE INTO {table} (target_id, bucket, "
+        f"{', '.join(ROLLUP_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (target_id, bucket, *row),
+    )
+
+
+def _rebuild_minute(conn, target_id, bucket):
+    latencies = [
+        r[0]
+        for r in conn.execute(
+            """
+            SELECT latency FROM pings
+            WHERE target_id = ? AND timestamp >= ?
+              AND timestamp < datetime(?, '+1 minute')
+            ORDER BY timestamp ASC, id ASC
+            """,
+            (target_id, bucket, bucket),
+        )
+    ]
+    if latencies:
+        _write_rollup(
+            conn, "pings_1m", target_id, bucket, summarize_latencies(latencies)
+        )
+
+
+def _rebuild_hour(conn, target_id, bucket):
+    rows = conn.execute(
+        f"""
+        SELECT {', '.join(ROLLUP_COLUMNS)} FROM pings_1m
+        WHERE target_id = ? AND bucket >= ? AND bucket < datetime(?, '+1 hour')
+        """,
+        (target_id, bucket, bucket),
+    ).fetchall()
+    if rows:
+        _write_rollup(conn, "pings_1h", target_id, bucket, merge_rollups(rows))
+
+
+def update_rollups(conn, minute_buckets):
+    """Recompute the given (target_id, minute bucket) rollups and their hours.
+
+    Runs inside the caller's transaction right after raw samples are written,
+    so rollups stay current without a separate aggregation job. Recomputing a
+    whole bucket keeps this idempotent when samples arrive late.
+    """
+    for target_id, bucket in minute_buckets:
+        _rebuild_minute(conn, target_id, bucket)
+    for target_id, bucket in {(t, _hour_bucket(b)) for t, b in minute_buckets}:
+        _rebuild_hour(conn, target_id, bucket)
+
+
+def _backfill_rollups(conn):
+    # One streaming pass over the covering index builds every minute rollup
+    buckets = set()
+    current, latencies = None, []
+    rows = conn.execute(
+        "SELECT target_id, timestamp, latency FROM pings "
+        "ORDER BY target_id, timestamp, id"
+    )
+    for target_id, timestamp, latency in rows:
+        key = (target_id, _minute_bucket(timestamp))
+        if key != current:
+            if current is not None:
+                _write_rollup(
+                    conn, "pings_1m", *current, summarize_latencies(latencies)
+                )
+                buckets.add(current)
+            current, latencies = key, []
+        latencies.append(latency)
+    if current is not None:
+        _write_rollup(conn, "pings_1m", *current, summarize_latencies(latencies))
+        buckets.add(current)
+    for target_id, bucket in {(t, _hour_bucket(b)) for t, b in buckets}:
+        _rebuild_hour(conn, target_id, bucket)
+
+
+# Schema migrations, applied in order on top of the base tables created by
+# init_db. PRAGMA user_version records the last one applied, so existing
+# network_data.db files are upgraded in place. Steps are SQL strings or
+# callables taking the connection. Never edit a released migration; append.
+MIGRATIONS = [
+    (
+        1,
+        [
+            # Covers get_history so it never touches the pings table itself;
+            # id keeps same-second samples in insertion order without a sort
+            "CREATE INDEX IF NOT EXISTS idx_pings_target_ts "
+            "ON pings (target_id, timestamp, id, latency, loss)",
+            "CREATE INDEX IF NOT EXISTS idx_hops_target_ts "
+            "ON hops (target_id, timestamp)",
+        ],
+    ),
+    (
+        2,
+        [
+            _rollup_table_sql("pings_1m"),
+            _rollup_table_sql("pings_1h"),
+            _backfill_rollups,
+        ],
+    ),
+    (
+        3,
+        [
+            """
+            CREATE TABLE IF NOT EXISTS ip_info (
+                ip TEXT PRIMARY KEY,
+                isp TEXT NOT NULL,
+                location TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """,
+        ],
+    ),
+    (
+        4,
+        [
+            # Latest checkpoint of each target's rolling latency histograms
+            """
+            CREATE TABLE IF NOT EXISTS latency_sketches (
+                target_id INTEGER PRIMARY KEY,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL,
+                FOREIGN KEY (target_id) REFERENCES targets (id)
+            )
+            """,
+        ],
+    ),
+    (
+        5,
+        [
+            # One row per distinct route; a new row is a path change at first_seen
+            """
+            CREATE TABLE IF NOT EXISTS paths (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                target_id INTEGER NOT NULL,
+                first_seen TIMESTAMP NOT NULL,
+                last_seen TIMESTAMP NOT NULL,
+                hops TEXT NOT NULL,
+                FOREIGN KEY (target_id) REFERENCES targets (id) ON DELETE CASCADE
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_paths_target_seen "
+            "ON paths (target_id, first_seen)",
+        ],
+    ),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    current = get_schema_version(conn)
+    for version, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        # The collector and every web worker migrate at startup: take the
+        # write lock first, then check nobody applied this step meanwhile
+        conn.execute("BEGIN IMMEDIATE")
+        current = get_schema_version(conn)
+        if version <= current:
+            conn.rollback()
+            continue
+        print(f"Migrating database schema to version {version}")
+        try:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+    return current
+
+
 def init_db():
     print(f"Initializing database at {DB_PATH}")
     try:
@@ -60,6 +456,7 @@ def init_db():
         """)
 
         conn.commit()
+        migrate(conn)
         conn.close()
         print("Database initialized successfully")
     except Exception as e:
@@ -67,116 +464,372 @@ def init_db():
         raise
 
 
-def get_or_create_target(address):
+def vacuum_database():
+    """Rebuild the file with incremental auto-vacuum so pruned pages can be reclaimed."""
+    conn = get_db()
     try:
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute("INSERT OR IGNORE INTO targets (address) VALUES (?)", (address,))
-        cursor.execute("UPDATE targets SET is_active = 1 WHERE address = ?", (address,))
-        cursor.execute("SELECT id FROM targets WHERE address = ?", (address,))
-        row = cursor.fetchone()
-        if not row:
-            # Should not happen with INSERT OR IGNORE and proper address
-            raise Exception(f"Failed to find or create target: {address}")
-        target_id = row[0]
-        conn.commit()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+    finally:
         conn.close()
-        return target_id
+
+
+@blocking
+def check_connection():
+    with connection() as conn:
+        conn.execute("SELECT 1").fetchone()
+
+
+@blocking
+def get_or_create_target(address):
+    try:
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT OR IGNORE INTO targets (address) VALUES (?)", (address,)
+            )
+            cursor.execute(
+                "UPDATE targets SET is_active = 1 WHERE address = ?", (address,)
+            )
+            cursor.execute("SELECT id FROM targets WHERE address = ?", (address,))
+            row = cursor.fetchone()
+            if not row:
+                # Should not happen with INSERT OR IGNORE and proper address
+                raise Exception(f"Failed to find or create target: {address}")
+            target_id = row[0]
+            conn.commit()
+            return target_id
     except Exception as e:
         print(f"DATABASE ERROR in get_or_create_target for {address}: {e}")
         raise
 
 
-def save_ping(target_id, latency, loss):
-    conn = get_db()
-    cursor = conn.cursor()
-    try:
+def _utc_timestamp(epoch=None):
+    # Same format as SQLite's CURRENT_TIMESTAMP so queued rows sort with the rest
+    moment = (
+        datetime.now(timezone.utc)
+        if epoch is None
+        else datetime.fromtimestamp(epoch, timezone.utc)
+    )
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+class SampleWriter:
+    """Batches ping/hop samples and writes them on one long-lived connection.
+
+    The writer is a native thread even under monkey-patching, so commits and
+    lock waits never hold up the hub; enqueueing only takes a short lock.
+    """
+
+    def __init__(
+        self,
+        db_path,
+        batch_size=WRITER_BATCH_SIZE,
+        flush_interval=WRITER_FLUSH_INTERVAL,
+        max_queue=WRITER_MAX_QUEUE,
+    ):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._pings = []
+        self._hops = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._conn = None
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.dropped = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.flush_seconds = metrics.Histogram(metrics.FLUSH_BUCKETS)
+        self.batch_rows = metrics.Histogram(metrics.BATCH_BUCKETS)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name="sample-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout=30):
+        """Flush everything still queued and close the connection."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def queue_depth(self):
+        with self._lock:
+            return len(self._pings) + len(self._hops)
+
+    def save_ping(self, target_id, latency, loss, timestamp=None):
+        self._enqueue(
+            self._pings, (target_id, _utc_timestamp(timestamp), latency, loss)
+        )
+
+    def save_hop(self, target_id, hop_num, ip, latency, loss):
+        self._enqueue(
+            self._hops, (target_id, _utc_timestamp(), hop_num, ip, latency, loss)
+        )
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth(),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+        }
+
+    def _enqueue(self, queue, row):
+        with self._lock:
+            queue.append(row)
+            depth = len(self._pings) + len(self._hops)
+            if depth > self.max_queue:
+                self._trim()
+        if depth >= self.batch_size:
+            self._wakeup.set()
+
+    def _trim(self):
+        # Called with the lock held; drops from the longer queue first
+        while len(self._pings) + len(self._hops) > self.max_queue:
+            longer = self._pings if len(self._pings) >= len(self._hops) else self._hops
+            del longer[0]
+            self.dropped += 1
+
+    def _run(self):
+        self._conn = _connect(self.db_path)
+        try:
+            while not self._stopping.is_set():
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+                self._flush()
+            self._flush()
+        finally:
+            self._conn.close()
+            self._conn = None
+
+    def _flush(self):
+        with self._lock:
+            pings, self._pings = self._pings, []
+            hops, self._hops = self._hops, []
+        if not pings and not hops:
+            return
+        start = time.perf_counter()
+        try:
+            with self._conn:
+                if pings:
+                    self._conn.executemany(
+                        "INSERT INTO pings (target_id, timestamp, latency, loss) VALUES (?, ?, ?, ?)",
+                        pings,
+                    )
+                    update_rollups(
+                        self._conn, {(p[0], _minute_bucket(p[1])) for p in pings}
+                    )
+                if hops:
+                    self._conn.executemany(
+                        "INSERT INTO hops (target_id, timestamp, hop_num, ip, latency, loss) VALUES (?, ?, ?, ?, ?, ?)",
+                        hops,
+                    )
+        except Exception as e:
+            # Put the batch back so it is retried on the next flush
+            print(
+                f"DATABASE ERROR: Failed to flush {len(pings) + len(hops)} samples: {e}"
+            )
+            self.errors += 1
+            with self._lock:
+                self._pings[:0] = pings
+                self._hops[:0] = hops
+                self._trim()
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.flushes += 1
+        self.rows_written += len(pings) + len(hops)
+        self.last_batch_size = len(pings) + len(hops)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.flush_seconds.observe(elapsed_ms / 1000)
+        self.batch_rows.observe(len(pings) + len(hops))
+
+
+def start_writer(**kwargs):
+    """Route save_ping/save_hop through a background SampleWriter."""
+    global _writer
+    if _writer is None:
+        _writer = SampleWriter(DB_PATH, **kwargs)
+        _writer.start()
+    return _writer
+
+
+def stop_writer():
+    global _writer
+    writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop()
+
+
+def get_writer():
+    return _writer
+
+
+def get_writer_stats():
+    return _writer.stats() if _writer is not None else None
+
+
+def save_ping(target_id, latency, loss, timestamp=None):
+    """Store a sample taken at `timestamp` (Unix seconds, default now)."""
+    if _writer is not None:
+        _writer.save_ping(target_id, latency, loss, timestamp)
+        return
+    _insert_ping(target_id, latency, loss, timestamp)
+
+
+@blocking
+def _insert_ping(target_id, latency, loss, epoch=None):
+    timestamp = _utc_timestamp(epoch)
+    with connection() as conn:
+        cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO pings (target_id, latency, loss) VALUES (?, ?, ?)",
-            (target_id, latency, loss),
+            "INSERT INTO pings (target_id, timestamp, latency, loss) VALUES (?, ?, ?, ?)",
+            (target_id, timestamp, latency, loss),
         )
+        update_rollups(conn, {(target_id, _minute_bucket(timestamp))})
         conn.commit()
-    finally:
-        conn.close()
 
 
 def save_hop(target_id, hop_num, ip, latency, loss):
-    conn = get_db()
-    cursor = conn.cursor()
-    try:
+    if _writer is not None:
+        _writer.save_hop(target_id, hop_num, ip, latency, loss)
+        return
+    _insert_hop(target_id, hop_num, ip, latency, loss)
+
+
+@blocking
+def _insert_hop(target_id, hop_num, ip, latency, loss):
+    with connection() as conn:
+        cursor = conn.cursor()
         cursor.execute(
             "INSERT INTO hops (target_id, hop_num, ip, latency, loss) VALUES (?, ?, ?, ?, ?)",
             (target_id, hop_num, ip, latency, loss),
         )
         conn.commit()
-    finally:
-        conn.close()
 
 
-def get_history(address, hours=24):
-    conn = get_db()
-    cursor = conn.cursor()
-    try:
+HISTORY_SQL = """
+    SELECT timestamp, latency, loss
+    FROM pings
+    WHERE target_id = ? AND timestamp > datetime('now', ?)
+    ORDER BY timestamp ASC, id ASC
+"""
+
+
+SAMPLES_SQL = """
+    SELECT CAST(strftime('%s', timestamp) AS INTEGER), latency
+    FROM pings
+    WHERE target_id = ? AND timestamp > datetime('now', ?)
+    ORDER BY timestamp ASC, id ASC
+"""
+
+
+@blocking
+def get_samples(target_id, hours=24):
+    """(epoch seconds, latency) tuples for analytics, oldest first."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        # Plain tuples: this can be millions of rows
+        cursor.row_factory = None
+        return cursor.execute(SAMPLES_SQL, (target_id, f"-{hours} hours")).fetchall()
+
+
+def _rollup_history_sql(resolution):
+    table, _, bucket_format = ROLLUPS[resolution]
+    # Start from the bucket containing the cutoff so the first bucket is whole
+    return f"""
+        SELECT bucket AS timestamp, latency_avg AS latency,
+               ROUND(100.0 * lost / samples, 2) AS loss,
+               latency_min, latency_max, latency_p95, jitter, samples
+        FROM {table}
+        WHERE target_id = ? AND bucket >= strftime('{bucket_format}', 'now', ?)
+        ORDER BY bucket ASC
+    """
+
+
+def pick_resolution(hours):
+    if hours <= RAW_HISTORY_MAX_HOURS:
+        return "raw"
+    if hours <= MINUTE_HISTORY_MAX_HOURS:
+        return "1m"
+    return "1h"
+
+
+@blocking
+def get_history(address, hours=24, resolution="auto"):
+    if resolution == "auto":
+        resolution = pick_resolution(hours)
+    if resolution != "raw" and resolution not in ROLLUPS:
+        raise ValueError(f"Unknown history resolution: {resolution}")
+    with connection() as conn:
+        cursor = conn.cursor()
         cursor.execute("SELECT id FROM targets WHERE address = ?", (address,))
         row = cursor.fetchone()
         if not row:
             return []
         target_id = row[0]
 
-        cursor.execute(
-            """
-            SELECT timestamp, latency, loss 
-            FROM pings 
-            WHERE target_id = ? AND timestamp > datetime('now', ?)
-            ORDER BY timestamp ASC
-        """,
-            (target_id, f"-{hours} hours"),
-        )
+        sql = HISTORY_SQL if resolution == "raw" else _rollup_history_sql(resolution)
+        cursor.execute(sql, (target_id, f"-{hours} hours"))
 
         return [dict(r) for r in cursor.fetchall()]
-    finally:
-        conn.close()
 
 
+@blocking
 def get_active_targets():
-    conn = get_db()
-    cursor = conn.cursor()
-    try:
+    with connection() as conn:
+        cursor = conn.cursor()
         cursor.execute("SELECT address FROM targets WHERE is_active = 1")
         return [r[0] for r in cursor.fetchall()]
-    finally:
-        conn.close()
 
 
+@blocking
 def deactivate_target(address):
-    conn = get_db()
-    cursor = conn.cursor()
-    try:
+    with connection() as conn:
+        cursor = conn.cursor()
         cursor.execute("UPDATE targets SET is_active = 0 WHERE address = ?", (address,))
         conn.commit()
-    finally:
-        conn.close()
 
 
+@blocking
 def clear_target_history(address):
-    conn = get_db()
-    cursor = conn.cursor()
-    try:
+    with connection() as conn:
+        cursor = conn.cursor()
         cursor.execute("SELECT id FROM targets WHERE address = ?", (address,))
         row = cursor.fetchone()
         if row:
             target_id = row[0]
             cursor.execute("DELETE FROM pings WHERE target_id = ?", (target_id,))
             cursor.execute("DELETE FROM hops WHERE target_id = ?", (target_id,))
+            for table, _, _ in ROLLUPS.values():
+                cursor.execute(f"DELETE FROM {table} WHERE target_id = ?", (target_id,))
+            cursor.execute(
+                "DELETE FROM latency_sketches WHERE target_id = ?", (target_id,)
+            )
+            cursor.execute("DELETE FROM paths WHERE target_id = ?", (target_id,))
             conn.commit()
-    finally:
-        conn.close()
 
 
+@blocking
 def get_raw_data(address):
-    conn = get_db()
-    cursor = conn.cursor()
-    try:
+    with connection() as conn:
+        cursor = conn.cursor()
         cursor.execute("SELECT id FROM targets WHERE address = ?", (address,))
         row = cursor.fetchone()
         if not row:
@@ -194,8 +847,203 @@ def get_raw_data(address):
         )
 
         return [dict(r) for r in cursor.fetchall()]
-    finally:
-        conn.close()
+
+
+@blocking
+def save_ip_info(ip, isp, location, expires_at):
+    with connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO ip_info (ip, isp, location, expires_at) VALUES (?, ?, ?, ?)",
+            (ip, isp, location, expires_at),
+        )
+        conn.commit()
+
+
+@blocking
+def load_ip_info(now, limit):
+    """Unexpired cached lookups, longest-lived first."""
+    with connection() as conn:
+        conn.execute("DELETE FROM ip_info WHERE expires_at <= ?", (now,))
+        conn.commit()
+        rows = conn.execute(
+            "SELECT ip, isp, location, expires_at FROM ip_info "
+            "ORDER BY expires_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+
+@blocking
+def save_latency_sketches(rows):
+    """Upsert (target_id, updated_at, data) checkpoints in one transaction."""
+    with connection() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO latency_sketches (target_id, updated_at, data) "
+            "VALUES (?, ?, ?)",
+            rows,
+        )
+        conn.commit()
+
+
+@blocking
+def load_latency_sketch(target_id):
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT data FROM latency_sketches WHERE target_id = ?", (target_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+
+def path_changes(old, new):
+    """[{"ttl", "old", "new"}] for every TTL whose hop differs between two paths."""
+    old, new = dict(old), dict(new)
+    return [
+        {"ttl": ttl, "old": old.get(ttl), "new": new.get(ttl)}
+        for ttl in sorted(old.keys() | new.keys())
+        if old.get(ttl) != new.get(ttl)
+    ]
+
+
+@blocking
+def record_path(target_id, hops, epoch=None):
+    """Note that a target's route is `hops`, a list of (ttl, ip), at `epoch`.
+
+    An unchanged route only moves the current row's last_seen forward; a
+    different one opens a new row. Returns the previous hops on a change,
+    None otherwise (including the first path ever recorded).
+    """
+    now = _utc_timestamp(epoch)
+    data = json.dumps([[ttl, ip] for ttl, ip in hops])
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT id, hops FROM paths WHERE target_id = ? "
+            "ORDER BY first_seen DESC, id DESC LIMIT 1",
+            (target_id,),
+        ).fetchone()
+        if row is not None and row["hops"] == data:
+            conn.execute(
+                "UPDATE paths SET last_seen = ? WHERE id = ?", (now, row["id"])
+            )
+            previous = None
+        else:
+            conn.execute(
+                "INSERT INTO paths (target_id, first_seen, last_seen, hops) "
+                "VALUES (?, ?, ?, ?)",
+                (target_id, now, now, data),
+            )
+            previous = [tuple(hop) for hop in json.loads(row["hops"])] if row else None
+        conn.commit()
+    return previous
+
+
+@blocking
+def get_path_history(address, hours=24 * 7):
+    """Routes in use within the last `hours`, oldest first.
+
+    Each carries its hops and, except for the very first route recorded, the
+    TTLs that changed relative to the route before it.
+    """
+    with connection() as conn:
+        target = conn.execute(
+            "SELECT id FROM targets WHERE address = ?", (address,)
+        ).fetchone()
+        if target is None:
+            return []
+        # Routes are few; diff over all of them so the window's first entry
+        # is compared with the route that preceded it
+        rows = conn.execute(
+            "SELECT first_seen, last_seen, last_seen > datetime('now', ?) AS recent, "
+            "hops FROM paths WHERE target_id = ? ORDER BY first_seen, id",
+            (f"-{hours} hours", target[0]),
+        ).fetchall()
+    history, previous = [], None
+    for row in rows:
+        hops = [tuple(hop) for hop in json.loads(row["hops"])]
+        if row["recent"]:
+            history.append(
+                {
+                    "first_seen": row["first_seen"],
+                    "last_seen": row["last_seen"],
+                    "hops": [{"ttl": ttl, "ip": ip} for ttl, ip in hops],
+                    "changes": (
+                        path_changes(previous, hops) if previous is not None else None
+                    ),
+                }
+            )
+        previous = hops
+    return history
+
+
+EXPORT_PAGE_SIZE = 1000
+
+# Keyset pagination: each page resumes after the last (timestamp, id) seen, so
+# every page is an index range scan and no connection is held between pages.
+_EXPORT_SQL = {
+    "pings": """
+        SELECT id, timestamp, latency, loss FROM pings
+        WHERE target_id = ? AND (timestamp, id) > (?, ?) AND timestamp < ?
+        ORDER BY timestamp ASC, id ASC
+        LIMIT ?
+    """,
+    "hops": """
+        SELECT id, timestamp, latency, loss, hop_num, ip FROM hops
+        WHERE target_id = ? AND (timestamp, id) > (?, ?) AND timestamp < ?
+        ORDER BY timestamp ASC, id ASC
+        LIMIT ?
+    """,
+}
+
+
+@blocking
+def get_target_id(address):
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT id FROM targets WHERE address = ?", (address,)
+        ).fetchone()
+        return row[0] if row else None
+
+
+@blocking
+def _fetch_page(sql, params):
+    with connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def iter_samples(table, target_id, start=None, end=None, page_size=EXPORT_PAGE_SIZE):
+    """Yield rows of pings or hops for a target in time order, one page at a time."""
+    sql = _EXPORT_SQL[table]
+    # Open bounds as text so they compare against the stored timestamp strings
+    last_timestamp, last_id = start or "", 0
+    end = end or "9999-12-31 23:59:59"
+    while True:
+        rows = _fetch_page(sql, (target_id, last_timestamp, last_id, end, page_size))
+        yield from rows
+        if len(rows) < page_size:
+            return
+        last_timestamp, last_id = rows[-1]["timestamp"], rows[-1]["id"]
+
+
+def iter_export_rows(address, start=None, end=None, include_hops=True):
+    """Yield (timestamp, latency, loss, hop_num, ip) rows for a CSV export.
+
+    Ping rows leave hop_num and ip empty. Pings and hops are merged in
+    timestamp order while both are streamed, so memory stays flat.
+    """
+    target_id = get_target_id(address)
+    if target_id is None:
+        return
+    pings = (
+        (r["timestamp"], r["latency"], r["loss"], None, None)
+        for r in iter_samples("pings", target_id, start, end)
+    )
+    if not include_hops:
+        yield from pings
+        return
+    hops = (
+        (r["timestamp"], r["latency"], r["loss"], r["hop_num"], r["ip"])
+        for r in iter_samples("hops", target_id, start, end)
+    )
+    yield from heapq.merge(pings, hops, key=lambda row: row[0])
 
 
 if __name__ == "__main__":
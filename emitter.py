@@ -0,0 +1,332 @@
+"""Per-session coalescing of ping/hop updates into one Socket.IO frame per tick.
+
+Probe loops publish full payloads; each subscribed session keeps only the
+latest payload per (kind, target, key) plus the ping samples seen since its
+last frame. Every tick a session gets at most one "batch" event carrying just
+the fields that changed since the previous frame it was sent:
+
+    {"ping": {target: {"loss": .., "latencies": [..], "raw": [..]}},
+     "hops": {target: {ip: {"avg_latency": .., ...}}}}
+
+The raw ping lines are only included for sessions that asked for them.
+
+Delivery is paced by client acks: a session has at most one frame in flight,
+so a slow client never accumulates an unbounded backlog on the server. What
+happens to updates while it catches up depends on EMIT_POLICY:
+
+- "latest": no new frame is built until the previous one is acked; updates
+  keep collapsing into the latest value per target/hop.
+- "drop_oldest": a frame is still built every tick into a bounded outbox;
+  when it is full the oldest frame is dropped and its keys are resent in full.
+
+Sessions whose acks lag behind their tick are moved to a slower tick (up to
+EMIT_MAX_INTERVAL) and sped back up once they keep pace again.
+"""
+
+import json
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+
+import eventlet
+
+EMIT_INTERVAL = float(os.environ.get("PACKET_TESTER_EMIT_INTERVAL", "0.25"))
+# Matches the dashboard's chart window; older samples would be shifted out anyway
+MAX_SAMPLES_PER_FRAME = 200
+EMIT_POLICY = os.environ.get("PACKET_TESTER_EMIT_POLICY", "latest")
+EMIT_QUEUE_SIZE = int(os.environ.get("PACKET_TESTER_EMIT_QUEUE_SIZE", "8"))
+EMIT_MAX_INTERVAL = float(os.environ.get("PACKET_TESTER_EMIT_MAX_INTERVAL", "4.0"))
+# An unacked frame older than this is written off as lost
+EMIT_ACK_TIMEOUT = float(os.environ.get("PACKET_TESTER_EMIT_ACK_TIMEOUT", "10"))
+# Byte counts cost a json.dumps per update and per frame; off outside benchmarks
+EMIT_MEASURE_BYTES = os.environ.get("PACKET_TESTER_EMIT_MEASURE_BYTES", "0") == "1"
+POLICIES = ("latest", "drop_oldest")
+
+# Per-sample ping fields, sent as lists rather than diffed
+_SAMPLE_FIELDS = ("latency", "raw")
+_IDENTITY_FIELDS = ("target", "ip")
+
+
+def _size(event, data):
+    return len(json.dumps([event, data], separators=(",", ":")))
+
+
+class Session:
+    __slots__ = (
+        "sid",
+        "include_raw",
+        "pending",
+        "samples",
+        "sent",
+        "outbox",
+        "in_flight",
+        "interval",
+        "next_flush",
+        "rtt_ms",
+        "acked",
+        "dropped",
+        "timeouts",
+        "downgrades",
+    )
+
+    def __init__(self, sid, include_raw=False, interval=EMIT_INTERVAL):
+        self.sid = sid
+        self.include_raw = include_raw
+        self.pending = {}
+        self.samples = {}
+        self.sent = {}
+        self.outbox = deque()
+        # (seq, monotonic send time, frame) of the frame awaiting its ack
+        self.in_flight = None
+        self.interval = interval
+        self.next_flush = 0.0
+        self.rtt_ms = None
+        self.acked = 0
+        self.dropped = 0
+        self.timeouts = 0
+        self.downgrades = 0
+
+    def queue(self, kind, target, key, payload):
+        self.pending[(kind, target, key)] = payload
+        if kind == "ping":
+            samples = self.samples.setdefault(target, [])
+            samples.append(payload)
+            del samples[:-MAX_SAMPLES_PER_FRAME]
+
+    def forget(self, target):
+        for store in (self.pending, self.sent):
+            for k in [k for k in store if k[1] == target]:
+                del store[k]
+        self.samples.pop(target, None)
+
+    def resync(self, frame):
+        """Requeue the keys of a lost frame so they go out in full again."""
+        keys = [("ping", target, target) for target in frame.get("ping", {})]
+        for target, hops in frame.get("hops", {}).items():
+            keys.extend(("hop", target, ip) for ip in hops)
+        for k in keys:
+            payload = self.sent.pop(k, None)
+            if payload is not None:
+                self.pending.setdefault(k, payload)
+
+    def build_frame(self):
+        """Drain pending updates into a delta frame; None if nothing changed."""
+        pending, samples = self.pending, self.samples
+        self.pending, self.samples = {}, {}
+        frame = {}
+        for k, payload in pending.items():
+            kind, target, key = k
+            last = self.sent.get(k)
+            first = last is None
+            last = last or {}
+            delta = {
+                f: v
+                for f, v in payload.items()
+                if f not in _SAMPLE_FIELDS
+                and f not in _IDENTITY_FIELDS
+                and (f not in last or last[f] != v)
+            }
+            self.sent[k] = payload
+            if kind == "ping":
+                batch = samples.get(target, [])
+                delta["latencies"] = [p.get("latency") for p in batch]
+                if self.include_raw:
+                    delta["raw"] = [p.get("raw") for p in batch]
+                frame.setdefault("ping", {})[target] = delta
+            elif delta or first:
+                frame.setdefault("hops", {}).setdefault(target, {})[key] = delta
+        return frame or None
+
+
+class FrameEmitter:
+    """Buffers updates per session and flushes them as "batch" events."""
+
+    def __init__(
+        self,
+        socketio,
+        interval=EMIT_INTERVAL,
+        policy=EMIT_POLICY,
+        queue_size=EMIT_QUEUE_SIZE,
+        max_interval=EMIT_MAX_INTERVAL,
+        ack_timeout=EMIT_ACK_TIMEOUT,
+        stage=None,
+        measure_bytes=EMIT_MEASURE_BYTES,
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown emit policy {policy!r}")
+        self.socketio = socketio
+        self.interval = interval
+        self.policy = policy
+        self.queue_size = queue_size
+        self.max_interval = max(max_interval, interval)
+        self.ack_timeout = ack_timeout
+        self.measure_bytes = measure_bytes
+        # Optional profiling hook: stage(name) returns a context manager
+        self.stage = stage or (lambda name: nullcontext())
+        self.sessions = {}
+        self._seq = 0
+        self.updates = 0
+        self.frames = 0
+        self.bytes = 0
+        # What one event per update (the previous protocol) would have cost
+        self.unbatched_frames = 0
+        self.unbatched_bytes = 0
+        self._greenlet = None
+
+    def session(self, sid, include_raw=None):
+        session = self.sessions.get(sid)
+        if session is None:
+            session = self.sessions[sid] = Session(sid, interval=self.interval)
+        if include_raw is not None:
+            session.include_raw = include_raw
+        return session
+
+    def remove_session(self, sid):
+        self.sessions.pop(sid, None)
+
+    def forget(self, sid, target):
+        session = self.sessions.get(sid)
+        if session is not None:
+            session.forget(target)
+
+    def publish(self, sids, kind, target, key, payload):
+        recipients = [self.sessions[s] for s in sids if s in self.sessions]
+        if not recipients:
+            return
+        self.updates += 1
+        self.unbatched_frames += len(recipients)
+        if self.measure_bytes:
+            event = "ping_result" if kind == "ping" else "hop_update"
+            self.unbatched_bytes += _size(event, payload) * len(recipients)
+        for session in recipients:
+            session.queue(kind, target, key, payload)
+
+    def flush(self, now=None):
+        now = time.monotonic() if now is None else now
+        for session in list(self.sessions.values()):
+            if now < session.next_flush:
+                continue
+            session.next_flush = now + session.interval
+            if session.in_flight is not None:
+                if now - session.in_flight[1] < self.ack_timeout:
+                    if self.policy == "latest":
+                        # Keep collapsing into pending until the client acks
+                        continue
+                else:
+                    session.timeouts += 1
+                    session.resync(session.in_flight[2])
+                    session.in_flight = None
+                    self._slow_down(session)
+            frame = session.build_frame()
+            if frame is not None:
+                session.outbox.append(frame)
+                while len(session.outbox) > self.queue_size:
+                    session.dropped += 1
+                    session.resync(session.outbox.popleft())
+                    self._slow_down(session)
+            self._deliver(session, now)
+
+    def ack(self, sid, seq, now=None):
+        session = self.sessions.get(sid)
+        if session is None or session.in_flight is None:
+            return
+        if session.in_flight[0] != seq:
+            return
+        now = time.monotonic() if now is None else now
+        rtt_ms = (now - session.in_flight[1]) * 1000
+        session.in_flight = None
+        session.acked += 1
+        session.rtt_ms = (
+            rtt_ms if session.rtt_ms is None else 0.8 * session.rtt_ms + 0.2 * rtt_ms
+        )
+        if session.rtt_ms > session.interval * 1000:
+            self._slow_down(session)
+        elif (
+            session.rtt_ms < session.interval * 250
+            and not session.outbox
+            and session.interval > self.interval
+        ):
+            session.interval = max(self.interval, session.interval / 2)
+        self._deliver(session, now)
+
+    def _slow_down(self, session):
+        if session.interval < self.max_interval:
+            session.interval = min(self.max_interval, session.interval * 2)
+            session.downgrades += 1
+
+    def _deliver(self, session, now):
+        if session.in_flight is not None or not session.outbox:
+            return
+        frame = session.outbox.popleft()
+        self._seq += 1
+        seq, sid = self._seq, session.sid
+        session.in_flight = (seq, now, frame)
+        self.frames += 1
+        if self.measure_bytes:
+            self.bytes += _size("batch", frame)
+        self.socketio.emit(
+            "batch", frame, to=sid, callback=lambda *_: self.ack(sid, seq)
+        )
+
+    def start(self):
+        def run():
+            while True:
+                eventlet.sleep(self.interval)
+                try:
+                    with self.stage("emit_flush"):
+                        self.flush()
+                except Exception as e:
+                    print(f"ERROR in frame emitter: {e}")
+
+        self._greenlet = eventlet.spawn(run)
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill()
+            self._greenlet = None
+
+    def client_stats(self, now=None):
+        """Per-session lag: queued frames, age of the unacked frame, ack RTT."""
+        now = time.monotonic() if now is None else now
+        return {
+            sid: {
+                "interval": s.interval,
+                "queued": len(s.outbox),
+                "lag_ms": (
+                    round((now - s.in_flight[1]) * 1000, 1) if s.in_flight else 0
+                ),
+                "rtt_ms": round(s.rtt_ms, 1) if s.rtt_ms is not None else None,
+                "acked": s.acked,
+                "dropped": s.dropped,
+                "timeouts": s.timeouts,
+                "downgrades": s.downgrades,
+            }
+            for sid, s in list(self.sessions.items())
+        }
+
+    def stats(self):
+        sessions = list(self.sessions.values())
+        return {
+            "sessions": len(sessions),
+            "policy": self.policy,
+            "interval": self.interval,
+            "downgraded_sessions": sum(s.interval > self.interval for s in sessions),
+            "dropped_frames": sum(s.dropped for s in sessions),
+            "clients": self.client_stats(),
+            "updates": self.updates,
+            "frames": self.frames,
+            "bytes": self.bytes if self.measure_bytes else None,
+            "unbatched_frames": self.unbatched_frames,
+            "unbatched_bytes": self.unbatched_bytes if self.measure_bytes else None,
+            "frame_reduction": (
+                round(1 - self.frames / self.unbatched_frames, 3)
+                if self.unbatched_frames
+                else None
+            ),
+            "byte_reduction": (
+                round(1 - self.bytes / self.unbatched_bytes, 3)
+                if self.measure_bytes and self.unbatched_bytes
+                else None
+            ),
+        }
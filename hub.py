@@ -0,0 +1,112 @@
+"""Keeping the eventlet hub responsive.
+
+monkey_patch() makes sockets, sleeps and subprocess pipes cooperative, but not
+sqlite3: a commit, or a 20 s busy wait on a locked database, runs on the hub
+and freezes every probe loop and websocket with it. Functions marked
+@blocking run on eventlet's native thread pool (tpool) instead while the
+calling greenlet waits cooperatively. At most BLOCKING_MAX_PENDING calls are
+handed to the pool at once; further callers queue as greenlets.
+
+Called from a native thread (the sample writer, or a @blocking function
+calling another) or without monkey-patching, a @blocking function runs
+directly.
+
+StallMonitor measures how late a periodic greenlet wakes up: any lag is time
+the hub spent running something that did not yield.
+"""
+
+import functools
+import os
+import time
+from collections import deque
+
+import eventlet
+from eventlet import tpool
+from eventlet.patcher import is_monkey_patched, original
+from eventlet.semaphore import Semaphore
+
+# Unpatched module for code that must run on, or be shared with, OS threads
+real_threading = original("threading")
+
+BLOCKING_MAX_PENDING = int(os.environ.get("PACKET_TESTER_BLOCKING_MAX_PENDING", "16"))
+STALL_THRESHOLD_MS = float(os.environ.get("PACKET_TESTER_STALL_THRESHOLD_MS", "100"))
+STALL_CHECK_INTERVAL = 0.05
+
+hub_thread = real_threading.get_ident()
+_pending = Semaphore(BLOCKING_MAX_PENDING)
+offloaded = 0
+
+
+def call(func, *args, **kwargs):
+    """Run func(*args, **kwargs) on the native thread pool and wait for it."""
+    global offloaded
+    if real_threading.get_ident() != hub_thread or not is_monkey_patched("thread"):
+        return func(*args, **kwargs)
+    with _pending:
+        offloaded += 1
+        return tpool.execute(func, *args, **kwargs)
+
+
+def blocking(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return call(func, *args, **kwargs)
+
+    return wrapper
+
+
+def pool_stats():
+    return {
+        "offloaded": offloaded,
+        "waiting": max(0, -_pending.balance),
+        "in_pool": BLOCKING_MAX_PENDING - max(0, _pending.balance),
+    }
+
+
+class StallMonitor:
+    def __init__(
+        self,
+        threshold_ms=STALL_THRESHOLD_MS,
+        interval=STALL_CHECK_INTERVAL,
+        clock=time.perf_counter,
+    ):
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self.clock = clock
+        self.checks = 0
+        self.stalls = 0
+        self.max_lag_ms = 0.0
+        self.recent = deque(maxlen=20)
+        self._greenlet = None
+
+    def record(self, lag_ms):
+        self.checks += 1
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        if lag_ms < self.threshold_ms:
+            return False
+        self.stalls += 1
+        self.recent.append({"at": time.time(), "lag_ms": round(lag_ms, 1)})
+        print(f"WARNING: event loop stalled for {lag_ms:.0f} ms")
+        return True
+
+    def start(self):
+        self._greenlet = eventlet.spawn(self._run)
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill()
+
+    def _run(self):
+        while True:
+            started = self.clock()
+            eventlet.sleep(self.interval)
+            self.record((self.clock() - started - self.interval) * 1000)
+
+    def stats(self):
+        return {
+            "threshold_ms": self.threshold_ms,
+            "checks": self.checks,
+            "stalls": self.stalls,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "recent": list(self.recent),
+        }
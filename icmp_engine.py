@@ -0,0 +1,266 @@
+"""In-process ICMP echo engine built on unprivileged datagram sockets.
+
+One SOCK_DGRAM/IPPROTO_ICMP socket per address family carries the echo
+requests for every target; a receiver loop per socket matches replies back to
+the waiting probe by sequence number. Linux only allows these sockets for
+groups listed in net.ipv4.ping_group_range, so callers check available() and
+fall back to the ping subprocess when it is False. They do the same once
+`failed` is set: a receiver that keeps hitting socket errors gives up rather
+than leaving every probe to time out as if the targets were down.
+"""
+
+import os
+import select
+import socket
+import struct
+import threading
+import time
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+# Linux values; older Pythons do not export all of them
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35)
+IP_RECVTTL = getattr(socket, "IP_RECVTTL", 12)
+IPV6_RECVHOPLIMIT = getattr(socket, "IPV6_RECVHOPLIMIT", 51)
+IPV6_HOPLIMIT = getattr(socket, "IPV6_HOPLIMIT", 52)
+
+PROBE_TIMEOUT = float(os.environ.get("PACKET_TESTER_PROBE_TIMEOUT", "1.0"))
+PAYLOAD_SIZE = 56
+# Consecutive receive errors before the engine is marked failed
+MAX_RECEIVE_ERRORS = 10
+RECEIVE_ERROR_BACKOFF = 0.1
+_HEADER = struct.Struct("!BBHHH")
+_TIMESPEC = struct.Struct("@ll")
+_CMSG_SPACE = socket.CMSG_SPACE(_TIMESPEC.size) + socket.CMSG_SPACE(4)
+
+
+def checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(family, seq, payload):
+    # The kernel rewrites the identifier (and the checksum) on datagram sockets
+    kind = ICMP_ECHO_REQUEST if family == socket.AF_INET else ICMPV6_ECHO_REQUEST
+    header = _HEADER.pack(kind, 0, 0, 0, seq)
+    csum = checksum(header + payload)
+    return _HEADER.pack(kind, 0, csum, 0, seq) + payload
+
+
+def parse_echo_reply(family, packet):
+    """Return (identifier, sequence) for an echo reply, else None."""
+    if len(packet) < _HEADER.size:
+        return None
+    kind, _, _, ident, seq = _HEADER.unpack_from(packet)
+    expected = ICMP_ECHO_REPLY if family == socket.AF_INET else ICMPV6_ECHO_REPLY
+    if kind != expected:
+        return None
+    return ident, seq
+
+
+def parse_ancillary(ancdata):
+    """Extract (kernel receive time in ns, TTL/hop limit) from recvmsg cmsgs."""
+    received_ns, ttl = None, None
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS:
+            sec, nsec = _TIMESPEC.unpack_from(data)
+            received_ns = sec * 1_000_000_000 + nsec
+        elif level == socket.IPPROTO_IP and kind == socket.IP_TTL:
+            ttl = struct.unpack_from("@i", data)[0] if len(data) >= 4 else data[0]
+        elif level == socket.IPPROTO_IPV6 and kind == IPV6_HOPLIMIT:
+            ttl = struct.unpack_from("@i", data)[0]
+    return received_ns, ttl
+
+
+def _open_socket(family):
+    proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+    sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+    # Binding assigns the echo identifier up front (the kernel uses the port)
+    sock.bind(("0.0.0.0" if family == socket.AF_INET else "::", 0))
+    sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+    if family == socket.AF_INET:
+        sock.setsockopt(socket.IPPROTO_IP, IP_RECVTTL, 1)
+    else:
+        sock.setsockopt(socket.IPPROTO_IPV6, IPV6_RECVHOPLIMIT, 1)
+    return sock
+
+
+class _Pending:
+    __slots__ = ("address", "sent_ns", "done", "result")
+
+    def __init__(self, address, sent_ns):
+        self.address = address
+        self.sent_ns = sent_ns
+        self.done = threading.Event()
+        self.result = None
+
+
+class IcmpProbeEngine:
+    """Send echo requests to many targets over shared ICMP datagram sockets."""
+
+    def __init__(self, timeout=PROBE_TIMEOUT):
+        self.timeout = timeout
+        self.sent = 0
+        self.received = 0
+        self.timeouts = 0
+        self.receive_errors = 0
+        self.failed = None
+        self._sockets = {}
+        self._next_seq = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    @staticmethod
+    def available(family=socket.AF_INET):
+        try:
+            _open_socket(family).close()
+            return True
+        except OSError:
+            return False
+
+    def start(self):
+        for family in (socket.AF_INET, socket.AF_INET6):
+            try:
+                sock = _open_socket(family)
+            except OSError as e:
+                if family == socket.AF_INET:
+                    raise
+                print(f"ICMP engine: IPv6 unavailable ({e})")
+                continue
+            self._sockets[family] = sock
+            self._next_seq[family] = 0
+            thread = threading.Thread(
+                target=self._receive_loop,
+                args=(family, sock),
+                name=f"icmp-recv-{family.name}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(2)
+        for sock in self._sockets.values():
+            sock.close()
+        self._sockets.clear()
+        self._threads = []
+
+    def supports(self, family):
+        """Whether probe() can reach addresses of this family."""
+        return not self.failed and family in self._sockets
+
+    def resolve(self, target):
+        """Return (family, address) for a hostname or IP literal."""
+        infos = socket.getaddrinfo(target, None, type=socket.SOCK_DGRAM)
+        for family, _, _, _, sockaddr in infos:
+            if family in self._sockets:
+                return family, sockaddr[0]
+        raise OSError(f"No usable address family for {target}")
+
+    def probe(self, address, family=socket.AF_INET, timeout=None):
+        """Send one echo request and wait for its reply.
+
+        Returns a dict with seq, rtt_ms, ttl and the send/receive wall-clock
+        times (seconds, microsecond precision), or None if no reply arrived
+        within the timeout, or the engine has no socket for the family.
+        """
+        sock = self._sockets.get(family)
+        if self.failed or sock is None:
+            return None
+        with self._lock:
+            seq = self._allocate_seq(family)
+            pending = _Pending(address, 0)
+            self._pending[(family, seq)] = pending
+        packet = build_echo_request(family, seq, os.urandom(PAYLOAD_SIZE))
+        try:
+            pending.sent_ns = time.time_ns()
+            sock.sendto(packet, (address, 0))
+            self.sent += 1
+            pending.done.wait(self.timeout if timeout is None else timeout)
+            # done is also set, with no result, when the receiver gives up
+            if pending.result is not None:
+                self.received += 1
+                return pending.result
+            self.timeouts += 1
+            return None
+        except OSError as e:
+            print(f"ICMP engine: send to {address} failed: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop((family, seq), None)
+
+    def _allocate_seq(self, family):
+        # 16-bit sequence space shared by every target on this socket
+        for _ in range(0x10000):
+            seq = self._next_seq[family]
+            self._next_seq[family] = (seq + 1) & 0xFFFF
+            if (family, seq) not in self._pending:
+                return seq
+        raise RuntimeError("ICMP engine: no free sequence numbers")
+
+    def _receive_loop(self, family, sock):
+        ident = sock.getsockname()[1]
+        errors = 0
+        while not self._stopping.is_set():
+            try:
+                readable, _, _ = select.select([sock], [], [], 0.5)
+                if not readable:
+                    continue
+                packet, ancdata, _, sender = sock.recvmsg(2048, _CMSG_SPACE)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                if self._stopping.is_set():
+                    return
+                self.receive_errors += 1
+                errors += 1
+                print(f"ICMP engine: receive on {family.name} failed: {e}")
+                if errors >= MAX_RECEIVE_ERRORS:
+                    self._fail(f"receiver stopped after {errors} errors: {e}")
+                    return
+                time.sleep(RECEIVE_ERROR_BACKOFF)
+                continue
+            errors = 0
+            self._handle_reply(family, ident, packet, ancdata, sender[0])
+
+    def _fail(self, reason):
+        print(f"ICMP engine: {reason}")
+        self.failed = reason
+        # Nothing will answer the probes in flight; let them give up now
+        with self._lock:
+            for pending in self._pending.values():
+                pending.done.set()
+
+    def _handle_reply(self, family, ident, packet, ancdata, sender):
+        fallback_ns = time.time_ns()
+        parsed = parse_echo_reply(family, packet)
+        if parsed is None or parsed[0] != ident:
+            return
+        with self._lock:
+            pending = self._pending.get((family, parsed[1]))
+        if pending is None or pending.address != sender or pending.done.is_set():
+            return
+        received_ns, ttl = parse_ancillary(ancdata)
+        received_ns = received_ns or fallback_ns
+        pending.result = {
+            "address": sender,
+            "seq": parsed[1],
+            "ttl": ttl,
+            "bytes": len(packet),
+            "rtt_ms": round((received_ns - pending.sent_ns) / 1e6, 3),
+            "sent_at": round(pending.sent_ns / 1e9, 6),
+            "received_at": round(received_ns / 1e9, 6),
+        }
+        pending.done.set()
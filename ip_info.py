@@ -0,0 +1,244 @@
+import ipaddress
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import eventlet
+import requests
+
+import database
+from ip_ranges import OfflineResolver
+
+IP_INFO_CACHE_SIZE = int(os.environ.get("PACKET_TESTER_IP_INFO_CACHE_SIZE", "4096"))
+IP_INFO_TTL = float(os.environ.get("PACKET_TESTER_IP_INFO_TTL", str(7 * 86400)))
+# Failed lookups are remembered briefly so an unreachable API is not retried
+# for every hop, but soon enough that a transient outage heals itself.
+IP_INFO_NEGATIVE_TTL = float(
+    os.environ.get("PACKET_TESTER_IP_INFO_NEGATIVE_TTL", "600")
+)
+IP_INFO_LOOKUP_TIMEOUT = 2
+IP_INFO_WORKERS = int(os.environ.get("PACKET_TESTER_IP_INFO_WORKERS", "4"))
+# Local ASN/GeoIP dataset (CSV or .mmdb, see ip_ranges.py). When set it answers
+# first; ip-api.com is only consulted for misses, and only if HTTP is enabled.
+IP_DATASET = os.environ.get("PACKET_TESTER_IP_DATASET", "")
+IP_DATASET_RELOAD_INTERVAL = float(
+    os.environ.get("PACKET_TESTER_IP_DATASET_RELOAD_INTERVAL", "30")
+)
+IP_INFO_HTTP = os.environ.get("PACKET_TESTER_IP_INFO_HTTP", "1") != "0"
+
+UNKNOWN = {"isp": "Unknown ISP", "location": "Unknown"}
+PENDING = {"isp": "Looking up...", "location": "-"}
+LOCAL = {"isp": "Local Network", "location": "Private IP"}
+_CGNAT = ipaddress.ip_network("100.64.0.0/10")
+
+
+class IpInfoCache:
+    """LRU of ip -> {"isp", "location"} with per-entry expiry.
+
+    Entries are written through to the ip_info table and reloaded by load(), so
+    a restarted server starts warm. Reads behave like a dict for the hot path.
+    """
+
+    def __init__(
+        self,
+        max_size=IP_INFO_CACHE_SIZE,
+        ttl=IP_INFO_TTL,
+        negative_ttl=IP_INFO_NEGATIVE_TTL,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, ip, count=True):
+        with self._lock:
+            entry = self._entries.get(ip)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self._entries[ip]
+                self.misses += count
+                return None
+            self._entries.move_to_end(ip)
+            self.hits += count
+            return entry[0]
+
+    def peek(self, ip):
+        """get() without touching the hit/miss counters."""
+        return self.get(ip, count=False)
+
+    def put(self, ip, info, ttl=None, persist=True):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[ip] = (info, expires_at)
+            self._entries.move_to_end(ip)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        if persist:
+            try:
+                database.save_ip_info(ip, info["isp"], info["location"], expires_at)
+            except Exception as e:
+                print(f"Error persisting IP info for {ip}: {e}")
+
+    def load(self):
+        """Warm the cache from the ip_info table; returns entries loaded."""
+        rows = database.load_ip_info(time.time(), self.max_size)
+        with self._lock:
+            # Oldest expiry first so the longest-lived entries end up most recent
+            for row in reversed(rows):
+                info = {"isp": row["isp"], "location": row["location"]}
+                self._entries[row["ip"]] = (info, row["expires_at"])
+        return len(rows)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+    def __contains__(self, ip):
+        return self.get(ip) is not None
+
+    def __getitem__(self, ip):
+        info = self.get(ip)
+        if info is None:
+            raise KeyError(ip)
+        return info
+
+    def __setitem__(self, ip, info):
+        self.put(ip, info, persist=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+ip_info_cache = IpInfoCache()
+_lookup_pool = eventlet.GreenPool(IP_INFO_WORKERS)
+_in_flight = {}
+offline_resolver = None
+
+
+def load_offline_resolver(path=IP_DATASET, reload_interval=IP_DATASET_RELOAD_INTERVAL):
+    """Load the local IP dataset and watch it for changes; None if unset."""
+    global offline_resolver
+    if not path:
+        return None
+    resolver = OfflineResolver(path)
+    try:
+        resolver.load()
+    except Exception as e:
+        print(f"Error loading IP dataset {path}: {e}")
+        return None
+    if reload_interval:
+        resolver.watch(reload_interval)
+    offline_resolver = resolver
+    return resolver
+
+
+def is_private(ip):
+    """True for RFC 1918, CGNAT, loopback, link-local and IPv6 ULA addresses."""
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return False
+    if addr.version == 6 and addr.ipv4_mapped:
+        addr = addr.ipv4_mapped
+    return addr.is_private or addr.is_loopback or addr.is_link_local or addr in _CGNAT
+
+
+def _local_info(ip):
+    """Answer from private ranges or the offline dataset, else None."""
+    if is_private(ip):
+        return dict(LOCAL)
+    if offline_resolver is not None:
+        return offline_resolver.lookup(ip)
+    return None
+
+
+def fetch_ip_info(ip):
+    """Query ip-api.com; returns (info, ttl) with a short ttl on failure."""
+    try:
+        resp = requests.get(
+            f"http://ip-api.com/json/{ip}", timeout=IP_INFO_LOOKUP_TIMEOUT
+        )
+        data = resp.json()
+        if data.get("status") == "success":
+            return {
+                "isp": data.get("isp", "Unknown ISP"),
+                "location": f"{data.get('city', '')}, {data.get('countryCode', '')}".strip(
+                    ", "
+                ),
+            }, ip_info_cache.ttl
+        return dict(UNKNOWN), ip_info_cache.ttl
+    except Exception as e:
+        print(f"Error looking up IP {ip}: {e}")
+        return dict(UNKNOWN), ip_info_cache.negative_ttl
+
+
+def get_ip_info(ip):
+    if not ip or ip == "*":
+        return {"isp": "-", "location": "-"}
+    info = _local_info(ip)
+    if info is not None:
+        return info
+    info = ip_info_cache.get(ip)
+    if info is not None:
+        return info
+    if not IP_INFO_HTTP:
+        return dict(UNKNOWN)
+    return _fetch(ip)
+
+
+def _fetch(ip):
+    # Callers have already counted the miss; the entry may have arrived since
+    info = ip_info_cache.peek(ip)
+    if info is not None:
+        return info
+    info, ttl = fetch_ip_info(ip)
+    ip_info_cache.put(ip, info, ttl)
+    return info
+
+
+def get_ip_info_async(ip, callback):
+    """Return cached info now, or PENDING and call callback(info) once resolved.
+
+    Concurrent requests for the same IP share one lookup, and lookups run on a
+    small worker pool so they never stall the caller.
+    """
+    if not ip or ip == "*":
+        return {"isp": "-", "location": "-"}
+    info = _local_info(ip) or ip_info_cache.get(ip)
+    if info is not None:
+        return info
+    if not IP_INFO_HTTP:
+        return dict(UNKNOWN)
+    callbacks = _in_flight.get(ip)
+    if callbacks is not None:
+        callbacks.append(callback)
+        return PENDING
+    _in_flight[ip] = [callback]
+    _lookup_pool.spawn_n(_resolve, ip)
+    return PENDING
+
+
+def _resolve(ip):
+    try:
+        info = _fetch(ip)
+    except Exception as e:
+        print(f"Error resolving IP {ip}: {e}")
+        info = dict(UNKNOWN)
+    for callback in _in_flight.pop(ip, []):
+        try:
+            callback(info)
+        except Exception as e:
+            print(f"Error delivering IP info for {ip}: {e}")
@@ -0,0 +1,179 @@
+"""Offline IP-range -> ASN/ISP/location resolver.
+
+Loads a local dataset into two sorted range indexes (IPv4 and IPv6) searched
+by bisection, so hop metadata resolves without network access. Supported
+inputs:
+
+- CSV with a header naming either ``network`` (CIDR) or ``start_ip`` and
+  ``end_ip``, plus any of ``asn``, ``isp``, ``city`` and ``country``.
+- MaxMind-style ``.mmdb`` files, when the optional ``maxminddb`` package is
+  installed (ASN and City/GeoLite layouts are understood).
+
+Ranges must not overlap. load() and maybe_reload() swap in a freshly built
+index atomically, so lookups keep working while a new dataset loads.
+"""
+
+import csv
+import ipaddress
+import os
+import socket
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+try:
+    import maxminddb
+except ImportError:  # optional, only needed for .mmdb datasets
+    maxminddb = None
+
+
+class RangeIndex:
+    """Sorted, non-overlapping [start, end] integer ranges mapped to records."""
+
+    __slots__ = ("starts", "ends", "slots", "records")
+
+    def __init__(self, starts, ends, slots, records):
+        self.starts = starts
+        self.ends = ends
+        self.slots = slots
+        self.records = records
+
+    @classmethod
+    def build(cls, rows, bits):
+        # Identical records (same ASN/ISP/location) are stored once
+        rows = sorted(rows)
+        records, record_ids = [], {}
+        # IPv4 fits packed 32-bit arrays; IPv6 needs Python ints
+        starts = array("I") if bits == 32 else []
+        ends = array("I") if bits == 32 else []
+        slots = array("I")
+        for start, end, record in rows:
+            slot = record_ids.get(record)
+            if slot is None:
+                slot = record_ids[record] = len(records)
+                records.append(record)
+            starts.append(start)
+            ends.append(end)
+            slots.append(slot)
+        return cls(starts, ends, slots, records)
+
+    def find(self, value):
+        i = bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            return self.records[self.slots[i]]
+        return None
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def _location(city, country):
+    return f"{city or ''}, {country or ''}".strip(", ") or "Unknown"
+
+
+def _record(asn, isp, city, country):
+    asn = str(asn).upper().removeprefix("AS") if asn else ""
+    return (f"AS{asn}" if asn else "", isp or "Unknown ISP", _location(city, country))
+
+
+def _csv_rows(path):
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            if row.get("network"):
+                network = ipaddress.ip_network(row["network"].strip(), strict=False)
+                first, last = network.network_address, network.broadcast_address
+            else:
+                first = ipaddress.ip_address(row["start_ip"].strip())
+                last = ipaddress.ip_address(row["end_ip"].strip())
+            yield first.version, int(first), int(last), _record(
+                row.get("asn"), row.get("isp"), row.get("city"), row.get("country")
+            )
+
+
+def _mmdb_rows(path):
+    if maxminddb is None:
+        raise RuntimeError("Reading .mmdb datasets requires the maxminddb package")
+    with maxminddb.open_database(path) as reader:
+        for network, data in reader:
+            data = data or {}
+            city = (data.get("city") or {}).get("names", {}).get("en")
+            country = (data.get("country") or {}).get("iso_code")
+            yield network.version, int(network.network_address), int(
+                network.broadcast_address
+            ), _record(
+                data.get("autonomous_system_number"),
+                data.get("autonomous_system_organization") or data.get("isp"),
+                city,
+                country,
+            )
+
+
+def load_ranges(path):
+    """Build (ipv4 index, ipv6 index) from a CSV or MMDB dataset."""
+    rows = _mmdb_rows(path) if path.endswith(".mmdb") else _csv_rows(path)
+    v4, v6 = [], []
+    for version, start, end, record in rows:
+        (v4 if version == 4 else v6).append((start, end, record))
+    return RangeIndex.build(v4, 32), RangeIndex.build(v6, 128)
+
+
+class OfflineResolver:
+    def __init__(self, path):
+        self.path = path
+        self.loaded_at = None
+        self._mtime = None
+        self._indexes = (RangeIndex.build([], 32), RangeIndex.build([], 128))
+        self._stopping = threading.Event()
+
+    def load(self):
+        mtime = os.path.getmtime(self.path)
+        started = time.perf_counter()
+        indexes = load_ranges(self.path)
+        # Single reference swap: concurrent lookups see the old or new index
+        self._indexes, self._mtime = indexes, mtime
+        self.loaded_at = time.time()
+        print(
+            f"Loaded {len(indexes[0])} IPv4 and {len(indexes[1])} IPv6 ranges "
+            f"from {self.path} in {time.perf_counter() - started:.2f}s"
+        )
+
+    def maybe_reload(self):
+        try:
+            if os.path.getmtime(self.path) != self._mtime:
+                self.load()
+                return True
+        except Exception as e:
+            print(f"Error reloading IP dataset {self.path}: {e}")
+        return False
+
+    def watch(self, interval=30):
+        """Reload the dataset in the background whenever the file changes."""
+
+        def run():
+            while not self._stopping.wait(interval):
+                self.maybe_reload()
+
+        threading.Thread(target=run, name="ip-ranges-watch", daemon=True).start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def lookup(self, ip):
+        """Return {"asn", "isp", "location"} for an IP literal, or None."""
+        v4, v6 = self._indexes
+        try:
+            if ":" in ip:
+                packed = socket.inet_pton(socket.AF_INET6, ip)
+                record = v6.find(int.from_bytes(packed, "big"))
+            else:
+                packed = socket.inet_pton(socket.AF_INET, ip)
+                record = v4.find(int.from_bytes(packed, "big"))
+        except OSError:
+            return None
+        if record is None:
+            return None
+        return {"asn": record[0], "isp": record[1], "location": record[2]}
+
+    def __len__(self):
+        return len(self._indexes[0]) + len(self._indexes[1])
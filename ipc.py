@@ -0,0 +1,204 @@
+"""Collector -> web worker fan-out over a local Unix socket.
+
+Messages are newline-delimited JSON objects. The collector process runs an
+IpcServer: every connected web worker receives every published sample and
+can send commands back (start/stop a target). Each connection has a bounded
+outbound queue; a worker that stops reading loses its oldest messages rather
+than stalling the probes. IpcClient reconnects on its own, so the collector
+and web workers can be restarted independently.
+"""
+
+import json
+import os
+import socket
+import tempfile
+
+import eventlet
+from eventlet.queue import LightQueue
+
+IPC_SOCKET = os.environ.get(
+    "PACKET_TESTER_IPC_SOCKET",
+    os.path.join(tempfile.gettempdir(), "packet-tester.sock"),
+)
+IPC_QUEUE_SIZE = int(os.environ.get("PACKET_TESTER_IPC_QUEUE_SIZE", "10000"))
+IPC_RECONNECT_INTERVAL = 1.0
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+class Connection:
+    def __init__(self, sock, queue_size=IPC_QUEUE_SIZE):
+        self.sock = sock
+        self.queue = LightQueue(queue_size)
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+
+    def send(self, message):
+        if self.closed:
+            return
+        line = encode(message)
+        while True:
+            try:
+                self.queue.put_nowait(line)
+                return
+            except eventlet.queue.Full:
+                self.queue.get_nowait()
+                self.dropped += 1
+
+    def write_loop(self):
+        try:
+            while not self.closed:
+                self.sock.sendall(self.queue.get())
+                self.sent += 1
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+    def read_loop(self, handler):
+        reader = self.sock.makefile("rb")
+        try:
+            for line in reader:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue
+                handler(self, message)
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            if not self.queue.full():
+                self.queue.put_nowait(b"")  # wake the writer so it exits
+            try:
+                # shutdown, not just close: the reader's makefile holds the fd
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+
+
+class IpcServer:
+    """Accepts web workers and broadcasts to all of them."""
+
+    def __init__(self, path=IPC_SOCKET, on_command=None, on_disconnect=None):
+        self.path = path
+        self.on_command = on_command or (lambda conn, message: None)
+        self.on_disconnect = on_disconnect or (lambda conn: None)
+        self.connections = set()
+        self._listener = None
+        self._greenlet = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._listener = eventlet.listen(self.path, family=socket.AF_UNIX)
+        self._greenlet = eventlet.spawn(self._accept_loop)
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill()
+        for conn in list(self.connections):
+            conn.close()
+        if self._listener is not None:
+            self._listener.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def _accept_loop(self):
+        while True:
+            sock, _ = self._listener.accept()
+            conn = Connection(sock)
+            self.connections.add(conn)
+            eventlet.spawn(conn.write_loop)
+            eventlet.spawn(self._serve, conn)
+
+    def _serve(self, conn):
+        try:
+            conn.read_loop(self._handle)
+        finally:
+            self.connections.discard(conn)
+            self.on_disconnect(conn)
+
+    def _handle(self, conn, message):
+        try:
+            self.on_command(conn, message)
+        except Exception as e:
+            print(f"ERROR handling IPC command {message}: {e}")
+
+    def publish(self, message):
+        for conn in list(self.connections):
+            conn.send(message)
+
+    def stats(self):
+        conns = list(self.connections)
+        return {
+            "connections": len(conns),
+            "queued": sum(c.queue.qsize() for c in conns),
+            "sent": sum(c.sent for c in conns),
+            "dropped": sum(c.dropped for c in conns),
+        }
+
+
+class IpcClient:
+    """A web worker's link to the collector; reconnects until stopped."""
+
+    def __init__(self, path=IPC_SOCKET, on_message=None, on_connect=None):
+        self.path = path
+        self.on_message = on_message or (lambda message: None)
+        self.on_connect = on_connect or (lambda: None)
+        self.connection = None
+        self.connects = 0
+        self._greenlet = None
+
+    @property
+    def connected(self):
+        return self.connection is not None and not self.connection.closed
+
+    def start(self):
+        self._greenlet = eventlet.spawn(self._run)
+
+    def stop(self):
+        if self._greenlet is not None:
+            self._greenlet.kill()
+        if self.connection is not None:
+            self.connection.close()
+
+    def send(self, message):
+        # Commands are not buffered across reconnects; on_connect replays state
+        if self.connected:
+            self.connection.send(message)
+
+    def _run(self):
+        while True:
+            try:
+                sock = eventlet.connect(self.path, family=socket.AF_UNIX)
+            except OSError:
+                eventlet.sleep(IPC_RECONNECT_INTERVAL)
+                continue
+            self.connection = conn = Connection(sock)
+            self.connects += 1
+            eventlet.spawn(conn.write_loop)
+            try:
+                self.on_connect()
+            except Exception as e:
+                print(f"ERROR in IPC on_connect: {e}")
+            conn.read_loop(self._handle)
+            print("IPC: lost connection to collector, reconnecting")
+            eventlet.sleep(IPC_RECONNECT_INTERVAL)
+
+    def _handle(self, conn, message):
+        try:
+            self.on_message(message)
+        except Exception as e:
+            print(f"ERROR handling IPC message: {e}")
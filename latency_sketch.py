@@ -0,0 +1,231 @@
+"""Rolling latency histograms per target for live p50/p95/p99.
+
+Each reply lands in a log-linear histogram whose buckets grow by PRECISION, so
+any percentile read back is within that relative error of the true sample.
+Histograms are kept per SLOT_SECONDS slot; each rolling window (1m/15m/1h)
+holds a running sum of its slots, so recording a sample is O(1) and expiring a
+slot subtracts it once. Window edges therefore move in whole slots.
+
+SketchStore checkpoints the slots to the latency_sketches table so a restart
+resumes with its windows intact.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+import database
+
+PRECISION = 0.02
+MIN_LATENCY_MS = 0.01
+SLOT_SECONDS = 10
+WINDOWS = {"1m": 60, "15m": 15 * 60, "1h": 60 * 60}
+PERCENTILES = (50, 95, 99)
+CHECKPOINT_INTERVAL = float(
+    os.environ.get("PACKET_TESTER_SKETCH_CHECKPOINT_INTERVAL", "60")
+)
+
+_LOG_GROWTH = math.log1p(PRECISION)
+
+
+def bucket_index(latency):
+    if latency <= MIN_LATENCY_MS:
+        return 0
+    return int(math.log(latency / MIN_LATENCY_MS) / _LOG_GROWTH) + 1
+
+
+def bucket_value(index):
+    """Geometric midpoint of a bucket, in ms."""
+    if index == 0:
+        return MIN_LATENCY_MS
+    return MIN_LATENCY_MS * math.exp((index - 0.5) * _LOG_GROWTH)
+
+
+class Histogram:
+    """Sparse bucket counts plus lost probes; mergeable by addition."""
+
+    __slots__ = ("counts", "received", "lost")
+
+    def __init__(self):
+        self.counts = {}
+        self.received = 0
+        self.lost = 0
+
+    def add(self, index):
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.received += 1
+
+    def merge(self, other, sign=1):
+        for index, n in other.counts.items():
+            n = self.counts.get(index, 0) + sign * n
+            if n:
+                self.counts[index] = n
+            else:
+                del self.counts[index]
+        self.received += sign * other.received
+        self.lost += sign * other.lost
+
+    def percentiles(self, pcts=PERCENTILES):
+        """{pct: latency ms} read off the cumulative bucket counts."""
+        result = {}
+        if not self.received:
+            return {p: None for p in pcts}
+        ranks = sorted((math.ceil(self.received * p / 100), p) for p in pcts)
+        seen, i = 0, 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            while i < len(ranks) and seen >= ranks[i][0]:
+                result[ranks[i][1]] = round(bucket_value(index), 3)
+                i += 1
+        return result
+
+    def summary(self):
+        sent = self.received + self.lost
+        summary = {
+            "count": self.received,
+            "loss": round(self.lost / sent * 100, 2) if sent else 0,
+        }
+        for pct, value in self.percentiles().items():
+            summary[f"p{pct}"] = value
+        summary["max"] = (
+            round(bucket_value(max(self.counts)), 3) if self.counts else None
+        )
+        return summary
+
+    def buckets(self):
+        """[(bucket upper bound ms, count)] in latency order."""
+        return [
+            (round(MIN_LATENCY_MS * math.exp(i * _LOG_GROWTH), 3), self.counts[i])
+            for i in sorted(self.counts)
+        ]
+
+
+class RollingSketch:
+    def __init__(self):
+        self.slots = deque()
+        self.windows = {name: Histogram() for name in WINDOWS}
+        self._window_slots = {name: deque() for name in WINDOWS}
+
+    def _slot(self, now):
+        start = now - now % SLOT_SECONDS
+        if not self.slots or self.slots[-1][0] < start:
+            slot = (start, Histogram())
+            self.slots.append(slot)
+            for slots in self._window_slots.values():
+                slots.append(slot)
+        return self.slots[-1][1]
+
+    def expire(self, now):
+        for name, span in WINDOWS.items():
+            slots, window = self._window_slots[name], self.windows[name]
+            while slots and slots[0][0] <= now - span:
+                window.merge(slots.popleft()[1], sign=-1)
+        longest = max(WINDOWS.values())
+        while self.slots and self.slots[0][0] <= now - longest:
+            self.slots.popleft()
+
+    def record(self, latency, now=None):
+        now = time.time() if now is None else now
+        self.expire(now)
+        slot = self._slot(now)
+        if latency is None:
+            slot.lost += 1
+            for window in self.windows.values():
+                window.lost += 1
+            return
+        index = bucket_index(latency)
+        slot.add(index)
+        for window in self.windows.values():
+            window.add(index)
+
+    def summary(self, now=None):
+        self.expire(time.time() if now is None else now)
+        return {name: window.summary() for name, window in self.windows.items()}
+
+    def to_json(self):
+        return json.dumps(
+            [[start, h.counts, h.lost] for start, h in self.slots],
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, data, now=None):
+        sketch = cls()
+        for start, counts, lost in json.loads(data):
+            slot = Histogram()
+            slot.counts = {int(i): n for i, n in counts.items()}
+            slot.received = sum(slot.counts.values())
+            slot.lost = lost
+            sketch.slots.append((start, slot))
+            for name in WINDOWS:
+                sketch._window_slots[name].append((start, slot))
+                sketch.windows[name].merge(slot)
+        sketch.expire(time.time() if now is None else now)
+        return sketch
+
+
+class SketchStore:
+    """RollingSketch per target, restored from and checkpointed to the DB."""
+
+    def __init__(self, interval=CHECKPOINT_INTERVAL):
+        self.interval = interval
+        self._sketches = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def get(self, target_id, cache=True):
+        sketch = self._sketches.get(target_id)
+        if sketch is None:
+            data = database.load_latency_sketch(target_id)
+            sketch = RollingSketch.from_json(data) if data else RollingSketch()
+            if cache:
+                self._sketches[target_id] = sketch
+        return sketch
+
+    def record(self, target_id, latency, now=None):
+        sketch = self.get(target_id)
+        sketch.record(latency, now)
+        self._dirty.add(target_id)
+        return sketch
+
+    def checkpoint(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            rows = [
+                (target_id, time.time(), self._sketches[target_id].to_json())
+                for target_id in dirty
+                if target_id in self._sketches
+            ]
+        if rows:
+            database.save_latency_sketches(rows)
+        return len(rows)
+
+    def release(self, target_id):
+        """Checkpoint and drop a target's sketch once nobody probes it."""
+        if target_id in self._dirty:
+            self.checkpoint()
+        self._sketches.pop(target_id, None)
+
+    def reset(self, target_id):
+        self._sketches.pop(target_id, None)
+        self._dirty.discard(target_id)
+
+    def start(self):
+        threading.Thread(
+            target=self._run, name="sketch-checkpoint", daemon=True
+        ).start()
+
+    def stop(self):
+        self._stopping.set()
+        self.checkpoint()
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                print(f"ERROR checkpointing latency sketches: {e}")
@@ -0,0 +1,169 @@
+"""Prometheus text exposition for /metrics.
+
+Hot paths only touch preallocated state: a target's TargetMetrics (fixed
+bucket array plus a few numbers) is created once when its first result
+arrives, and observe() is a bisect and some additions. Everything else, such
+as writer, emitter, scheduler and cache figures, is read from the owning
+object by a callback at scrape time.
+"""
+
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, per Prometheus convention
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+FLUSH_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+BATCH_BUCKETS = (1, 10, 50, 100, 250, 500, 1000, 5000)
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class TargetMetrics:
+    __slots__ = ("latency", "sent", "received", "loss", "jitter", "mos")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.sent = 0
+        self.received = 0
+        self.loss = 0.0
+        self.jitter = 0.0
+        self.mos = 0.0
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format(value):
+    if value is None:
+        return "NaN"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_histogram(lines, name, histogram, labels=None):
+    labels = labels or {}
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+    lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {histogram.count}")
+    lines.append(f"{name}_sum{_labels(labels)} {_format(histogram.sum)}")
+    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+
+class Registry:
+    def __init__(self, prefix="packet_tester"):
+        self.prefix = prefix
+        self.targets = {}
+        self.lines_parsed = 0
+        self.path_changes = 0
+        self._collectors = []
+
+    def observe_ping(self, target, latency, loss, jitter, mos):
+        metrics = self.targets.get(target)
+        if metrics is None:
+            metrics = self.targets[target] = TargetMetrics()
+        metrics.sent += 1
+        if latency is not None:
+            metrics.received += 1
+            metrics.latency.observe(latency / 1000)
+        metrics.loss = loss
+        metrics.jitter = jitter / 1000 if jitter is not None else None
+        metrics.mos = mos
+
+    def forget(self, target):
+        self.targets.pop(target, None)
+
+    def register(self, name, kind, help_text, collect):
+        """Add a metric read at scrape time.
+
+        collect() returns a number, a Histogram, or a list of (labels, value)
+        pairs; None skips the metric for this scrape.
+        """
+        self._collectors.append((f"{self.prefix}_{name}", kind, help_text, collect))
+
+    def _target_lines(self, lines):
+        p = self.prefix
+        families = (
+            ("ping_sent_total", "counter", "Echo requests sent", "sent"),
+            ("ping_received_total", "counter", "Echo replies received", "received"),
+            ("ping_loss_percent", "gauge", "Packet loss since probe start", "loss"),
+            (
+                "ping_jitter_seconds",
+                "gauge",
+                "RFC 3550 interarrival jitter",
+                "jitter",
+            ),
+            ("ping_mos", "gauge", "Estimated mean opinion score", "mos"),
+        )
+        targets = list(self.targets.items())
+        lines.append(f"# HELP {p}_ping_latency_seconds Echo round-trip time")
+        lines.append(f"# TYPE {p}_ping_latency_seconds histogram")
+        for target, metrics in targets:
+            render_histogram(
+                lines, f"{p}_ping_latency_seconds", metrics.latency, {"target": target}
+            )
+        for name, kind, help_text, attr in families:
+            lines.append(f"# HELP {p}_{name} {help_text}")
+            lines.append(f"# TYPE {p}_{name} {kind}")
+            for target, metrics in targets:
+                value = getattr(metrics, attr)
+                lines.append(
+                    f"{p}_{name}{_labels({'target': target})} {_format(value)}"
+                )
+
+    def render(self):
+        lines = []
+        self._target_lines(lines)
+        for name, kind, help_text, collect in self._collectors:
+            try:
+                value = collect()
+            except Exception as e:
+                print(f"ERROR collecting metric {name}: {e}")
+                continue
+            if value is None:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if isinstance(value, Histogram):
+                render_histogram(lines, name, value)
+            elif isinstance(value, list):
+                for labels, sample in value:
+                    lines.append(f"{name}{_labels(labels)} {_format(sample)}")
+            else:
+                lines.append(f"{name} {_format(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,115 @@
+"""Structured parsing of `ping -D -O` output.
+
+One anchored regex match per line classifies it and pulls out every field:
+
+    [1697049600.123456] 64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=14.5 ms
+    [1697049601.123456] no answer yet for icmp_seq=2
+    [1697049602.123456] From 10.0.0.1 icmp_seq=3 Destination Host Unreachable
+
+The -D prefix is the wall-clock time ping printed the line, moments after the
+reply arrived, so samples keep their probe time however late they are
+stored. IPv6 sources, hostnames with the address in parentheses, any payload
+size, hlim= and the busybox/BSD variants (seq=, "Request timeout for
+icmp_seq N") parse the same way; fields a variant lacks are None.
+
+SequenceTracker turns icmp_seq gaps into lost probes as soon as a later
+sequence number shows up, without waiting for ping's summary.
+
+responder() reads the output of a TTL-limited `ping -n -c 1 -t N`: which
+router sent "Time to live exceeded", or whether the target itself replied.
+"""
+
+import re
+from collections import namedtuple
+
+REPLY = "reply"
+LOST = "lost"
+DUPLICATE = "duplicate"
+
+# icmp_seq is 16 bits and wraps
+SEQ_MODULO = 65536
+
+PingLine = namedtuple("PingLine", "kind seq ttl rtt timestamp")
+
+_LINE = re.compile(
+    r"(?:\[(?P<ts>\d+(?:\.\d+)?)\]\s*)?"
+    r"(?:"
+    r"\d+ bytes from \S+(?: \([^)]*\))?:"
+    r"(?: (?:icmp_)?seq=(?P<seq>\d+))?"
+    r"(?: (?:ttl|hlim)=(?P<ttl>\d+))?"
+    r"(?: time[=<](?P<rtt>\d+(?:\.\d+)?) ?ms)?"
+    r"(?P<dup> \(DUP!\))?"
+    r"|no answer yet for icmp_seq=(?P<noanswer>\d+)"
+    r"|Request timeout(?: for icmp_seq[ =](?P<timeout>\d+))?"
+    r"|From \S+.*? icmp_seq=(?P<error>\d+)"
+    r")"
+)
+
+
+_RESPONDER = re.compile(
+    r"^(?:\[[\d.]+\]\s*)?(?:"
+    r"From (?P<router>\S+?)(?: \([^)]*\))? icmp_seq=\d+ Time"
+    r"|\d+ bytes from (?P<target>\S+?)(?: \([^)]*\))?: "
+    r")",
+    re.MULTILINE,
+)
+
+_match = _LINE.match
+_new = tuple.__new__
+
+
+def parse(line):
+    """PingLine for a reply or lost-probe line, None for anything else."""
+    match = _match(line)
+    if match is None:
+        return None
+    ts, seq, ttl, rtt, dup, noanswer, timeout, error = match.groups()
+    # Group values are digit strings, never empty, so `x and int(x)` keeps None
+    if rtt is not None or seq is not None:
+        return _new(
+            PingLine,
+            (
+                DUPLICATE if dup else REPLY,
+                seq and int(seq),
+                ttl and int(ttl),
+                rtt and float(rtt),
+                ts and float(ts),
+            ),
+        )
+    lost = noanswer or timeout or error
+    if lost is None and "Request timeout" not in line:
+        return None  # "64 bytes from x:" with nothing after it
+    return _new(PingLine, (LOST, lost and int(lost), None, None, ts and float(ts)))
+
+
+def responder(output):
+    """(ip, reached_target) for the hop that answered a TTL-limited ping."""
+    match = _RESPONDER.search(output)
+    if match is None:
+        return None
+    if match.group("router"):
+        return match.group("router"), False
+    return match.group("target"), True
+
+
+class SequenceTracker:
+    """Counts probes that never produced a line, from gaps in icmp_seq."""
+
+    def __init__(self, first=1):
+        self.last = first - 1
+        self.late = 0
+
+    def advance(self, seq):
+        """How many sequence numbers were skipped before `seq`.
+
+        None means `seq` was already accounted for: a duplicate, or a reply
+        arriving after its "no answer yet" line.
+        """
+        if seq is None:
+            return 0
+        gap = (seq - self.last) % SEQ_MODULO
+        if gap == 0 or gap > SEQ_MODULO // 2:
+            self.late += 1
+            return None
+        self.last = seq
+        return gap - 1
@@ -0,0 +1,162 @@
+"""Opt-in hot-path timers and an on-demand sampling profiler.
+
+StageTimers wraps the stages of the probe loops (parse, MOS, store, sketch,
+emit, tracepath, hop probes) in `with timers.stage(name):` blocks. While
+disabled, stage() returns a shared no-op context, so the hooks can stay in
+the hot path. Enabled (PACKET_TESTER_PROFILE=1 or the debug endpoint), each
+block adds one perf_counter_ns() pair and a histogram update.
+
+sample_stacks() is a wall-clock sampling profiler. Every greenlet runs on the
+hub's OS thread, so a native thread that periodically reads that thread's
+current frame sees where the event loop spends its time, whichever greenlet
+is running. Stacks are returned in the folded "a;b;c count" format that
+flamegraph.pl and speedscope read.
+"""
+
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import nullcontext
+from eventlet.patcher import original
+
+import metrics
+
+PROFILE_ENABLED = os.environ.get("PACKET_TESTER_PROFILE", "0") == "1"
+# Microseconds: stages range from a regex match to a blocked commit
+STAGE_BUCKETS_US = (
+    1,
+    2,
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+    2500,
+    5000,
+    10000,
+    25000,
+    100000,
+    1000000,
+)
+SAMPLE_INTERVAL = 0.005
+MAX_CAPTURE_SECONDS = 120
+
+_NOOP = nullcontext()
+_real_sleep = original("time").sleep
+
+
+class _Stage:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.histogram.observe((time.perf_counter_ns() - self.started) / 1000)
+
+
+class StageTimers:
+    def __init__(self, enabled=PROFILE_ENABLED):
+        self.enabled = enabled
+        self.stages = {}
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NOOP
+        return _Stage(self._histogram(name))
+
+    def _histogram(self, name):
+        histogram = self.stages.get(name)
+        if histogram is None:
+            histogram = self.stages[name] = metrics.Histogram(STAGE_BUCKETS_US)
+        return histogram
+
+    def record(self, name, started_ns):
+        """Time a stage that does not fit a with block, from perf_counter_ns()."""
+        if self.enabled:
+            elapsed_us = (time.perf_counter_ns() - started_ns) / 1000
+            self._histogram(name).observe(elapsed_us)
+
+    def reset(self):
+        self.stages = {}
+
+    def summary(self):
+        return {
+            "enabled": self.enabled,
+            "stages": {
+                name: summarize(histogram) for name, histogram in self.stages.items()
+            },
+        }
+
+
+def _quantile(histogram, q):
+    # Upper bound of the bucket holding the q-th observation
+    rank, seen = q * histogram.count, 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        seen += count
+        if seen >= rank:
+            return bound
+    return None  # beyond the last bucket
+
+
+def summarize(histogram):
+    count = histogram.count
+    return {
+        "count": count,
+        "total_ms": round(histogram.sum / 1000, 3),
+        "mean_us": round(histogram.sum / count, 2) if count else None,
+        "p50_us": _quantile(histogram, 0.5) if count else None,
+        "p95_us": _quantile(histogram, 0.95) if count else None,
+        "p99_us": _quantile(histogram, 0.99) if count else None,
+        "buckets_us": dict(zip(map(str, histogram.bounds), histogram.counts)),
+        "over_us": histogram.counts[-1],
+    }
+
+
+def _frame_key(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_stacks(thread_id, seconds, interval=SAMPLE_INTERVAL):
+    """Sample `thread_id`'s stack for `seconds`; returns (Counter, samples).
+
+    Must run on a native thread, not on the thread being sampled.
+    """
+    stacks = Counter()
+    samples = 0
+    deadline = time.monotonic() + min(seconds, MAX_CAPTURE_SECONDS)
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is not None:
+            names = []
+            while frame is not None:
+                names.append(_frame_key(frame))
+                frame = frame.f_back
+            stacks[";".join(reversed(names))] += 1
+            samples += 1
+        _real_sleep(interval)
+    return stacks, samples
+
+
+def folded(stacks):
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def top_functions(stacks, limit=25):
+    """Leaf frames by share of samples."""
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    total = sum(leaves.values()) or 1
+    return [
+        {"function": name, "samples": count, "share": round(count / total, 3)}
+        for name, count in leaves.most_common(limit)
+    ]
@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import database
+from hub import blocking
+
+# How long each kind of data is kept. Rollups outlive raw samples so long-range
+# history keeps working after the raw rows behind it are gone.
+RAW_RETENTION_DAYS = float(os.environ.get("PACKET_TESTER_RAW_RETENTION_DAYS", "7"))
+MINUTE_ROLLUP_RETENTION_DAYS = float(
+    os.environ.get("PACKET_TESTER_MINUTE_ROLLUP_RETENTION_DAYS", "90")
+)
+HOUR_ROLLUP_RETENTION_DAYS = float(
+    os.environ.get("PACKET_TESTER_HOUR_ROLLUP_RETENTION_DAYS", "730")
+)
+
+# Each batch is its own short transaction, so the write lock is never held for
+# longer than one RETENTION_BATCH_SIZE delete, with a pause to let writers in.
+RETENTION_BATCH_SIZE = int(os.environ.get("PACKET_TESTER_RETENTION_BATCH_SIZE", "1000"))
+RETENTION_BATCH_PAUSE = float(
+    os.environ.get("PACKET_TESTER_RETENTION_BATCH_PAUSE", "0.05")
+)
+RETENTION_INTERVAL = float(os.environ.get("PACKET_TESTER_RETENTION_INTERVAL", "3600"))
+VACUUM_PAGES = int(os.environ.get("PACKET_TESTER_VACUUM_PAGES", "2000"))
+
+
+def retention_policy():
+    # (table, key column, time column, days to keep)
+    return [
+        ("pings", "id", "timestamp", RAW_RETENTION_DAYS),
+        ("hops", "id", "timestamp", RAW_RETENTION_DAYS),
+        ("pings_1m", "bucket", "bucket", MINUTE_ROLLUP_RETENTION_DAYS),
+        ("pings_1h", "bucket", "bucket", HOUR_ROLLUP_RETENTION_DAYS),
+        # Route history is tiny and most useful next to the long-range rollups
+        ("paths", "id", "last_seen", HOUR_ROLLUP_RETENTION_DAYS),
+    ]
+
+
+def _cutoff(days, now=None):
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def prune_table(
+    table,
+    key,
+    column,
+    cutoff,
+    target_ids,
+    batch_size=RETENTION_BATCH_SIZE,
+    pause=RETENTION_BATCH_PAUSE,
+):
+    """Delete rows older than cutoff, batch_size rows per transaction."""
+    pruned, batches = 0, 0
+    sql = f"""
+        DELETE FROM {table} WHERE target_id = ? AND {key} IN (
+            SELECT {key} FROM {table}
+            WHERE target_id = ? AND {column} < ?
+            ORDER BY {column} LIMIT ?
+        )
+    """
+    for target_id in target_ids:
+        while True:
+            deleted = _delete_batch(sql, (target_id, target_id, cutoff, batch_size))
+            if deleted:
+                pruned += deleted
+                batches += 1
+            if deleted < batch_size:
+                break
+            time.sleep(pause)
+    return pruned, batches
+
+
+def prune_ip_info(now, batch_size=RETENTION_BATCH_SIZE, pause=RETENTION_BATCH_PAUSE):
+    """Delete expired IP lookups; every lookup writes a row, so they pile up."""
+    pruned, batches = 0, 0
+    sql = """
+        DELETE FROM ip_info WHERE ip IN (
+            SELECT ip FROM ip_info WHERE expires_at <= ? LIMIT ?
+        )
+    """
+    while True:
+        deleted = _delete_batch(sql, (now.timestamp(), batch_size))
+        if deleted:
+            pruned += deleted
+            batches += 1
+        if deleted < batch_size:
+            break
+        time.sleep(pause)
+    return pruned, batches
+
+
+@blocking
+def _delete_batch(sql, params):
+    with database.connection() as conn:
+        deleted = conn.execute(sql, params).rowcount
+        conn.commit()
+    return deleted
+
+
+@blocking
+def _target_ids():
+    with database.connection() as conn:
+        return [r[0] for r in conn.execute("SELECT id FROM targets")]
+
+
+@blocking
+def reclaim_space(pages=VACUUM_PAGES):
+    with database.connection() as conn:
+        vacuumed = 0
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:  # INCREMENTAL
+            before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+            vacuumed = before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        busy, wal_pages, checkpointed = conn.execute(
+            "PRAGMA wal_checkpoint(TRUNCATE)"
+        ).fetchone()
+    return {
+        "vacuumed_pages": vacuumed,
+        "wal_pages": wal_pages,
+        "checkpointed_pages": checkpointed,
+        "checkpoint_busy": bool(busy),
+    }
+
+
+def run_retention(
+    now=None, batch_size=RETENTION_BATCH_SIZE, pause=RETENTION_BATCH_PAUSE
+):
+    start = time.perf_counter()
+    target_ids = _target_ids()
+    report = {"pruned": {}, "batches": 0}
+    for table, key, column, days in retention_policy():
+        pruned, batches = prune_table(
+            table, key, column, _cutoff(days, now), target_ids, batch_size, pause
+        )
+        report["pruned"][table] = pruned
+        report["batches"] += batches
+    pruned, batches = prune_ip_info(
+        now or datetime.now(timezone.utc), batch_size, pause
+    )
+    report["pruned"]["ip_info"] = pruned
+    report["batches"] += batches
+    report.update(reclaim_space())
+    report["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    report["finished_at"] = datetime.now(timezone.utc).isoformat()
+    return report
+
+
+class RetentionEngine:
+    """Runs run_retention every `interval` seconds in the background."""
+
+    def __init__(self, interval=RETENTION_INTERVAL):
+        self.interval = interval
+        self.last_report = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.last_report = run_retention()
+                print(f"Retention: {self.last_report}")
+            except Exception as e:
+                print(f"ERROR in retention: {e}")
+            self._stopping.wait(self.interval)
+
+
+if __name__ == "__main__":
+    import sys
+
+    database.init_db()
+    if "--vacuum" in sys.argv:
+        print("Rebuilding database with incremental auto-vacuum...")
+        database.vacuum_database()
+    print(run_retention())
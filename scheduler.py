@@ -0,0 +1,197 @@
+"""Global admission control for probes.
+
+Every probe asks ProbeScheduler for a slot before it sends anything: one
+ICMP echo, a hop's burst of HOP_PROBE_COUNT echoes or a tracepath run. A
+slot is granted when:
+
+- fewer than PROBE_CONCURRENCY probes are in flight (sockets waiting on a
+  reply or child processes running), and
+- the token bucket holds enough packets (refilled at PROBE_RATE per second,
+  at most PROBE_BURST banked; 0 disables the rate limit).
+
+A long-lived `ping -i 1` process never exits on its own, so it does not take
+a slot. reserve() instead sets aside its packets per second from PROBE_RATE
+and refuses once the reservations would leave nothing for the short probes.
+
+Waiting probes are queued per target and granted round-robin, so a target
+with twenty hops waiting gets one turn per rotation like a target with one.
+The time each grant spent queued is kept per target (count, mean, max, last)
+to show when the budgets, rather than the network, set the probe cadence.
+"""
+
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+import eventlet
+from eventlet.event import Event
+
+PROBE_CONCURRENCY = int(os.environ.get("PACKET_TESTER_PROBE_CONCURRENCY", "256"))
+PROBE_RATE = float(os.environ.get("PACKET_TESTER_PROBE_RATE", "1000"))
+PROBE_BURST = float(os.environ.get("PACKET_TESTER_PROBE_BURST", "0")) or None
+
+
+class _Waiter:
+    __slots__ = ("target", "packets", "enqueued", "event")
+
+    def __init__(self, target, packets, enqueued):
+        self.target = target
+        self.packets = packets
+        self.enqueued = enqueued
+        self.event = Event()
+
+
+class QueueStats:
+    def __init__(self):
+        self.grants = 0
+        self.packets = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def record(self, wait, packets):
+        self.grants += 1
+        self.packets += packets
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.last_wait = wait
+
+    def to_dict(self, queued):
+        return {
+            "grants": self.grants,
+            "packets": self.packets,
+            "queued": queued,
+            "mean_wait_ms": (
+                round(self.total_wait / self.grants * 1000, 2) if self.grants else 0
+            ),
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "last_wait_ms": round(self.last_wait * 1000, 2),
+        }
+
+
+class ProbeScheduler:
+    def __init__(
+        self,
+        max_concurrent=PROBE_CONCURRENCY,
+        rate=PROBE_RATE,
+        burst=PROBE_BURST,
+        clock=time.monotonic,
+    ):
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self.clock = clock
+        self.tokens = self.burst
+        self.active = 0
+        self.reserved = 0.0
+        self.streams = 0
+        # target -> waiting probes; the first key is next in the rotation
+        self.queues = OrderedDict()
+        self.targets = {}
+        self._refilled = clock()
+        self._timer = None
+
+    def acquire(self, target, packets=1):
+        """Block until `target` may send `packets` packets."""
+        waiter = _Waiter(target, packets, self.clock())
+        self.queues.setdefault(target, deque()).append(waiter)
+        self._pump()
+        try:
+            waiter.event.wait()
+        except BaseException:
+            # Killed while queued (the probe was stopped): give the turn back
+            if waiter.event.ready():
+                self.release()
+            else:
+                self._discard(waiter)
+            raise
+
+    def release(self):
+        self.active -= 1
+        self._pump()
+
+    @contextmanager
+    def slot(self, target, packets=1):
+        self.acquire(target, packets)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def reserve(self, pps):
+        """Set aside `pps` of the rate budget for a long-running process.
+
+        Returns False, without blocking, when that would use up the budget.
+        """
+        if self.rate and self.reserved + pps >= self.rate:
+            return False
+        self.reserved += pps
+        self.streams += 1
+        return True
+
+    def unreserve(self, pps):
+        self.reserved -= pps
+        self.streams -= 1
+
+    def forget(self, target):
+        self.targets.pop(target, None)
+
+    def _discard(self, waiter):
+        waiters = self.queues.get(waiter.target)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            if not waiters:
+                del self.queues[waiter.target]
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(
+                self.burst,
+                self.tokens + (now - self._refilled) * (self.rate - self.reserved),
+            )
+        self._refilled = now
+
+    def _on_timer(self):
+        self._timer = None
+        self._pump()
+
+    def _pump(self):
+        now = self.clock()
+        self._refill(now)
+        while self.queues and self.active < self.max_concurrent:
+            target, waiters = next(iter(self.queues.items()))
+            waiter = waiters[0]
+            # A burst bigger than the bucket may go into debt once it is full
+            needed = min(waiter.packets, self.burst)
+            if self.rate and self.tokens < needed:
+                if self._timer is None:
+                    delay = (needed - self.tokens) / (self.rate - self.reserved)
+                    self._timer = eventlet.spawn_after(delay, self._on_timer)
+                return
+            waiters.popleft()
+            del self.queues[target]
+            if waiters:
+                self.queues[target] = waiters  # back of the rotation
+            if self.rate:
+                self.tokens -= waiter.packets
+            self.active += 1
+            self.targets.setdefault(target, QueueStats()).record(
+                now - waiter.enqueued, waiter.packets
+            )
+            waiter.event.send()
+
+    def stats(self):
+        return {
+            "max_concurrent": self.max_concurrent,
+            "rate": self.rate,
+            "active": self.active,
+            "streams": self.streams,
+            "reserved_rate": self.reserved,
+            "queued": sum(len(w) for w in self.queues.values()),
+            "tokens": round(self.tokens, 2) if self.rate else None,
+            "targets": {
+                target: stats.to_dict(len(self.queues.get(target, ())))
+                for target, stats in self.targets.items()
+            },
+        }
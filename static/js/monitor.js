@@ -1,4 +1,7 @@
 const socket = io({
+    // No polling fallback: with several web workers behind one port, every
+    // request of a polling session could land on a different process
+    transports: ['websocket'],
     reconnection: true,
     reconnectionAttempts: 10,
     reconnectionDelay: 1000
@@ -134,6 +137,8 @@ async function createMonitor(target) {
             recv: card.querySelector('.pkts-recv'),
             hopList: card.querySelector('.hop-list'),
             hops: {}, 
+            pingState: {},
+            hopState: {},
             timelineLabels: [], // Shared timeline for all charts in this card
             canvas: card.querySelector('.latencyChart'),
             data: {
@@ -230,10 +235,49 @@ async function createMonitor(target) {
     }
 }
 
-socket.on('ping_result', (data) => {
-    const m = monitors[data.target];
+// The server coalesces updates into one 'batch' frame per tick carrying only
+// changed fields; merge them into per-monitor state before rendering.
+socket.on('batch', (frame, ack) => {
+    Object.entries(frame.ping || {}).forEach(([target, delta]) => {
+        const m = monitors[target];
+        if (!m) return;
+        const { latencies, raw, ...fields } = delta;
+        Object.assign(m.pingState, fields);
+        renderPing(m, latencies || []);
+    });
+    Object.entries(frame.hops || {}).forEach(([target, hops]) => {
+        const m = monitors[target];
+        if (!m) return;
+        Object.entries(hops).forEach(([ip, delta]) => {
+            const state = Object.assign(m.hopState[ip] || (m.hopState[ip] = {}), delta);
+            renderHop(m, target, ip, state);
+        });
+    });
+    // Acking after rendering paces the server to what this client can draw
+    if (ack) ack();
+});
+
+// The route changed: drop hops that left it and put the rest in TTL order.
+// New hops arrive as regular hop updates.
+socket.on('path_change', (event) => {
+    const m = monitors[event.target];
     if (!m) return;
+    console.info('Route change for', event.target, event.changes);
+    const current = new Set(event.hops.map(hop => hop.ip));
+    Object.keys(m.hops).forEach(ip => {
+        if (current.has(ip)) return;
+        m.hops[ip].chart.destroy();
+        m.hops[ip].row.remove();
+        delete m.hops[ip];
+        delete m.hopState[ip];
+    });
+    event.hops.forEach(hop => {
+        if (m.hops[hop.ip]) m.hopList.appendChild(m.hops[hop.ip].row);
+    });
+});
 
+function renderPing(m, latencies) {
+    const data = m.pingState;
     m.sent.innerText = data.total_sent;
     m.recv.innerText = data.total_received;
     m.loss.innerText = data.loss;
@@ -246,53 +290,54 @@ socket.on('ping_result', (data) => {
     else if (data.mos >= 2.5) m.mos.classList.add('text-yellow-400');
     else m.mos.classList.add('text-red-400');
 
+    if (!latencies.length) return;
     const now = new Date().toLocaleTimeString();
-    m.timelineLabels.push(now);
-    
-    // Update Destination Chart
-    if (data.latency !== null) {
-        m.latency.innerText = data.latency;
-        m.data.datasets[0].data.push(data.latency);
-    } else {
-        m.latency.innerText = 'TIMEOUT';
-        m.data.datasets[0].data.push(null);
-    }
-
-    // Shifting logic (Master Tick)
-    if (m.timelineLabels.length > 200) { 
-        m.timelineLabels.shift();
-        m.data.datasets[0].data.shift();
-    }
-
-    // Update all Hop Sparklines with their latest known value to keep them synced
-    Object.values(m.hops).forEach(hopObj => {
-        // Use the last known latency for this hop, or null if never seen
-        const lastVal = hopObj.lastLatency !== undefined ? hopObj.lastLatency : null;
-        hopObj.data.datasets[0].data.push(lastVal);
+    latencies.forEach(latency => {
+        m.timelineLabels.push(now);
         
-        // Don't shift labels here, they are shared!
-        if (hopObj.data.datasets[0].data.length > 200) {
-            hopObj.data.datasets[0].data.shift();
+        // Update Destination Chart
+        if (latency !== null) {
+            m.latency.innerText = latency;
+            m.data.datasets[0].data.push(latency);
+        } else {
+            m.latency.innerText = 'TIMEOUT';
+            m.data.datasets[0].data.push(null);
         }
-        hopObj.chart.update();
+
+        // Shifting logic (Master Tick)
+        if (m.timelineLabels.length > 200) { 
+            m.timelineLabels.shift();
+            m.data.datasets[0].data.shift();
+        }
+
+        // Update all Hop Sparklines with their latest known value to keep them synced
+        Object.values(m.hops).forEach(hopObj => {
+            // Use the last known latency for this hop, or null if never seen
+            const lastVal = hopObj.lastLatency !== undefined ? hopObj.lastLatency : null;
+            hopObj.data.datasets[0].data.push(lastVal);
+            
+            // Don't shift labels here, they are shared!
+            if (hopObj.data.datasets[0].data.length > 200) {
+                hopObj.data.datasets[0].data.shift();
+            }
+        });
     });
 
+    // One redraw per frame, however many samples it carried
+    Object.values(m.hops).forEach(hopObj => hopObj.chart.update());
     m.chart.update();
-});
-
-socket.on('hop_update', (data) => {
-    const m = monitors[data.target];
-    if (!m) return;
+}
 
-    let hopObj = m.hops[data.ip];
+function renderHop(m, target, ip, data) {
+    let hopObj = m.hops[ip];
     if (!hopObj) {
         const hopRow = document.createElement('tr');
         hopRow.innerHTML = `
-            <td class="px-2 py-1 text-slate-500">${data.num}</td>
-            <td class="px-2 py-1 font-mono">${data.ip}</td>
+            <td class="px-2 py-1 text-slate-500 num-val">${data.num}</td>
+            <td class="px-2 py-1 font-mono">${ip}</td>
             <td class="px-2 py-1">
-                <div class="text-xs font-semibold text-slate-300">${data.isp || '-'}</div>
-                <div class="text-[10px] text-slate-500">${data.location || '-'}</div>
+                <div class="isp-val text-xs font-semibold text-slate-300">${data.isp || '-'}</div>
+                <div class="loc-val text-[10px] text-slate-500">${data.location || '-'}</div>
             </td>
             <td class="px-2 py-1 loss-val">0%</td>
             <td class="px-2 py-1 lat-val">0ms</td>
@@ -330,7 +375,7 @@ socket.on('hop_update', (data) => {
                 onHover: (evt, activeElements) => {
                     if (activeElements.length > 0) {
                         const index = activeElements[0].index;
-                        syncHovers(data.target, index);
+                        syncHovers(target, index);
                     }
                 },
                 scales: {
@@ -348,15 +393,20 @@ socket.on('hop_update', (data) => {
             data: sparklineData,
             lastLatency: data.avg_latency
         };
-        m.hops[data.ip] = hopObj;
+        m.hops[ip] = hopObj;
     }
 
     hopObj.lastLatency = data.avg_latency;
+    // A route change can move a known hop to another TTL
+    hopObj.row.querySelector('.num-val').innerText = data.num;
     const lossEl = hopObj.row.querySelector('.loss-val');
     const latEl = hopObj.row.querySelector('.lat-val');
 
     lossEl.innerText = `${data.loss}%`;
     latEl.innerText = `${data.avg_latency}ms`;
+    // ISP/location arrive after the hop itself once the lookup completes
+    hopObj.row.querySelector('.isp-val').innerText = data.isp || '-';
+    hopObj.row.querySelector('.loc-val').innerText = data.location || '-';
 
     if (data.loss > 0) {
         lossEl.classList.add('text-red-400', 'font-bold');
@@ -365,7 +415,7 @@ socket.on('hop_update', (data) => {
         lossEl.classList.remove('text-red-400', 'font-bold');
         hopObj.row.classList.remove('bg-red-500/10');
     }
-});
+}
 
 function syncHovers(target, index) {
     const m = monitors[target];
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+import analytics
+
+START = 1_700_000_000
+
+
+def make_rows(n, seed=3, outage_at=None):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        lost = rng.random() < 0.03 or (outage_at is not None and 0 <= i - outage_at < 8)
+        rows.append((START + i, None if lost else round(rng.uniform(10, 60), 3)))
+    return rows
+
+
+def test_python_loop_matches_live_stream():
+    from app import PingStats
+
+    rows = make_rows(300)
+    stats = PingStats()
+    jitters = []
+    for _, latency in rows:
+        stats.record(latency, received=latency is not None)
+        jitters.append(stats.jitter)
+    report = analytics.analyze(rows, points=300, use_numpy=False)
+    assert report["jitter"]["max"] == round(max(jitters), 2)
+    assert report["samples"] == 300
+
+
+def test_outages_and_bursts():
+    rows = [(START + i, 10.0) for i in range(20)]
+    for i in (3, 10, 11, 12, 13, 14, 15):
+        rows[i] = (START + i, None)
+    report = analytics.analyze(rows, use_numpy=False)
+    assert report["loss_bursts"] == {"count": 2, "longest": 6, "mean_length": 3.5}
+    assert report["outages"] == [
+        {
+            "start": "2023-11-14 22:13:30",
+            "end": "2023-11-14 22:13:36",
+            "duration": 6,
+            "lost": 6,
+        }
+    ]
+
+
+def test_numpy_matches_python_loop():
+    pytest.importorskip("numpy")
+    rows = make_rows(5000, outage_at=1200)
+    fast = analytics.analyze(rows, points=100)
+    slow = analytics.analyze(rows, points=100, use_numpy=False)
+    for key in ("samples", "lost", "loss", "loss_bursts", "outages"):
+        assert fast[key] == slow[key]
+    assert fast["jitter"] == pytest.approx(slow["jitter"], abs=0.01)
+    assert fast["mos"] == pytest.approx(slow["mos"], abs=0.01)
+    assert fast["series"]["timestamp"] == slow["series"]["timestamp"]
+    for key in ("latency", "jitter", "mos", "loss"):
+        assert fast["series"][key] == pytest.approx(slow["series"][key], abs=0.01)
+
+
+def test_ewma_matches_recurrence_across_blocks():
+    np = pytest.importorskip("numpy")
+    x = np.random.default_rng(1).uniform(0, 20, 1000)
+    expected, y = [], 0.0
+    for v in x:
+        y += (v - y) / 16
+        expected.append(y)
+    assert analytics._ewma(x, 1 / 16) == pytest.approx(expected)
+
+
+def test_empty_history():
+    assert analytics.analyze([]) is None
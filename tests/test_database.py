@@ -59,6 +59,24 @@ def test_save_ping(test_db):
     assert history[0]["loss"] == 0.0
 
 
+def test_save_ping_keeps_probe_timestamp(test_db):
+    import time
+
+    target_id = database.get_or_create_target("8.8.8.8")
+    probed = time.time() - 30
+    database.save_ping(target_id, 14.5, 0.0, probed)
+    writer = database.start_writer(batch_size=1000, flush_interval=60)
+    try:
+        database.save_ping(target_id, 15.0, 0.0, probed + 1)
+    finally:
+        database.stop_writer()
+
+    stamps = [row["timestamp"] for row in database.get_raw_data("8.8.8.8")]
+    assert stamps == [
+        time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(t)) for t in (probed, probed + 1)
+    ]
+
+
 def test_active_targets(test_db):
     address = "google.com"
     database.get_or_create_target(address)
@@ -114,3 +132,368 @@ def test_get_raw_data(test_db):
     assert raw_data[0]["latency"] == 14.5
     assert raw_data[1]["latency"] == 15.2
     assert "timestamp" in raw_data[0]
+
+
+def test_sample_writer_flushes_on_stop(test_db):
+    target_id = database.get_or_create_target("8.8.8.8")
+    writer = database.SampleWriter(test_db, batch_size=1000, flush_interval=60)
+    writer.start()
+    writer.save_ping(target_id, 14.5, 0.0)
+    writer.save_ping(target_id, None, 50.0)
+    writer.save_hop(target_id, 1, "192.168.1.1", 1.2, 0.0)
+    assert writer.queue_depth() == 3
+
+    writer.stop()
+
+    history = database.get_history("8.8.8.8", hours=1)
+    assert [h["latency"] for h in history] == [14.5, None]
+    stats = writer.stats()
+    assert stats["queue_depth"] == 0
+    assert stats["rows_written"] == 3
+    assert stats["flushes"] == 1
+    assert stats["last_batch_size"] == 3
+    assert stats["last_flush_ms"] >= 0
+
+
+def test_sample_writer_flushes_on_batch_size(test_db):
+    import eventlet
+
+    target_id = database.get_or_create_target("8.8.8.8")
+    writer = database.SampleWriter(test_db, batch_size=2, flush_interval=60)
+    writer.start()
+    writer.save_ping(target_id, 10.0, 0.0)
+    writer.save_ping(target_id, 11.0, 0.0)
+
+    for _ in range(50):
+        if writer.rows_written == 2:
+            break
+        eventlet.sleep(0.01)
+    assert writer.rows_written == 2
+    assert len(database.get_history("8.8.8.8", hours=1)) == 2
+    writer.stop()
+
+
+def test_save_ping_routes_through_writer(test_db):
+    target_id = database.get_or_create_target("8.8.8.8")
+    writer = database.start_writer(batch_size=1000, flush_interval=60)
+    try:
+        database.save_ping(target_id, 14.5, 0.0)
+        database.save_hop(target_id, 1, "192.168.1.1", 10.5, 0.0)
+        assert writer.queue_depth() == 2
+        assert database.get_writer_stats()["queue_depth"] == 2
+    finally:
+        database.stop_writer()
+
+    assert database.get_writer_stats() is None
+    assert len(database.get_history("8.8.8.8")) == 1
+
+
+def test_connection_pool_reuses_connections(test_db):
+    pool = database.ConnectionPool(test_db, size=2)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+        assert second.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert second.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+    assert pool.created == 1
+    pool.close()
+
+
+def test_connection_pool_rolls_back_on_release(test_db):
+    pool = database.ConnectionPool(test_db, size=1)
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO targets (address) VALUES ('uncommitted')")
+    with pool.connection() as conn:
+        assert not conn.in_transaction
+        row = conn.execute(
+            "SELECT 1 FROM targets WHERE address = 'uncommitted'"
+        ).fetchone()
+        assert row is None
+    pool.close()
+
+
+def test_pool_follows_db_path(test_db, monkeypatch, tmp_path):
+    database.get_or_create_target("8.8.8.8")
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "other.db"))
+    database.init_db()
+    assert database.get_active_targets() == []
+
+
+def _query_plan(conn, sql, params):
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [r["detail"] for r in rows]
+
+
+def test_init_db_sets_schema_version(test_db):
+    conn = database.get_db()
+    assert database.get_schema_version(conn) == database.SCHEMA_VERSION
+    conn.close()
+
+
+def test_history_query_uses_index(test_db):
+    conn = database.get_db()
+    plan = _query_plan(conn, database.HISTORY_SQL, (1, "-24 hours"))
+    conn.close()
+    assert any("USING COVERING INDEX idx_pings_target_ts" in d for d in plan), plan
+    assert not any(d.startswith("SCAN pings") for d in plan), plan
+    assert not any("TEMP B-TREE" in d for d in plan), plan
+
+
+def test_clear_history_deletes_use_index(test_db):
+    conn = database.get_db()
+    for table, index in (
+        ("pings", "idx_pings_target_ts"),
+        ("hops", "idx_hops_target_ts"),
+    ):
+        plan = _query_plan(conn, f"DELETE FROM {table} WHERE target_id = ?", (1,))
+        assert any(index in d for d in plan), plan
+        assert not any(d.startswith(f"SCAN {table}") for d in plan), plan
+    conn.close()
+
+
+def test_concurrent_migrations_apply_each_step_once(monkeypatch, tmp_path):
+    import eventlet.patcher
+
+    real_threading = eventlet.patcher.original("threading")
+    real_time = eventlet.patcher.original("time")
+    db_file = str(tmp_path / "shared.db")
+    monkeypatch.setattr(database, "DB_PATH", db_file)
+    database.init_db()
+
+    def slow_backfill(conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS backfills (n INTEGER)")
+        conn.execute("INSERT INTO backfills VALUES (1)")
+        real_time.sleep(0.2)
+
+    version = database.SCHEMA_VERSION + 1
+    monkeypatch.setattr(
+        database, "MIGRATIONS", database.MIGRATIONS + [(version, [slow_backfill])]
+    )
+    # Both processes read the old version before either takes the lock
+    conns = [database._connect(db_file) for _ in range(2)]
+    results = []
+    threads = [
+        real_threading.Thread(target=lambda c=c: results.append(database.migrate(c)))
+        for c in conns
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [version, version]
+    assert conns[0].execute("SELECT COUNT(*) FROM backfills").fetchone()[0] == 1
+    for conn in conns:
+        conn.close()
+
+
+def test_migrate_upgrades_legacy_database(monkeypatch, tmp_path):
+    db_file = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_file)
+    conn.executescript("""
+        CREATE TABLE targets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            address TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_active INTEGER DEFAULT 1
+        );
+        CREATE TABLE pings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            target_id INTEGER NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            latency REAL,
+            loss REAL NOT NULL
+        );
+        CREATE TABLE hops (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            target_id INTEGER NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            hop_num INTEGER NOT NULL,
+            ip TEXT NOT NULL,
+            latency REAL,
+            loss REAL
+        );
+        INSERT INTO targets (address) VALUES ('8.8.8.8');
+        INSERT INTO pings (target_id, latency, loss) VALUES (1, 14.5, 0.0);
+    """)
+    conn.close()
+
+    monkeypatch.setattr(database, "DB_PATH", str(db_file))
+    database.init_db()
+
+    conn = sqlite3.connect(db_file)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == database.SCHEMA_VERSION
+    indexes = {
+        r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")
+    }
+    assert {"idx_pings_target_ts", "idx_hops_target_ts"} <= indexes
+    conn.close()
+    assert database.get_history("8.8.8.8")[0]["latency"] == 14.5
+
+    # Re-running is a no-op
+    database.init_db()
+
+
+def test_summarize_latencies():
+    row = database.summarize_latencies([10.0, None, 14.0, 12.0, None])
+    samples, lost, lat_min, lat_avg, lat_max, p95, jitter = row
+    assert (samples, lost) == (5, 2)
+    assert (lat_min, lat_avg, lat_max, p95) == (10.0, 12.0, 14.0, 14.0)
+    assert jitter == 3.0  # |14-10| and |12-14|
+    assert database.summarize_latencies([None]) == (1, 1, None, None, None, None, None)
+
+
+def test_merge_rollups_weights_by_received_samples():
+    merged = database.merge_rollups(
+        [(60, 0, 5.0, 10.0, 20.0, 18.0, 1.0), (60, 30, 8.0, 40.0, 90.0, 80.0, 4.0)]
+    )
+    samples, lost, lat_min, lat_avg, lat_max, p95, jitter = merged
+    assert (samples, lost, lat_min, lat_max) == (120, 30, 5.0, 90.0)
+    assert lat_avg == 20.0
+    assert jitter == 2.0
+    assert p95 == 80.0
+
+
+def test_save_ping_maintains_rollups(test_db):
+    target_id = database.get_or_create_target("8.8.8.8")
+    database.save_ping(target_id, 10.0, 0.0)
+    database.save_ping(target_id, None, 50.0)
+    database.save_ping(target_id, 20.0, 33.3)
+
+    (minute,) = database.get_history("8.8.8.8", hours=24)
+    assert minute["samples"] == 3
+    assert minute["latency"] == 15.0
+    assert minute["loss"] == 33.33
+    assert minute["latency_max"] == 20.0
+
+    (hour,) = database.get_history("8.8.8.8", hours=720)
+    assert hour["samples"] == 3
+    assert hour["latency"] == 15.0
+
+
+def test_pick_resolution():
+    assert database.pick_resolution(1) == "raw"
+    assert database.pick_resolution(24) == "1m"
+    assert database.pick_resolution(24 * 30) == "1h"
+
+
+def test_long_range_history_uses_hour_rollups(test_db):
+    target_id = database.get_or_create_target("8.8.8.8")
+    conn = database.get_db()
+    rows = conn.execute("""
+        WITH RECURSIVE seq(n) AS (SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n < 2879)
+        SELECT datetime('now', '-' || (n * 30) || ' seconds') FROM seq
+        """).fetchall()
+    conn.executemany(
+        "INSERT INTO pings (target_id, timestamp, latency, loss) VALUES (?, ?, 5.0, 0)",
+        [(target_id, r[0]) for r in rows],
+    )
+    database.update_rollups(
+        conn, {(target_id, database._minute_bucket(r[0])) for r in rows}
+    )
+    conn.commit()
+    conn.close()
+
+    assert 719 <= len(database.get_history("8.8.8.8", hours=6)) <= 721
+    month = database.get_history("8.8.8.8", hours=720)
+    assert 24 <= len(month) <= 26
+    assert sum(h["samples"] for h in month) == 2880
+
+
+def test_get_history_rejects_unknown_resolution(test_db):
+    with pytest.raises(ValueError):
+        database.get_history("8.8.8.8", resolution="5s")
+
+
+def _insert_at(table, rows):
+    conn = database.get_db()
+    if table == "pings":
+        conn.executemany(
+            "INSERT INTO pings (target_id, timestamp, latency, loss) VALUES (?, ?, ?, 0)",
+            rows,
+        )
+    else:
+        conn.executemany(
+            "INSERT INTO hops (target_id, timestamp, latency, hop_num, ip) "
+            "VALUES (?, ?, ?, 1, '10.0.0.1')",
+            rows,
+        )
+    conn.commit()
+    conn.close()
+
+
+def test_iter_samples_pages_in_order(test_db):
+    target_id = database.get_or_create_target("8.8.8.8")
+    # Two rows share a timestamp to exercise the (timestamp, id) keyset
+    _insert_at(
+        "pings",
+        [
+            (target_id, "2026-01-01 00:00:02", 3.0),
+            (target_id, "2026-01-01 00:00:00", 1.0),
+            (target_id, "2026-01-01 00:00:01", 2.0),
+            (target_id, "2026-01-01 00:00:01", 2.5),
+            (target_id, "2026-01-01 00:00:03", 4.0),
+        ],
+    )
+    rows = database.iter_samples("pings", target_id, page_size=2)
+    assert [r["latency"] for r in rows] == [1.0, 2.0, 2.5, 3.0, 4.0]
+
+    rows = database.iter_samples(
+        "pings", target_id, "2026-01-01 00:00:01", "2026-01-01 00:00:03", page_size=1
+    )
+    assert [r["latency"] for r in rows] == [2.0, 2.5, 3.0]
+
+
+def test_iter_export_rows_merges_hops(test_db):
+    target_id = database.get_or_create_target("8.8.8.8")
+    _insert_at("pings", [(target_id, "2026-01-01 00:00:00", 1.0)])
+    _insert_at("pings", [(target_id, "2026-01-01 00:00:02", 3.0)])
+    _insert_at("hops", [(target_id, "2026-01-01 00:00:01", 0.5)])
+
+    rows = list(database.iter_export_rows("8.8.8.8"))
+    assert rows == [
+        ("2026-01-01 00:00:00", 1.0, 0.0, None, None),
+        ("2026-01-01 00:00:01", 0.5, None, 1, "10.0.0.1"),
+        ("2026-01-01 00:00:02", 3.0, 0.0, None, None),
+    ]
+    assert len(list(database.iter_export_rows("8.8.8.8", include_hops=False))) == 2
+    assert list(database.iter_export_rows("unknown")) == []
+
+
+def test_record_path_opens_a_row_per_route(test_db):
+    import time
+
+    target_id = database.get_or_create_target("8.8.8.8")
+    first = [(1, "10.0.0.1"), (2, "10.1.0.1"), (3, "8.8.8.8")]
+    second = [(1, "10.0.0.1"), (2, "10.2.0.1"), (3, "8.8.8.8")]
+    now = time.time()
+
+    assert database.record_path(target_id, first, now - 3 * 3600) is None
+    assert database.record_path(target_id, first, now - 2 * 3600) is None
+    assert database.record_path(target_id, second, now) == first
+
+    history = database.get_path_history("8.8.8.8")
+    assert [len(p["hops"]) for p in history] == [3, 3]
+    assert history[0]["changes"] is None
+    assert history[0]["last_seen"] > history[0]["first_seen"]
+    assert history[1]["hops"][1] == {"ttl": 2, "ip": "10.2.0.1"}
+    assert history[1]["changes"] == [{"ttl": 2, "old": "10.1.0.1", "new": "10.2.0.1"}]
+
+    # Routes that ended before the window are left out but still diffed against
+    assert database.get_path_history("8.8.8.8", hours=1) == history[1:]
+
+    database.clear_target_history("8.8.8.8")
+    assert database.get_path_history("8.8.8.8") == []
+    assert database.get_path_history("unknown") == []
+
+
+def test_path_changes_covers_longer_and_shorter_routes():
+    old = [(1, "a"), (2, "b")]
+    assert database.path_changes(old, [(1, "a"), (2, "b"), (3, "c")]) == [
+        {"ttl": 3, "old": None, "new": "c"}
+    ]
+    assert database.path_changes(old, [(1, "a")]) == [
+        {"ttl": 2, "old": "b", "new": None}
+    ]
+    assert database.path_changes(old, old) == []
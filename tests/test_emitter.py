@@ -0,0 +1,110 @@
+import pytest
+
+from emitter import FrameEmitter
+
+
+class FakeSocketIO:
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event, frame, to=None, callback=None):
+        self.sent.append((to, frame, callback))
+
+
+def hop(loss):
+    return {"target": "t", "num": "1", "ip": "10.0.0.1", "loss": loss}
+
+
+def ping(latency, sent):
+    return {"target": "t", "latency": latency, "loss": 0.0, "total_sent": sent}
+
+
+@pytest.fixture
+def sio():
+    return FakeSocketIO()
+
+
+def test_latest_policy_waits_for_ack_and_collapses(sio):
+    frames = FrameEmitter(sio, interval=0.25, policy="latest")
+    frames.session("a")
+    frames.publish(("a",), "ping", "t", "t", ping(1.0, 1))
+    frames.flush(now=0)
+    assert len(sio.sent) == 1
+
+    # Unacked: later ticks keep collapsing instead of queueing frames
+    for n, now in enumerate((0.25, 0.5, 0.75), start=2):
+        frames.publish(("a",), "ping", "t", "t", ping(float(n), n))
+        frames.flush(now=now)
+    assert len(sio.sent) == 1
+    assert frames.client_stats(now=0.75)["a"]["lag_ms"] == 750
+
+    sio.sent[0][2]()  # client acks
+    frames.flush(now=10)
+    assert len(sio.sent) == 2
+    assert sio.sent[1][1]["ping"]["t"] == {
+        "total_sent": 4,
+        "latencies": [2.0, 3.0, 4.0],
+    }
+
+
+def test_drop_oldest_bounds_queue_and_resyncs(sio):
+    frames = FrameEmitter(sio, interval=0.25, policy="drop_oldest", queue_size=2)
+    session = frames.session("a")
+    for n in range(5):
+        frames.publish(("a",), "hop", "t", "10.0.0.1", hop(n))
+        frames.flush(now=n)
+    # One frame in flight, the outbox capped at two, the rest dropped
+    assert len(sio.sent) == 1
+    assert len(session.outbox) == 2
+    assert session.dropped == 2
+
+    sio.sent[0][2]()
+    sio.sent[1][2]()
+    # Frames built after a drop carry the hop in full, not just a delta
+    assert sio.sent[2][1]["hops"]["t"]["10.0.0.1"] == {"num": "1", "loss": 4}
+
+
+def test_slow_client_is_downgraded_then_recovers(sio):
+    frames = FrameEmitter(sio, interval=0.25, max_interval=1.0)
+    session = frames.session("a")
+    for n in range(3):
+        frames.publish(("a",), "hop", "t", "10.0.0.1", hop(n))
+        frames.flush(now=n * 10)
+        frames.ack("a", session.in_flight[0], now=n * 10 + 2)
+    assert session.interval == 1.0
+    assert frames.stats()["downgraded_sessions"] == 1
+
+    for n in range(3, 20):
+        frames.publish(("a",), "hop", "t", "10.0.0.1", hop(n))
+        frames.flush(now=n * 10)
+        frames.ack("a", session.in_flight[0], now=n * 10 + 0.001)
+    assert session.interval == 0.25
+
+
+def test_unacked_frame_times_out(sio):
+    frames = FrameEmitter(sio, interval=0.25, ack_timeout=5)
+    session = frames.session("a")
+    frames.publish(("a",), "hop", "t", "10.0.0.1", hop(0))
+    frames.flush(now=0)
+    frames.flush(now=6)
+    assert session.timeouts == 1
+    # Nothing new was published, but the lost hop is resent in full
+    assert len(sio.sent) == 2
+    assert sio.sent[1][1]["hops"]["t"]["10.0.0.1"] == {"num": "1", "loss": 0}
+
+
+def test_unknown_policy_rejected(sio):
+    with pytest.raises(ValueError):
+        FrameEmitter(sio, policy="block")
+
+
+def test_bytes_are_only_measured_on_request(sio):
+    for measure in (False, True):
+        frames = FrameEmitter(sio, measure_bytes=measure)
+        frames.session("a")
+        frames.publish(("a",), "ping", "t", "t", ping(1.0, 1))
+        frames.flush(now=1)
+        stats = frames.stats()
+        assert stats["frames"] == 1
+        assert (stats["bytes"] is not None) == measure
+        assert (stats["byte_reduction"] is not None) == measure
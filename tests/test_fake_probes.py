@@ -0,0 +1,121 @@
+import os
+import re
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "benchmarks")
+)
+
+import app
+from fake_probes import FakeProbes
+
+
+def read(process, count):
+    return [process.stdout.readline() for _ in range(count)]
+
+
+def test_ping_lines_parse_and_bursts_lose_probes():
+    probes = FakeProbes(rate=1000, burst_every=0.01, burst_length=3, seed=7)
+    lines = read(probes.popen(["/usr/bin/ping", "-i", "1", "10.0.0.1"]), 26)
+
+    assert lines[0].startswith("PING 10.0.0.1")
+    replies = [app.parse_ping(line) for line in lines[1:] if "bytes from" in line]
+    lost = [line for line in lines[1:] if "no answer yet" in line]
+    assert len(replies) + len(lost) == 25
+    assert all(latency > 0 for latency in replies)
+    # A 3-probe burst every 10 probes
+    seqs = [int(re.search(r"icmp_seq=(\d+)", line).group(1)) for line in lost]
+    assert seqs == [10, 11, 12, 20, 21, 22]
+    assert len(probes.produced["10.0.0.1"]) == 25
+
+
+def test_output_is_seeded_per_target():
+    argv = ["/usr/bin/ping", "-i", "1", "10.0.0.1"]
+    first = read(FakeProbes(rate=1000, timeout_rate=0.2).popen(argv), 20)
+    second = read(FakeProbes(rate=1000, timeout_rate=0.2).popen(argv), 20)
+    other = read(FakeProbes(rate=1000, timeout_rate=0.2, seed=2).popen(argv), 20)
+    assert first == second
+    assert first != other
+
+
+def test_tracepath_and_hop_ping():
+    probes = FakeProbes(hops=4, latency_ms=1)
+    lines = list(
+        iter(probes.popen(["/usr/bin/tracepath", "-n", "10.0.3.7"]).stdout.readline, "")
+    )
+    hops = [re.search(r"^\s*(\d+):\s+([\d\.]+)", line) for line in lines]
+    assert [m.group(2) for m in hops if m] == [
+        "10.3.7.1",
+        "10.3.7.2",
+        "10.3.7.3",
+        "10.0.3.7",
+    ]
+
+    result = probes.run(["ping", "-c", "3", "-i", "0.01", "-W", "1", "10.0.3.1"])
+    assert len(re.findall(r"time=", result.stdout)) == 3
+
+
+def test_replay_keeps_recorded_spacing(tmp_path):
+    recording = tmp_path / "ping.txt"
+    recording.write_text(
+        "[1697049600.000000] 64 bytes from 10.0.0.1: icmp_seq=1 ttl=60 time=5.0 ms\n"
+        "[1697049600.500000] 64 bytes from 10.0.0.1: icmp_seq=2 ttl=60 time=6.0 ms\n"
+    )
+    probes = FakeProbes(rate=10, replay=str(recording))
+    assert [delay for delay, _ in probes.replay] == [None, 0.5]
+
+    lines = read(probes.popen(["/usr/bin/ping", "-i", "1", "10.0.0.1"]), 3)
+    assert [app.parse_ping(line) for line in lines] == [5.0, 6.0, 5.0]
+    produced = probes.produced["10.0.0.1"]
+    assert 0.04 <= produced[1] - produced[0] < 0.2
+
+
+def test_timestamps_prefix_sample_lines_like_ping_d():
+    probes = FakeProbes(rate=1000, timestamps=True)
+    before = time.time()
+    header, reply = read(probes.popen(["/usr/bin/ping", "-i", "1", "10.0.0.1"]), 2)
+    assert header.startswith("PING")
+    stamp = float(re.match(r"^\[(\d+\.\d+)\] 64 bytes from", reply).group(1))
+    assert before <= stamp <= time.time()
+    assert app.parse_ping(reply) is not None
+
+
+def test_ttl_probes_follow_route_changes(monkeypatch):
+    import ping_parser
+
+    probes = FakeProbes(hops=5, latency_ms=0, route_change_every=10)
+    ttl_probe = lambda ttl: ping_parser.responder(
+        probes.run(
+            ["ping", "-n", "-c", "1", "-t", str(ttl), "-W", "1", "10.0.3.7"]
+        ).stdout
+    )
+    assert ttl_probe(1) == ("10.3.7.1", False)
+    assert ttl_probe(3) == ("10.3.7.3", False)
+    assert ttl_probe(5) == ("10.0.3.7", True)
+
+    monkeypatch.setattr(probes, "started", time.monotonic() - 15)
+    assert ttl_probe(3) == ("10.3.7.103", False)
+    assert ttl_probe(2) == ("10.3.7.2", False)
+
+
+def test_ttl_probe_loss_replays_per_seed():
+    def answered(seed):
+        probes = FakeProbes(hops=5, latency_ms=0, hop_loss=0.5, seed=seed)
+        argv = ["ping", "-n", "-c", "1", "-t", "2", "-W", "1", "10.0.3.7"]
+        return [bool(probes.run(argv).stdout) for _ in range(20)]
+
+    assert answered(1) == answered(1)
+    assert answered(1) != answered(2)
+
+
+def test_hop_pings_replay_per_seed():
+    def hop_pings(seed):
+        probes = FakeProbes(latency_ms=0, hop_loss=0.3, seed=seed)
+        argv = ["ping", "-c", "5", "-i", "0", "-W", "1", "10.0.0.1"]
+        return [probes.run(argv).stdout for _ in range(3)]
+
+    first = hop_pings(1)
+    assert hop_pings(1) == first
+    assert hop_pings(2) != first
+    assert len(set(first)) == 3
@@ -0,0 +1,68 @@
+import eventlet
+from eventlet.patcher import original
+
+import app  # noqa: F401  monkey-patches, as in production
+import database
+import hub
+
+real_sleep = original("time").sleep
+
+
+def test_blocking_call_runs_off_the_hub():
+    threads = []
+    ticks = []
+
+    @hub.blocking
+    def slow_query():
+        threads.append(hub.real_threading.get_ident())
+        real_sleep(0.2)  # stands in for a commit waiting on a locked database
+        return 42
+
+    def ticker():
+        for _ in range(10):
+            ticks.append(1)
+            eventlet.sleep(0.01)
+
+    greenlet = eventlet.spawn(ticker)
+    assert slow_query() == 42
+    greenlet.wait()
+    assert threads[0] != hub.real_threading.get_ident()
+    # The other greenlet kept running while the query blocked its thread
+    assert len(ticks) == 10
+
+
+def test_nested_blocking_calls_run_inline():
+    @hub.blocking
+    def inner():
+        return hub.real_threading.get_ident()
+
+    @hub.blocking
+    def outer():
+        return hub.real_threading.get_ident(), inner()
+
+    outer_thread, inner_thread = outer()
+    assert outer_thread == inner_thread
+
+
+def test_stall_monitor_reports_blocked_hub():
+    monitor = hub.StallMonitor(threshold_ms=100, interval=0.01)
+    monitor.start()
+    eventlet.sleep(0.05)
+    real_sleep(0.2)
+    eventlet.sleep(0.05)
+    monitor.stop()
+    stats = monitor.stats()
+    assert stats["stalls"] == 1
+    assert stats["recent"][0]["lag_ms"] >= 150
+    assert stats["checks"] > 5
+
+
+def test_writer_queue_is_bounded(tmp_path):
+    writer = database.SampleWriter(str(tmp_path / "w.db"), max_queue=3)
+    for i in range(5):
+        writer.save_ping(1, float(i), 0)
+    writer.save_hop(1, 1, "10.0.0.1", 1.0, 0)
+    assert writer.queue_depth() == 3
+    assert writer.stats()["dropped"] == 3
+    # The newest samples are the ones kept
+    assert [row[2] for row in writer._pings] == [3.0, 4.0]
@@ -0,0 +1,125 @@
+import socket
+import struct
+
+import pytest
+
+import icmp_engine
+from icmp_engine import IcmpProbeEngine
+
+
+def test_checksum_round_trip():
+    packet = icmp_engine.build_echo_request(socket.AF_INET, 7, b"payload!")
+    # A packet including its own checksum sums to zero
+    assert icmp_engine.checksum(packet) == 0
+
+
+def test_parse_echo_reply():
+    reply = struct.pack("!BBHHH", icmp_engine.ICMP_ECHO_REPLY, 0, 0, 4242, 7) + b"x"
+    assert icmp_engine.parse_echo_reply(socket.AF_INET, reply) == (4242, 7)
+    # An echo request or a v6 type on the v4 socket is not a reply
+    request = icmp_engine.build_echo_request(socket.AF_INET, 7, b"x")
+    assert icmp_engine.parse_echo_reply(socket.AF_INET, request) is None
+    assert icmp_engine.parse_echo_reply(socket.AF_INET6, reply) is None
+    assert icmp_engine.parse_echo_reply(socket.AF_INET, b"\0\0") is None
+
+
+def test_parse_ancillary():
+    ancdata = [
+        (socket.SOL_SOCKET, icmp_engine.SO_TIMESTAMPNS, struct.pack("@ll", 10, 500)),
+        (socket.IPPROTO_IP, socket.IP_TTL, struct.pack("@i", 57)),
+    ]
+    assert icmp_engine.parse_ancillary(ancdata) == (10_000_000_500, 57)
+    assert icmp_engine.parse_ancillary([]) == (None, None)
+
+
+@pytest.fixture
+def engine():
+    if not IcmpProbeEngine.available():
+        pytest.skip("unprivileged ICMP sockets not permitted here")
+    engine = IcmpProbeEngine(timeout=1.0)
+    engine.start()
+    yield engine
+    engine.stop()
+
+
+def test_probe_localhost(engine):
+    family, address = engine.resolve("127.0.0.1")
+    result = engine.probe(address, family)
+    assert result is not None
+    assert result["address"] == "127.0.0.1"
+    assert 0 <= result["rtt_ms"] < 100
+    assert result["received_at"] >= result["sent_at"]
+    assert result["ttl"] > 0
+    assert engine.sent == engine.received == 1
+
+
+def test_concurrent_probes_match_by_sequence(engine):
+    import eventlet
+
+    pool = eventlet.GreenPool()
+    results = list(pool.imap(lambda _: engine.probe("127.0.0.1"), range(10)))
+    assert all(r is not None for r in results)
+    assert len({r["seq"] for r in results}) == 10
+
+
+class BrokenSocket:
+    def __init__(self, errors):
+        self.errors = errors
+
+    def getsockname(self):
+        return ("0.0.0.0", 4242)
+
+    def recvmsg(self, *args):
+        self.errors -= 1
+        if self.errors < 0:
+            raise BlockingIOError
+        raise OSError(9, "Bad file descriptor")
+
+
+def test_receive_errors_mark_engine_failed(monkeypatch):
+    monkeypatch.setattr(icmp_engine, "RECEIVE_ERROR_BACKOFF", 0)
+    monkeypatch.setattr(icmp_engine.select, "select", lambda r, w, x, t: (r, w, x))
+    engine = IcmpProbeEngine()
+    pending = icmp_engine._Pending("127.0.0.1", 0)
+    engine._pending[(socket.AF_INET, 1)] = pending
+
+    engine._receive_loop(socket.AF_INET, BrokenSocket(icmp_engine.MAX_RECEIVE_ERRORS))
+
+    assert engine.receive_errors == icmp_engine.MAX_RECEIVE_ERRORS
+    assert "Bad file descriptor" in engine.failed
+    # Probes in flight give up at once instead of waiting out their timeout
+    assert pending.done.is_set()
+    assert engine.probe("127.0.0.1") is None
+
+
+def test_probes_released_by_a_failing_engine_count_as_timeouts(monkeypatch):
+    engine = IcmpProbeEngine(timeout=5)
+    sent = []
+
+    class Socket:
+        def sendto(self, packet, address):
+            sent.append(packet)
+            engine._fail("receiver stopped")
+
+    engine._sockets[socket.AF_INET] = Socket()
+    engine._next_seq[socket.AF_INET] = 0
+    assert engine.probe("127.0.0.1") is None
+    assert sent
+    assert (engine.sent, engine.received, engine.timeouts) == (1, 0, 1)
+
+
+def test_transient_receive_errors_are_survived(monkeypatch):
+    monkeypatch.setattr(icmp_engine, "RECEIVE_ERROR_BACKOFF", 0)
+    engine = IcmpProbeEngine()
+    calls = []
+
+    def select_then_stop(r, w, x, t):
+        calls.append(1)
+        if len(calls) > 5:
+            engine._stopping.set()
+        return r, w, x
+
+    monkeypatch.setattr(icmp_engine.select, "select", select_then_stop)
+    engine._receive_loop(socket.AF_INET, BrokenSocket(3))
+    assert engine.receive_errors == 3
+    assert engine.failed is None
@@ -31,6 +31,89 @@ def test_get_history_empty(client):
     assert rv.get_json() == []
 
 
+def test_get_history_bad_resolution(client):
+    rv = client.get("/api/history/8.8.8.8?resolution=5s")
+    assert rv.status_code == 400
+
+
+def test_path_history_api(client):
+    target_id = database.get_or_create_target("8.8.8.8")
+    database.record_path(target_id, [(1, "10.0.0.1"), (2, "8.8.8.8")])
+    database.record_path(target_id, [(1, "10.0.0.2"), (2, "8.8.8.8")])
+
+    rv = client.get("/api/paths/8.8.8.8")
+    assert rv.status_code == 200
+    body = rv.get_json()
+    assert body["target"] == "8.8.8.8"
+    assert [p["hops"][0]["ip"] for p in body["paths"]] == ["10.0.0.1", "10.0.0.2"]
+    assert body["paths"][1]["changes"] == [
+        {"ttl": 1, "old": "10.0.0.1", "new": "10.0.0.2"}
+    ]
+    assert client.get("/api/paths/8.8.8.8?hours=0").status_code == 400
+
+
+def test_stats_api(client, monkeypatch):
+    import app as app_module
+    from latency_sketch import SketchStore
+
+    monkeypatch.setattr(app_module, "sketches", SketchStore())
+    assert client.get("/api/stats/8.8.8.8").status_code == 404
+
+    target_id = database.get_or_create_target("8.8.8.8")
+    for latency in (10.0, 12.0, 30.0):
+        app_module.sketches.record(target_id, latency)
+    app_module.sketches.checkpoint()
+
+    rv = client.get("/api/stats/8.8.8.8?histogram=1m")
+    assert rv.status_code == 200
+    stats = rv.get_json()
+    assert set(stats["windows"]) == {"1m", "15m", "1h"}
+    assert stats["windows"]["1m"]["count"] == 3
+    assert sum(count for _, count in stats["histogram"]) == 3
+    assert client.get("/api/stats/8.8.8.8?histogram=5m").status_code == 400
+
+
+def test_analytics_api(client):
+    assert client.get("/api/analytics/8.8.8.8").status_code == 404
+
+    target_id = database.get_or_create_target("8.8.8.8")
+    for latency in (10.0, 20.0, None, 15.0):
+        database.save_ping(target_id, latency, 0)
+    rv = client.get("/api/analytics/8.8.8.8?points=2")
+    assert rv.status_code == 200
+    report = rv.get_json()
+    assert report["samples"] == 4
+    assert report["loss"] == 25.0
+    assert len(report["series"]["mos"]) == 2
+    assert client.get("/api/analytics/8.8.8.8?points=0").status_code == 400
+
+
+def test_analytics_api_offloads_and_caps_hours(client, monkeypatch):
+    import app as app_module
+    import retention
+
+    target_id = database.get_or_create_target("8.8.8.8")
+    database.save_ping(target_id, 10.0, 0)
+    asked, offloaded = [], []
+    get_samples = database.get_samples
+    monkeypatch.setattr(
+        database,
+        "get_samples",
+        lambda target_id, hours: asked.append(hours) or get_samples(target_id, hours),
+    )
+    call = app_module.hub.call
+    monkeypatch.setattr(
+        app_module.hub,
+        "call",
+        lambda func, *args: offloaded.append(func) or call(func, *args),
+    )
+
+    rv = client.get("/api/analytics/8.8.8.8?hours=100000")
+    assert rv.status_code == 200
+    assert asked == [retention.RAW_RETENTION_DAYS * 24]
+    assert app_module.analytics.analyze in offloaded
+
+
 def test_clear_history_api(client):
     address = "8.8.8.8"
     database.get_or_create_target(address)
@@ -59,3 +142,73 @@ def test_export_csv_api(client, monkeypatch, tmp_path):
 def test_export_csv_not_found(client):
     rv = client.get("/api/export-csv/nonexistent.com")
     assert rv.status_code == 404
+
+
+def test_export_csv_streams_hops_and_filters(client):
+    target_id = database.get_or_create_target("8.8.8.8")
+    conn = database.get_db()
+    conn.executemany(
+        "INSERT INTO pings (target_id, timestamp, latency, loss) VALUES (?, ?, ?, 0)",
+        [
+            (target_id, "2026-01-01 00:00:00", 1.0),
+            (target_id, "2026-01-02 00:00:00", 2.0),
+        ],
+    )
+    conn.execute(
+        "INSERT INTO hops (target_id, timestamp, hop_num, ip, latency, loss) "
+        "VALUES (?, '2026-01-01 00:00:01', 1, '10.0.0.1', 0.5, 0)",
+        (target_id,),
+    )
+    conn.commit()
+    conn.close()
+
+    rv = client.get("/api/export-csv/8.8.8.8")
+    assert rv.is_streamed
+    lines = rv.data.decode().splitlines()
+    assert lines[0] == "timestamp,latency,loss,hop_num,ip"
+    assert lines[2] == "2026-01-01 00:00:01,0.5,0.0,1,10.0.0.1"
+    assert len(lines) == 4
+
+    rv = client.get("/api/export-csv/8.8.8.8?start=2026-01-01T12:00:00Z&hops=0")
+    lines = rv.data.decode().splitlines()
+    assert lines[1:] == ["2026-01-02 00:00:00,2.0,0.0,,"]
+
+    rv = client.get("/api/export-csv/8.8.8.8?end=2020-01-01")
+    assert rv.status_code == 404
+
+
+def test_export_csv_bad_range(client):
+    rv = client.get("/api/export-csv/8.8.8.8?start=yesterday")
+    assert rv.status_code == 400
+
+
+def test_metrics_endpoint(client):
+    import app as app_module
+
+    app_module.probe_metrics.observe_ping("9.9.9.9", 20.0, 0.0, 1.0, 4.3)
+    rv = client.get("/metrics")
+    assert rv.status_code == 200
+    assert rv.content_type.startswith("text/plain; version=0.0.4")
+    text = rv.get_data(as_text=True)
+    assert 'packet_tester_ping_mos{target="9.9.9.9"} 4.3' in text
+    assert "packet_tester_greenlets " in text
+    assert "packet_tester_emit_frames_total " in text
+    app_module.probe_metrics.forget("9.9.9.9")
+
+
+def test_debug_stages_and_profile(client):
+    import app as app_module
+
+    rv = client.post("/api/debug/stages", json={"enabled": True, "reset": True})
+    assert rv.get_json() == {"enabled": True, "stages": {}}
+    with app_module.stage("parse"):
+        pass
+    assert client.get("/api/debug/stages").get_json()["stages"]["parse"]["count"] == 1
+    client.post("/api/debug/stages", json={"enabled": False, "reset": True})
+
+    rv = client.get("/api/debug/profile?seconds=0.1&format=json")
+    assert rv.status_code == 200
+    assert rv.get_json()["samples"] > 0
+    rv = client.get("/api/debug/profile?seconds=0.05")
+    assert rv.content_type.startswith("text/plain")
+    assert client.get("/api/debug/profile?seconds=999").status_code == 400
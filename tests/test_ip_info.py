@@ -0,0 +1,105 @@
+import time
+
+import eventlet
+import pytest
+from unittest.mock import MagicMock, patch
+
+import database
+import ip_info
+from ip_info import IpInfoCache
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    cache = IpInfoCache(max_size=3, ttl=60, negative_ttl=1)
+    monkeypatch.setattr(ip_info, "ip_info_cache", cache)
+    yield cache
+
+
+def _response(payload):
+    resp = MagicMock()
+    resp.json.return_value = payload
+    return resp
+
+
+def test_cache_evicts_least_recently_used(fresh_cache):
+    for ip in ("1.1.1.1", "2.2.2.2", "3.3.3.3"):
+        fresh_cache[ip] = {"isp": ip, "location": "-"}
+    fresh_cache.get("1.1.1.1")  # refresh 1.1.1.1
+    fresh_cache["4.4.4.4"] = {"isp": "4", "location": "-"}
+    assert "2.2.2.2" not in fresh_cache
+    assert "1.1.1.1" in fresh_cache
+    assert len(fresh_cache) == 3
+
+
+def test_cache_entries_expire(fresh_cache):
+    fresh_cache.put("1.1.1.1", {"isp": "x", "location": "-"}, ttl=-1, persist=False)
+    assert fresh_cache.get("1.1.1.1") is None
+    assert len(fresh_cache) == 0
+
+
+@patch("requests.get")
+def test_failed_lookup_is_negatively_cached(mock_get, fresh_cache):
+    mock_get.side_effect = Exception("Network error")
+    assert ip_info.get_ip_info("1.2.3.4")["isp"] == "Unknown ISP"
+    assert ip_info.get_ip_info("1.2.3.4")["isp"] == "Unknown ISP"
+    assert mock_get.call_count == 1
+
+    # Negative entries expire on their own, shorter, ttl
+    fresh_cache._entries["1.2.3.4"] = (ip_info.UNKNOWN, time.time() - 1)
+    ip_info.get_ip_info("1.2.3.4")
+    assert mock_get.call_count == 2
+
+
+@patch("requests.get")
+def test_cache_persists_across_restart(mock_get, fresh_cache):
+    mock_get.return_value = _response(
+        {"status": "success", "isp": "Google LLC", "city": "X", "countryCode": "US"}
+    )
+    ip_info.get_ip_info("8.8.8.8")
+
+    restarted = IpInfoCache(max_size=3, ttl=60)
+    assert restarted.load() == 1
+    assert restarted.get("8.8.8.8")["isp"] == "Google LLC"
+
+
+def test_load_skips_expired_rows():
+    database.save_ip_info("9.9.9.9", "Quad9", "-", time.time() - 5)
+    assert IpInfoCache().load() == 0
+
+
+@patch("requests.get")
+def test_async_lookup_returns_pending_then_calls_back(mock_get):
+    mock_get.return_value = _response(
+        {"status": "success", "isp": "Cloudflare", "city": "", "countryCode": "US"}
+    )
+    delivered = []
+    first = ip_info.get_ip_info_async("1.1.1.1", delivered.append)
+    second = ip_info.get_ip_info_async("1.1.1.1", delivered.append)
+    assert first == second == ip_info.PENDING
+
+    ip_info._lookup_pool.waitall()
+    assert [d["isp"] for d in delivered] == ["Cloudflare", "Cloudflare"]
+    assert mock_get.call_count == 1
+    # Now cached: answered synchronously without a callback
+    assert ip_info.get_ip_info_async("1.1.1.1", delivered.append)["isp"] == "Cloudflare"
+    assert len(delivered) == 2
+
+
+@patch("requests.get")
+def test_async_lookup_counts_one_miss(mock_get, fresh_cache):
+    mock_get.return_value = _response(
+        {"status": "success", "isp": "Cloudflare", "city": "", "countryCode": "US"}
+    )
+    ip_info.get_ip_info_async("1.1.1.1", lambda info: None)
+    ip_info._lookup_pool.waitall()
+    ip_info.get_ip_info_async("1.1.1.1", lambda info: None)
+    assert fresh_cache.stats()["hits"] == 1
+    assert fresh_cache.stats()["misses"] == 1
+
+
+def test_async_lookup_private_is_immediate():
+    callback = MagicMock()
+    info = ip_info.get_ip_info_async("10.0.0.1", callback)
+    assert info["isp"] == "Local Network"
+    assert not callback.called
@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+import ip_info
+from ip_ranges import OfflineResolver, RangeIndex
+
+DATASET = """network,asn,isp,city,country
+8.8.8.0/24,15169,Google LLC,Mountain View,US
+1.1.1.0/24,AS13335,Cloudflare,,AU
+2001:4860::/32,15169,Google LLC,,US
+"""
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = tmp_path / "ranges.csv"
+    path.write_text(DATASET)
+    return path
+
+
+def test_range_index_bisects_inclusive_bounds():
+    index = RangeIndex.build([(20, 29, "b"), (10, 15, "a")], 32)
+    assert index.find(10) == index.find(15) == "a"
+    assert index.find(29) == "b"
+    assert index.find(9) is None
+    assert index.find(16) is None
+    assert index.find(30) is None
+
+
+def test_lookup_ipv4_and_ipv6(dataset):
+    resolver = OfflineResolver(str(dataset))
+    resolver.load()
+    assert len(resolver) == 3
+    assert resolver.lookup("8.8.8.8") == {
+        "asn": "AS15169",
+        "isp": "Google LLC",
+        "location": "Mountain View, US",
+    }
+    assert resolver.lookup("1.1.1.1")["location"] == "AU"
+    assert resolver.lookup("2001:4860:4860::8888")["isp"] == "Google LLC"
+    assert resolver.lookup("9.9.9.9") is None
+    assert resolver.lookup("not-an-ip") is None
+
+
+def test_start_end_columns(tmp_path):
+    path = tmp_path / "ranges.csv"
+    path.write_text("start_ip,end_ip,isp\n9.9.9.0,9.9.9.255,Quad9\n")
+    resolver = OfflineResolver(str(path))
+    resolver.load()
+    assert resolver.lookup("9.9.9.9")["isp"] == "Quad9"
+
+
+def test_maybe_reload_picks_up_changes(dataset):
+    resolver = OfflineResolver(str(dataset))
+    resolver.load()
+    assert not resolver.maybe_reload()
+
+    dataset.write_text("network,isp\n9.9.9.0/24,Quad9\n")
+    os.utime(dataset, (0, 1))
+    assert resolver.maybe_reload()
+    assert resolver.lookup("9.9.9.9")["isp"] == "Quad9"
+    assert resolver.lookup("8.8.8.8") is None
+
+
+def test_get_ip_info_prefers_dataset_over_http(dataset, mocker, monkeypatch):
+    monkeypatch.setattr(ip_info, "offline_resolver", None)
+    ip_info.load_offline_resolver(str(dataset), reload_interval=0)
+    http = mocker.patch("requests.get")
+    assert ip_info.get_ip_info("8.8.8.8")["isp"] == "Google LLC"
+    assert ip_info.get_ip_info_async("1.1.1.1", None)["isp"] == "Cloudflare"
+    assert not http.called
+
+    monkeypatch.setattr(ip_info, "IP_INFO_HTTP", False)
+    ip_info.ip_info_cache.clear()
+    assert ip_info.get_ip_info("9.9.9.9") == ip_info.UNKNOWN
+    assert not http.called
+
+
+@pytest.mark.parametrize(
+    "ip,expected",
+    [
+        ("10.0.0.1", True),
+        ("172.16.0.1", True),
+        ("172.32.0.1", False),
+        ("192.168.1.1", True),
+        ("100.64.0.1", True),
+        ("127.0.0.1", True),
+        ("169.254.1.1", True),
+        ("fd00::1", True),
+        ("fe80::1", True),
+        ("::ffff:192.168.1.1", True),
+        ("8.8.8.8", False),
+        ("2001:4860::1", False),
+        ("garbage", False),
+    ],
+)
+def test_is_private(ip, expected):
+    assert ip_info.is_private(ip) is expected
@@ -0,0 +1,132 @@
+import eventlet
+import pytest
+
+import app as app_module
+import database
+import ipc
+from app import active_tasks, latest_results, pinned, remote_watchers, subscribers
+from app import socketio
+from emitter import FrameEmitter
+
+
+class FakeConn:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+def wait_for(condition, timeout=2):
+    deadline = eventlet.hubs.get_hub().clock() + timeout
+    while not condition():
+        assert eventlet.hubs.get_hub().clock() < deadline
+        eventlet.sleep(0.01)
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    for state in (active_tasks, subscribers, pinned, latest_results, remote_watchers):
+        state.clear()
+    yield
+    for state in (active_tasks, subscribers, pinned, latest_results, remote_watchers):
+        state.clear()
+
+
+def test_round_trip_over_unix_socket(tmp_path):
+    path = str(tmp_path / "ipc.sock")
+    commands, received, gone = [], [], []
+    server = ipc.IpcServer(
+        path,
+        on_command=lambda conn, m: commands.append(m),
+        on_disconnect=gone.append,
+    )
+    server.start()
+    client = ipc.IpcClient(path, on_message=received.append)
+    client.start()
+    try:
+        wait_for(lambda: len(server.connections) == 1)
+        client.send({"type": "start", "target": "8.8.8.8"})
+        wait_for(lambda: commands)
+        assert commands == [{"type": "start", "target": "8.8.8.8"}]
+
+        server.publish({"type": "ping", "target": "8.8.8.8", "payload": {"x": 1}})
+        wait_for(lambda: received)
+        assert received[0]["payload"] == {"x": 1}
+        assert server.stats()["connections"] == 1
+    finally:
+        client.stop()
+    wait_for(lambda: gone)
+    assert not server.connections
+    server.stop()
+
+
+def test_slow_reader_loses_oldest_messages():
+    conn = ipc.Connection(sock=None, queue_size=2)
+    for i in range(5):
+        conn.send({"i": i})
+    assert conn.dropped == 3
+    assert [conn.queue.get_nowait() for _ in range(2)] == [
+        ipc.encode({"i": 3}),
+        ipc.encode({"i": 4}),
+    ]
+
+
+def test_collector_stops_target_after_last_worker(mocker):
+    mocker.patch("eventlet.spawn")
+    a, b = FakeConn(), FakeConn()
+    database.get_or_create_target("8.8.8.8")
+    latest_results["8.8.8.8"] = {"hops": {}, "ping": {"latency": 5.0}}
+    active_tasks["8.8.8.8"] = {}
+
+    app_module.handle_ipc_command(a, {"type": "start", "target": "8.8.8.8"})
+    app_module.handle_ipc_command(
+        b, {"type": "start", "target": "8.8.8.8", "snapshot": True}
+    )
+    assert a.sent == []
+    assert b.sent[0]["payload"] == {"latency": 5.0}
+    assert "8.8.8.8" in pinned
+
+    # Another worker still shows it
+    app_module.handle_ipc_command(a, {"type": "stop", "target": "8.8.8.8"})
+    assert "8.8.8.8" in active_tasks
+
+    app_module.handle_ipc_command(b, {"type": "stop", "target": "8.8.8.8"})
+    assert "8.8.8.8" not in active_tasks
+    assert "8.8.8.8" not in database.get_active_targets()
+
+
+def test_worker_forwards_collector_results(mocker, monkeypatch):
+    client = mocker.Mock()
+    monkeypatch.setattr(app_module, "ipc_client", client)
+    monkeypatch.setattr(app_module, "frames", FrameEmitter(socketio))
+    publish = mocker.spy(app_module.frames, "publish")
+    spawn = mocker.patch("eventlet.spawn")
+    browser = socketio.test_client(app_module.app)
+
+    browser.emit("start_test", {"target": "8.8.8.8"})
+    client.send.assert_called_with(
+        {"type": "start", "target": "8.8.8.8", "snapshot": True}
+    )
+    payload = {"latency": 5.0, "loss": 0.0, "jitter": 0.1, "mos": 4.4}
+    app_module.handle_ipc_message(
+        {"type": "ping", "target": "8.8.8.8", "key": "8.8.8.8", "payload": payload}
+    )
+    assert publish.call_args.args[1:] == ("ping", "8.8.8.8", "8.8.8.8", payload)
+    assert latest_results["8.8.8.8"]["ping"] == payload
+
+    # Workers never probe; stopping is left to the collector
+    browser.emit("stop_test", {"target": "8.8.8.8"})
+    client.send.assert_called_with({"type": "stop", "target": "8.8.8.8"})
+    spawn.assert_not_called()
+    assert "8.8.8.8" in database.get_active_targets()
+
+    app_module.handle_ipc_message({"type": "stopped", "target": "8.8.8.8"})
+    assert "8.8.8.8" not in latest_results
+
+    subscribers["1.1.1.1"] = {"sid2"}
+    app_module.resubscribe_all()
+    client.send.assert_called_with(
+        {"type": "start", "target": "1.1.1.1", "snapshot": True}
+    )
+    browser.disconnect()
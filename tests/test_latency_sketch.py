@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+import database
+from latency_sketch import PRECISION, Histogram, RollingSketch, SketchStore
+
+
+def exact_percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * pct // 100) - 1)]
+
+
+def test_percentiles_within_precision():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 0.6) for _ in range(5000)]
+    sketch = RollingSketch()
+    for v in values:
+        sketch.record(v, now=1000)
+    summary = sketch.summary(now=1000)["1m"]
+    assert summary["count"] == 5000
+    for pct in (50, 95, 99):
+        exact = exact_percentile(values, pct)
+        assert abs(summary[f"p{pct}"] - exact) / exact <= PRECISION
+
+
+def test_windows_expire_by_slot():
+    sketch = RollingSketch()
+    for t in range(0, 120):
+        sketch.record(100.0 if t < 60 else 10.0, now=t)
+    sketch.record(None, now=119)
+    windows = sketch.summary(now=119)
+    # The 1m window only holds the recent 10 ms samples (plus one loss)
+    assert windows["1m"]["p99"] == pytest.approx(10.0, rel=PRECISION)
+    assert windows["1m"]["count"] == 60
+    assert windows["1m"]["loss"] == round(100 / 61, 2)
+    assert windows["15m"]["count"] == 120
+    assert windows["15m"]["p99"] == pytest.approx(100.0, rel=PRECISION)
+
+    assert sketch.summary(now=4000)["1h"]["count"] == 0
+
+
+def test_merge_is_reversible():
+    a, b = Histogram(), Histogram()
+    for i in (1, 2, 2, 5):
+        a.add(i)
+    b.add(2)
+    b.lost = 1
+    a.merge(b)
+    assert a.counts == {1: 1, 2: 3, 5: 1} and a.lost == 1
+    a.merge(b, sign=-1)
+    assert a.counts == {1: 1, 2: 2, 5: 1} and a.received == 4 and a.lost == 0
+
+
+def test_checkpoint_survives_restart():
+    target_id = database.get_or_create_target("8.8.8.8")
+    store = SketchStore()
+    for latency in (10.0, 20.0, None):
+        store.record(target_id, latency)
+    assert store.checkpoint() == 1
+    assert store.checkpoint() == 0  # nothing dirty
+
+    restored = SketchStore().get(target_id)
+    window = restored.summary()["15m"]
+    assert window["count"] == 2
+    assert window["loss"] == 33.33
+    assert window["p99"] == pytest.approx(20.0, rel=PRECISION)
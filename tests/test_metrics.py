@@ -0,0 +1,55 @@
+from metrics import BATCH_BUCKETS, Histogram, Registry
+
+
+def test_histogram_buckets_are_inclusive_upper_bounds():
+    h = Histogram((1, 10))
+    for value in (0.5, 1, 5, 10, 50):
+        h.observe(value)
+    assert h.counts == [2, 2, 1]
+    assert h.count == 5
+    assert h.sum == 66.5
+
+
+def test_render_target_metrics():
+    registry = Registry()
+    registry.observe_ping("8.8.8.8", 12.0, 0.0, 0.5, 4.4)
+    registry.observe_ping("8.8.8.8", None, 50.0, 0.5, 1.0)
+    text = registry.render()
+    assert "# TYPE packet_tester_ping_latency_seconds histogram" in text
+    assert (
+        'packet_tester_ping_latency_seconds_bucket{target="8.8.8.8",le="0.01"} 0'
+        in text
+    )
+    assert (
+        'packet_tester_ping_latency_seconds_bucket{target="8.8.8.8",le="0.025"} 1'
+        in text
+    )
+    assert 'packet_tester_ping_latency_seconds_count{target="8.8.8.8"} 1' in text
+    assert 'packet_tester_ping_sent_total{target="8.8.8.8"} 2' in text
+    assert 'packet_tester_ping_received_total{target="8.8.8.8"} 1' in text
+    assert 'packet_tester_ping_loss_percent{target="8.8.8.8"} 50.0' in text
+    assert 'packet_tester_ping_jitter_seconds{target="8.8.8.8"} 0.0005' in text
+    assert 'packet_tester_ping_mos{target="8.8.8.8"} 1.0' in text
+
+    registry.forget("8.8.8.8")
+    assert "8.8.8.8" not in registry.render()
+
+
+def test_registered_collectors():
+    registry = Registry()
+    batches = Histogram(BATCH_BUCKETS)
+    batches.observe(120)
+    registry.register("db_batch_rows", "histogram", "Rows per batch", lambda: batches)
+    registry.register("greenlets", "gauge", "Live greenlets", lambda: 7)
+    registry.register("missing", "gauge", "Not available", lambda: None)
+    registry.register("broken", "gauge", "Raises", lambda: 1 / 0)
+    registry.register(
+        "labelled", "gauge", "With labels", lambda: [({"ip": 'a"b'}, 1.5)]
+    )
+    text = registry.render()
+    assert 'packet_tester_db_batch_rows_bucket{le="250"} 1' in text
+    assert 'packet_tester_db_batch_rows_bucket{le="+Inf"} 1' in text
+    assert "packet_tester_greenlets 7" in text
+    assert "missing" not in text
+    assert "broken" not in text
+    assert 'packet_tester_labelled{ip="a\\"b"} 1.5' in text
@@ -0,0 +1,116 @@
+import pytest
+
+import ping_parser
+from ping_parser import DUPLICATE, LOST, REPLY, PingLine, SequenceTracker, parse
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        (
+            "[1697049600.123456] 64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=14.5 ms\n",
+            PingLine(REPLY, 1, 117, 14.5, 1697049600.123456),
+        ),
+        (
+            "64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=15 ms",
+            PingLine(REPLY, 1, 117, 15.0, None),
+        ),
+        (
+            "[1697049600.5] 64 bytes from 2001:4860:4860::8888: icmp_seq=7 ttl=57 "
+            "time=20.1 ms",
+            PingLine(REPLY, 7, 57, 20.1, 1697049600.5),
+        ),
+        (
+            "1240 bytes from dns.google (2001:4860:4860::8888): icmp_seq=2 hlim=57 "
+            "time=0.045 ms",
+            PingLine(REPLY, 2, 57, 0.045, None),
+        ),
+        (
+            "64 bytes from 10.0.0.1: icmp_seq=3 ttl=64 time=1.2 ms (DUP!)",
+            PingLine(DUPLICATE, 3, 64, 1.2, None),
+        ),
+        (
+            "64 bytes from 8.8.8.8: seq=0 ttl=117 time=14.5 ms",
+            PingLine(REPLY, 0, 117, 14.5, None),
+        ),
+        (
+            "[1697049601.000001] no answer yet for icmp_seq=2",
+            PingLine(LOST, 2, None, None, 1697049601.000001),
+        ),
+        ("Request timeout for icmp_seq 5", PingLine(LOST, 5, None, None, None)),
+        ("Request timeout", PingLine(LOST, None, None, None, None)),
+        (
+            "[1697049602.0] From 10.0.0.1 icmp_seq=4 Destination Host Unreachable",
+            PingLine(LOST, 4, None, None, 1697049602.0),
+        ),
+    ],
+)
+def test_parse(line, expected):
+    assert parse(line) == expected
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "PING 8.8.8.8 (8.8.8.8) 56(84) bytes of data.",
+        "--- 8.8.8.8 ping statistics ---",
+        "5 packets transmitted, 5 received, 0% packet loss, time 4005ms",
+        "rtt min/avg/max/mdev = 14.1/14.5/15.0/0.3 ms",
+        "",
+    ],
+)
+def test_parse_ignores_other_lines(line):
+    assert parse(line) is None
+
+
+def test_sequence_gaps_count_silent_losses():
+    tracker = SequenceTracker()
+    assert tracker.advance(1) == 0
+    assert tracker.advance(2) == 0
+    assert tracker.advance(5) == 2
+    assert tracker.advance(None) == 0
+
+
+def test_sequence_duplicates_and_late_replies_are_not_recounted():
+    tracker = SequenceTracker()
+    assert tracker.advance(1) == 0
+    assert tracker.advance(2) == 0
+    assert tracker.advance(2) is None  # DUP
+    assert tracker.advance(1) is None  # reply after its "no answer yet"
+    assert tracker.late == 2
+    assert tracker.advance(3) == 0
+
+
+def test_sequence_wraps_at_16_bits():
+    tracker = SequenceTracker(first=ping_parser.SEQ_MODULO - 2)
+    assert tracker.advance(ping_parser.SEQ_MODULO - 2) == 0
+    assert tracker.advance(ping_parser.SEQ_MODULO - 1) == 0
+    assert tracker.advance(1) == 1
+
+
+@pytest.mark.parametrize(
+    "output, expected",
+    [
+        (
+            "PING 8.8.8.8 (8.8.8.8) 56(84) bytes of data.\n"
+            "From 10.0.0.1 icmp_seq=1 Time to live exceeded\n\n"
+            "--- 8.8.8.8 ping statistics ---\n",
+            ("10.0.0.1", False),
+        ),
+        (
+            "From 2001:db8::1 icmp_seq=1 Time exceeded: Hop limit\n",
+            ("2001:db8::1", False),
+        ),
+        (
+            "64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=14.5 ms\n",
+            ("8.8.8.8", True),
+        ),
+        (
+            "64 bytes from 2001:4860:4860::8888: icmp_seq=1 ttl=57 time=20.1 ms\n",
+            ("2001:4860:4860::8888", True),
+        ),
+        ("PING 8.8.8.8 (8.8.8.8) 56(84) bytes of data.\n\n1 packets transmitted", None),
+    ],
+)
+def test_responder(output, expected):
+    assert ping_parser.responder(output) == expected
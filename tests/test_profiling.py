@@ -0,0 +1,50 @@
+import time
+
+import eventlet
+from eventlet.patcher import original
+
+import profiling
+
+real_sleep = original("time").sleep
+
+
+def test_disabled_timers_record_nothing():
+    timers = profiling.StageTimers(enabled=False)
+    with timers.stage("parse"):
+        pass
+    timers.record("tracepath", time.perf_counter_ns())
+    assert timers.summary() == {"enabled": False, "stages": {}}
+
+
+def test_stage_histograms():
+    timers = profiling.StageTimers(enabled=True)
+    for _ in range(10):
+        with timers.stage("parse"):
+            pass
+    with timers.stage("save"):
+        real_sleep(0.003)
+    timers.record("tracepath", time.perf_counter_ns() - 2_000_000)
+
+    stages = timers.summary()["stages"]
+    assert stages["parse"]["count"] == 10
+    assert stages["parse"]["p99_us"] <= 100
+    assert stages["save"]["p50_us"] == 5000
+    assert stages["tracepath"]["p50_us"] == 2500
+    timers.reset()
+    assert timers.summary()["stages"] == {}
+
+
+def test_sample_stacks_sees_busy_function():
+    def spin_here(seconds):
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            pass
+
+    thread = original("threading").Thread(target=spin_here, args=(0.3,))
+    thread.start()
+    stacks, samples = profiling.sample_stacks(thread.ident, 0.2, interval=0.002)
+    thread.join()
+    assert samples > 10
+    top = profiling.top_functions(stacks)
+    assert top[0]["function"] == "test_profiling.py:spin_here"
+    assert profiling.folded(stacks).splitlines()[0].endswith(f" {samples}")
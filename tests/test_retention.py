@@ -0,0 +1,90 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import database
+import retention
+
+
+def _insert_pings(target_id, ages_days):
+    now = datetime.now(timezone.utc)
+    conn = database.get_db()
+    rows = [
+        (target_id, (now - timedelta(days=d)).strftime("%Y-%m-%d %H:%M:%S"))
+        for d in ages_days
+    ]
+    conn.executemany(
+        "INSERT INTO pings (target_id, timestamp, latency, loss) VALUES (?, ?, 1.0, 0)",
+        rows,
+    )
+    conn.executemany(
+        "INSERT INTO hops (target_id, timestamp, hop_num, ip) VALUES (?, ?, 1, '10.0.0.1')",
+        rows,
+    )
+    database.update_rollups(conn, {(t, database._minute_bucket(ts)) for t, ts in rows})
+    conn.commit()
+    conn.close()
+
+
+def _count(table):
+    conn = database.get_db()
+    count = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_run_retention_prunes_in_batches(monkeypatch):
+    monkeypatch.setattr(retention, "RAW_RETENTION_DAYS", 7)
+    monkeypatch.setattr(retention, "MINUTE_ROLLUP_RETENTION_DAYS", 30)
+    target_id = database.get_or_create_target("8.8.8.8")
+    _insert_pings(target_id, [0, 1, 8, 9, 10, 11, 12, 40])
+
+    report = retention.run_retention(batch_size=2, pause=0)
+
+    assert report["pruned"]["pings"] == 6
+    assert report["pruned"]["hops"] == 6
+    assert report["pruned"]["pings_1m"] == 1
+    assert report["pruned"]["pings_1h"] == 0
+    # 6 rows in batches of 2 for pings and hops, plus the minute rollup
+    assert report["batches"] == 7
+    assert report["elapsed_ms"] >= 0
+    assert _count("pings") == 2
+    assert _count("pings_1m") == 7
+
+
+def test_run_retention_keeps_recent_data():
+    target_id = database.get_or_create_target("8.8.8.8")
+    _insert_pings(target_id, [0, 0.5])
+
+    report = retention.run_retention(pause=0)
+
+    assert sum(report["pruned"].values()) == 0
+    assert _count("pings") == 2
+
+
+def test_run_retention_prunes_expired_ip_info():
+    import time
+
+    now = time.time()
+    for n, expires_at in enumerate((now - 60, now - 1, now + 3600)):
+        database.save_ip_info(f"1.1.1.{n}", "isp", "-", expires_at)
+
+    report = retention.run_retention(batch_size=1, pause=0)
+
+    assert report["pruned"]["ip_info"] == 2
+    assert [r["ip"] for r in database.load_ip_info(now, 10)] == ["1.1.1.2"]
+
+
+def test_new_database_uses_incremental_vacuum():
+    conn = sqlite3.connect(database.DB_PATH)
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    conn.close()
+
+
+def test_reclaim_space_returns_free_pages():
+    target_id = database.get_or_create_target("8.8.8.8")
+    _insert_pings(target_id, [30 + i / 1000 for i in range(3000)])
+
+    report = retention.run_retention(pause=0)
+
+    assert report["pruned"]["pings"] == 3000
+    assert report["vacuumed_pages"] > 0
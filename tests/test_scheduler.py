@@ -0,0 +1,86 @@
+import eventlet
+import pytest
+
+from scheduler import ProbeScheduler
+
+
+def run_probes(sched, targets, hold=0.01, packets=1):
+    order = []
+
+    def probe(target):
+        with sched.slot(target, packets):
+            order.append(target)
+            eventlet.sleep(hold)
+
+    pool = eventlet.GreenPool()
+    for target in targets:
+        pool.spawn(probe, target)
+    pool.waitall()
+    return order
+
+
+def test_concurrency_cap():
+    sched = ProbeScheduler(max_concurrent=3, rate=0)
+    peak = [0]
+
+    def probe(i):
+        with sched.slot("t"):
+            peak[0] = max(peak[0], sched.active)
+            eventlet.sleep(0.01)
+
+    pool = eventlet.GreenPool()
+    for i in range(10):
+        pool.spawn(probe, i)
+    pool.waitall()
+    assert peak[0] == 3
+    assert sched.active == 0
+    assert sched.stats()["targets"]["t"]["grants"] == 10
+
+
+def test_round_robin_across_targets():
+    sched = ProbeScheduler(max_concurrent=1, rate=0)
+    # "a" queues five probes before "b" and "c" arrive, yet does not starve them
+    order = run_probes(sched, ["a"] * 5 + ["b", "c"])
+    assert order[:4] == ["a", "a", "b", "c"]
+    assert order.count("a") == 5
+
+
+def test_rate_budget_paces_grants():
+    sched = ProbeScheduler(max_concurrent=100, rate=50, burst=5)
+    started = eventlet.hubs.get_hub().clock()
+    run_probes(sched, ["t"] * 15, hold=0)
+    # 5 banked, the other 10 at 50 packets/s
+    assert eventlet.hubs.get_hub().clock() - started == pytest.approx(0.2, abs=0.08)
+    stats = sched.stats()["targets"]["t"]
+    assert stats["packets"] == 15
+    assert stats["max_wait_ms"] > 150
+
+
+def test_burst_larger_than_bucket_goes_into_debt():
+    sched = ProbeScheduler(max_concurrent=10, rate=100, burst=2)
+    with sched.slot("t", packets=5):
+        assert sched.tokens < 0
+
+
+def test_killed_waiter_leaves_queue():
+    sched = ProbeScheduler(max_concurrent=1, rate=0)
+    sched.acquire("a")
+    waiter = eventlet.spawn(sched.acquire, "b")
+    eventlet.sleep(0)
+    assert sched.stats()["queued"] == 1
+    waiter.kill()
+    assert sched.stats()["queued"] == 0
+    sched.release()
+    assert sched.active == 0
+
+
+def test_reservations_slow_the_shared_rate():
+    sched = ProbeScheduler(max_concurrent=100, rate=50, burst=5)
+    assert sched.reserve(25)
+    assert not sched.reserve(25)  # would leave nothing for short probes
+    started = eventlet.hubs.get_hub().clock()
+    run_probes(sched, ["t"] * 10, hold=0)
+    # 5 banked, the other 5 at the 25 packets/s left over
+    assert eventlet.hubs.get_hub().clock() - started == pytest.approx(0.2, abs=0.08)
+    sched.unreserve(25)
+    assert sched.stats()["streams"] == 0
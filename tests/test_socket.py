@@ -1,8 +1,31 @@
 import pytest
-from app import app, socketio, active_tasks
+import app as app_module
+from app import app, socketio, active_tasks, subscribers, pinned
+from emitter import FrameEmitter
 import database
 
 
+@pytest.fixture(autouse=True)
+def clean_probes(monkeypatch):
+    active_tasks.clear()
+    subscribers.clear()
+    pinned.clear()
+    monkeypatch.setattr(app_module, "frames", FrameEmitter(socketio))
+    yield
+    active_tasks.clear()
+    subscribers.clear()
+    pinned.clear()
+
+
+def deliver(frames):
+    """Flush one tick and ack it, as the dashboard does after rendering."""
+    frames.flush()
+    for session in frames.sessions.values():
+        if session.in_flight is not None:
+            frames.ack(session.sid, session.in_flight[0])
+        session.next_flush = 0
+
+
 @pytest.fixture
 def socket_client():
     app.config["TESTING"] = True
@@ -19,30 +42,195 @@ def test_start_stop_test(socket_client, mocker):
     target = "8.8.8.8"
     socket_client.emit("start_test", {"target": target})
 
-    # Check if target is in active_tasks
-    # Note: request.sid in app.py will be different, but we can check if it's populated
-    assert len(active_tasks) > 0
-    sid = list(active_tasks.keys())[0]
-    assert target in active_tasks[sid]
+    # The probe is keyed by target and the session is subscribed to it
+    assert target in active_tasks
+    assert len(subscribers[target]) == 1
     assert mock_spawn.call_count == 2
 
     # Test stop_test
     socket_client.emit("stop_test", {"target": target})
-    assert target not in active_tasks[sid]
+    assert target not in active_tasks
+    assert target not in subscribers
+    assert target not in database.get_active_targets()
+
+
+def test_stop_test_without_subscription_deactivates(socket_client, mocker):
+    mocker.patch("eventlet.spawn")
+    target = "8.8.8.8"
+    database.get_or_create_target(target)
+    pinned.add(target)
+    app_module.start_target_tasks(target)
+    assert target in database.get_active_targets()
+
+    socket_client.emit("stop_test", {"target": target})
+    assert target not in database.get_active_targets()
+    assert target not in pinned
+    assert target not in active_tasks
 
 
 def test_disconnect(socket_client, mocker):
     mocker.patch("eventlet.spawn")
     socket_client.emit("start_test", {"target": "8.8.8.8"})
-    sid = list(active_tasks.keys())[0]
-    assert sid in active_tasks
+    assert "8.8.8.8" in active_tasks
 
     socket_client.disconnect()
-    # After disconnect, the sid should be removed from active_tasks
-    assert sid not in active_tasks
+    # After the last subscriber disconnects the probe is stopped
+    assert "8.8.8.8" not in active_tasks
+    assert "8.8.8.8" not in subscribers
 
 
 def test_start_test_no_target(socket_client, mocker):
     mock_spawn = mocker.patch("eventlet.spawn")
     socket_client.emit("start_test", {})
     assert mock_spawn.call_count == 0
+
+
+def test_sessions_share_one_probe(socket_client, mocker):
+    from app import publish_ping, PingStats
+
+    mocker.patch("database.save_ping")
+    mock_spawn = mocker.patch("eventlet.spawn")
+    other = socketio.test_client(app)
+    target = "8.8.8.8"
+
+    socket_client.emit("start_test", {"target": target})
+    other.emit("start_test", {"target": target})
+
+    # Second subscriber joins the running probe instead of starting another
+    assert mock_spawn.call_count == 2
+    assert len(subscribers[target]) == 2
+
+    stats = PingStats()
+    stats.record(None, received=False)
+    publish_ping(target, 1, stats, None, "Request timeout")
+    deliver(app_module.frames)
+    assert [m["name"] for m in socket_client.get_received()] == ["batch"]
+    assert [m["name"] for m in other.get_received()] == ["batch"]
+
+    other.emit("stop_test", {"target": target})
+    assert target in active_tasks
+    assert target in database.get_active_targets()
+
+    socket_client.emit("stop_test", {"target": target})
+    assert target not in active_tasks
+    other.disconnect()
+
+
+def test_late_subscriber_gets_latest_results(socket_client, mocker):
+    from app import latest_results
+
+    mocker.patch("eventlet.spawn")
+    target = "8.8.8.8"
+    socket_client.emit("start_test", {"target": target})
+    latest_results[target] = {
+        "ping": {"target": target, "latency": 1.0},
+        "hops": {"10.0.0.1": {"target": target, "ip": "10.0.0.1"}},
+    }
+
+    other = socketio.test_client(app)
+    other.emit("start_test", {"target": target})
+    deliver(app_module.frames)
+    received = other.get_received()
+    assert [m["name"] for m in received] == ["batch"]
+    frame = received[0]["args"][0]
+    assert frame["ping"][target]["latencies"] == [1.0]
+    assert "10.0.0.1" in frame["hops"][target]
+    other.disconnect()
+
+
+def test_batch_frames_carry_only_changes(socket_client, mocker):
+    from app import publish_hop
+
+    mocker.patch("eventlet.spawn")
+    target = "8.8.8.8"
+    socket_client.emit("start_test", {"target": target})
+    hop = {"target": target, "num": "1", "ip": "10.0.0.1", "isp": "-", "loss": 0}
+
+    # Several updates within one tick collapse into a single frame
+    publish_hop(target, hop)
+    publish_hop(target, dict(hop, loss=5))
+    deliver(app_module.frames)
+    received = socket_client.get_received()
+    assert len(received) == 1
+    assert received[0]["args"][0]["hops"][target]["10.0.0.1"] == {
+        "num": "1",
+        "isp": "-",
+        "loss": 5,
+    }
+
+    publish_hop(target, dict(hop, loss=10))
+    deliver(app_module.frames)
+    delta = socket_client.get_received()[0]["args"][0]["hops"][target]
+    assert delta == {"10.0.0.1": {"loss": 10}}
+
+    # Nothing changed: no frame at all
+    publish_hop(target, dict(hop, loss=10))
+    deliver(app_module.frames)
+    assert socket_client.get_received() == []
+
+
+def test_raw_lines_are_opt_in(socket_client, mocker):
+    from app import publish_ping, PingStats
+
+    mocker.patch("eventlet.spawn")
+    mocker.patch("database.save_ping")
+    target = "8.8.8.8"
+    other = socketio.test_client(app)
+    socket_client.emit("start_test", {"target": target})
+    other.emit("start_test", {"target": target, "raw": True})
+
+    stats = PingStats()
+    for latency in (10.0, 12.0):
+        stats.record(latency)
+        publish_ping(target, 1, stats, latency, f"time={latency} ms")
+    deliver(app_module.frames)
+
+    plain = socket_client.get_received()[0]["args"][0]["ping"][target]
+    verbose = other.get_received()[0]["args"][0]["ping"][target]
+    assert plain["latencies"] == verbose["latencies"] == [10.0, 12.0]
+    assert "raw" not in plain
+    assert verbose["raw"] == ["time=10.0 ms", "time=12.0 ms"]
+    assert app_module.frames.stats()["unbatched_frames"] == 4
+    other.disconnect()
+
+
+def test_collector_keeps_probing_without_browser(socket_client, mocker, monkeypatch):
+    monkeypatch.setattr(app_module, "COLLECTOR_MODE", True)
+    mocker.patch("eventlet.spawn")
+    target = "8.8.8.8"
+    socket_client.emit("start_test", {"target": target})
+    assert target in pinned
+
+    # Closing the browser leaves the collector's probe running
+    socket_client.disconnect()
+    assert target in active_tasks
+    assert target in database.get_active_targets()
+
+    # Explicitly stopping the target does stop it
+    other = socketio.test_client(app)
+    other.emit("start_test", {"target": target})
+    other.emit("stop_test", {"target": target})
+    assert target not in active_tasks
+    assert target not in pinned
+    assert target not in database.get_active_targets()
+    other.disconnect()
+
+
+def test_sync_active_targets_staggers_starts(mocker):
+    spawn_after = mocker.patch("eventlet.spawn_after")
+    mocker.patch("eventlet.spawn")
+    for target in ("1.1.1.1", "8.8.8.8", "9.9.9.9", "example.com"):
+        database.get_or_create_target(target)
+
+    started = app_module.sync_active_targets(stagger=8)
+    assert sorted(started) == sorted(pinned)
+    assert [c.args[0] for c in spawn_after.call_args_list] == [0, 2, 4, 6]
+    for call in spawn_after.call_args_list:
+        call.args[1](*call.args[2:])
+    assert set(active_tasks) == set(started)
+
+    # Deactivated elsewhere: the next sync stops it
+    database.deactivate_target("9.9.9.9")
+    assert app_module.sync_active_targets(stagger=8) == []
+    assert "9.9.9.9" not in active_tasks
+    assert "9.9.9.9" not in pinned
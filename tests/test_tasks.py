@@ -6,15 +6,14 @@ import database
 
 def test_run_ping_logic(mocker):
     target = "8.8.8.8"
-    sid = "test_sid"
-    active_tasks[sid] = {target: {}}
+    active_tasks[target] = {}
 
     # Mock database
     mocker.patch("database.get_or_create_target", return_value=1)
     mock_save = mocker.patch("database.save_ping")
 
-    # Mock socketio.emit
-    mock_emit = mocker.patch("app.socketio.emit")
+    # Updates go to the frame emitter, which batches them per session
+    mock_publish = mocker.patch("app.frames.publish")
 
     # Mock subprocess.Popen
     mock_process = mocker.Mock()
@@ -25,17 +24,16 @@ def test_run_ping_logic(mocker):
     ]
     mocker.patch("subprocess.Popen", return_value=mock_process)
 
-    run_ping(target, sid)
+    run_ping(target)
 
     assert mock_save.called
-    assert mock_emit.called
-    assert active_tasks[sid][target]["ping"] == mock_process
+    assert mock_publish.called
+    assert active_tasks[target]["ping"] == mock_process
 
 
 def test_run_ping_timeout(mocker):
     target = "8.8.8.8"
-    sid = "test_sid"
-    active_tasks[sid] = {target: {}}
+    active_tasks[target] = {}
 
     mocker.patch("database.get_or_create_target", return_value=1)
     mock_save = mocker.patch("database.save_ping")
@@ -45,7 +43,7 @@ def test_run_ping_timeout(mocker):
     mock_process.stdout.readline.side_effect = ["Request timeout for icmp_seq 1", ""]
     mocker.patch("subprocess.Popen", return_value=mock_process)
 
-    run_ping(target, sid)
+    run_ping(target)
 
     assert mock_save.called
     # Check that latency was None (first arg of save_ping is target_id=1, second is latency)
@@ -55,12 +53,11 @@ def test_run_ping_timeout(mocker):
 
 def test_run_hop_analysis_logic(mocker):
     target = "8.8.8.8"
-    sid = "test_sid"
-    active_tasks[sid] = {target: {}}
+    active_tasks[target] = {}
 
     mocker.patch("database.get_or_create_target", return_value=1)
     mock_save_hop = mocker.patch("database.save_hop")
-    mock_emit = mocker.patch("app.socketio.emit")
+    mock_publish = mocker.patch("app.frames.publish")
     mocker.patch("eventlet.sleep")  # Don't actually sleep
 
     # Mock tracepath process
@@ -76,51 +73,50 @@ def test_run_hop_analysis_logic(mocker):
 
     # Use a side effect to stop the loop after one iteration
     def run_side_effect(*args, **kwargs):
-        if sid in active_tasks:
-            del active_tasks[sid]
+        if target in active_tasks:
+            del active_tasks[target]
         return mock_ping_result
 
     mocker.patch("subprocess.run", side_effect=run_side_effect)
 
-    run_hop_analysis(target, sid)
+    run_hop_analysis(target)
 
     assert mock_save_hop.called
-    assert mock_emit.called
+    assert mock_publish.called
 
 
 def test_run_ping_aborted(mocker):
-    # Test case where sid is removed before ping starts
+    # Test case where the probe is stopped before ping starts
     target = "8.8.8.8"
-    sid = "test_sid"
-    # active_tasks[sid] is NOT present
+    # active_tasks[target] is NOT present
+    active_tasks.pop(target, None)
 
     mocker.patch("database.get_or_create_target", return_value=1)
     mock_process = mocker.Mock()
     mocker.patch("subprocess.Popen", return_value=mock_process)
 
-    run_ping(target, sid)
+    run_ping(target)
     assert mock_process.terminate.called
 
 
 def test_run_ping_stop_midway(mocker):
     target = "8.8.8.8"
-    sid = "test_sid"
-    active_tasks[sid] = {target: {}}
+    active_tasks[target] = {}
 
     mocker.patch("database.get_or_create_target", return_value=1)
     mock_process = mocker.Mock()
 
     # We want the loop to run twice.
-    # 1st call: returns a line, loop body runs, sid is present.
-    # 2nd call: returns a line, loop body runs, sid is GONE.
+    # 1st call: returns a line, loop body runs, probe is present.
+    # 2nd call: returns a line, loop body runs, probe is GONE.
 
     call_count = [0]
 
     def side_effect(*args, **kwargs):
         call_count[0] += 1
         if call_count[0] == 2:
-            if sid in active_tasks:
-                del active_tasks[sid]
+            if target in active_tasks:
+                del active_tasks[target]
             return "some line"
         if call_count[0] == 1:
             return "64 bytes from 8.8.8.8: time=10ms"
@@ -131,14 +127,13 @@ def test_run_ping_stop_midway(mocker):
     mocker.patch("database.save_ping")
     mocker.patch("app.socketio.emit")
 
-    run_ping(target, sid)
+    run_ping(target)
     assert mock_process.terminate.called
 
 
 def test_run_hop_analysis_stop_tracepath(mocker):
     target = "8.8.8.8"
-    sid = "test_sid"
-    active_tasks[sid] = {target: {}}
+    active_tasks[target] = {}
 
     mocker.patch("database.get_or_create_target", return_value=1)
     mock_tracepath = mocker.Mock()
@@ -148,52 +143,48 @@ def test_run_hop_analysis_stop_tracepath(mocker):
     def side_effect(*args, **kwargs):
         call_count[0] += 1
         if call_count[0] == 1:
-            del active_tasks[sid]
+            del active_tasks[target]
         return " 1: 192.168.1.1"
 
     mock_tracepath.stdout.readline.side_effect = side_effect
     mocker.patch("subprocess.Popen", return_value=mock_tracepath)
 
-    run_hop_analysis(target, sid)
+    run_hop_analysis(target)
     assert mock_tracepath.terminate.called
 
 
 def test_stop_target_tasks_exception(mocker):
     from app import stop_target_tasks
 
-    sid = "test_sid"
     target = "test_target"
     mock_proc = mocker.Mock()
     mock_proc.terminate.side_effect = Exception("error")
 
-    active_tasks[sid] = {target: {"ping": mock_proc}}
+    active_tasks[target] = {"ping": mock_proc}
 
     # Should not raise exception
-    stop_target_tasks(sid, target)
+    stop_target_tasks(target)
     assert mock_proc.terminate.called
-    assert target not in active_tasks[sid]
+    assert target not in active_tasks
 
 
 def test_run_ping_init_target_dict(mocker):
-    # Test line 47: if target not in active_tasks[sid]: active_tasks[sid][target] = {}
     target = "8.8.8.8"
-    sid = "test_sid"
-    active_tasks[sid] = {}  # sid exists but target dict doesn't
+    active_tasks[target] = {}  # probe registered but no process yet
 
     mocker.patch("database.get_or_create_target", return_value=1)
     mock_process = mocker.Mock()
     mock_process.stdout.readline.return_value = ""
     mocker.patch("subprocess.Popen", return_value=mock_process)
 
-    run_ping(target, sid)
-    assert target in active_tasks[sid]
-    assert "ping" in active_tasks[sid][target]
+    run_ping(target)
+    assert target in active_tasks
+    assert "ping" in active_tasks[target]
 
 
 def test_run_hop_analysis_stop_inner_loop(mocker):
     target = "8.8.8.8"
-    sid = "test_sid"
-    active_tasks[sid] = {target: {}}
+    active_tasks[target] = {}
 
     mocker.patch("database.get_or_create_target", return_value=1)
 
@@ -213,24 +204,24 @@ def test_run_hop_analysis_stop_inner_loop(mocker):
         "",
     ]
 
-    # We want to hit line 158:
-    # 155: while sid in active_tasks and target in active_tasks[sid]:
-    # 156:     for hop in hops:
-    # 157:         if sid not in active_tasks or target not in active_tasks[sid]:
-    # 158:             break
+    # We want to hit the break inside the per-hop loop:
+    #     while active_tasks.get(target) is probe:
+    #         for hop in hops:
+    #             if active_tasks.get(target) is not probe:
+    #                 break
 
     call_count = [0]
 
     def side_effect(*args, **kwargs):
         call_count[0] += 1
         # On first hop, we let it pass.
-        # On second hop, we want it to fail the check at 157.
-        # However, subprocess.run is called AFTER the check at 157.
-        # So on the FIRST call to subprocess.run (for hop 1), we delete the SID.
-        # Then when the loop continues to hop 2, the check at 157 will trigger.
+        # On second hop, we want it to fail the per-hop check.
+        # However, subprocess.run is called AFTER that check.
+        # So on the FIRST call to subprocess.run (for hop 1), we stop the probe.
+        # Then when the loop continues to hop 2, the check will trigger.
         if call_count[0] == 1:
-            if sid in active_tasks:
-                del active_tasks[sid]
+            if target in active_tasks:
+                del active_tasks[target]
         return mock_ping_result
 
     mocker.patch("subprocess.run", side_effect=side_effect)
@@ -238,5 +229,357 @@ def test_run_hop_analysis_stop_inner_loop(mocker):
     mocker.patch("database.save_hop")
     mocker.patch("app.socketio.emit")
 
-    run_hop_analysis(target, sid)
-    # The break at 158 is hit, then the outer loop condition is checked and it finishes
+    run_hop_analysis(target)
+    # The break is hit, then the outer loop condition is checked and it finishes
+
+
+class FakeProbeEngine:
+    failed = None
+
+    def __init__(self, results):
+        self.results = list(results)
+
+    def resolve(self, target):
+        return 2, "127.0.0.1"
+
+    def probe(self, address, family):
+        result = self.results.pop(0)
+        if not self.results:
+            del active_tasks["localhost"]
+        return result
+
+
+def test_run_ping_icmp_engine(mocker):
+    import app
+
+    target = "localhost"
+    active_tasks[target] = {}
+    reply = {"rtt_ms": 0.05, "seq": 0, "ttl": 64, "bytes": 64, "received_at": 1e9}
+    engine = FakeProbeEngine([reply, None])
+    mocker.patch.object(app, "probe_engine", engine)
+    mocker.patch("database.get_or_create_target", return_value=1)
+    mock_save = mocker.patch("database.save_ping")
+    mock_publish = mocker.patch("app.frames.publish")
+    mocker.patch("eventlet.sleep")
+    mock_popen = mocker.patch("subprocess.Popen")
+
+    run_ping(target)
+
+    assert not mock_popen.called
+    assert [c.args[1] for c in mock_save.call_args_list] == [0.05, None]
+    # Stored at the kernel receive time, not when the writer got to it
+    assert mock_save.call_args_list[0].args[3] == 1e9
+    first, second = [c.args[4] for c in mock_publish.call_args_list]
+    assert first["raw"] == "64 bytes from 127.0.0.1: icmp_seq=0 ttl=64 time=0.05 ms"
+    assert second["latency"] is None
+    assert second["loss"] == 50.0
+
+
+def test_run_ping_falls_back_when_icmp_engine_fails(mocker):
+    import app
+
+    target = "localhost"
+    active_tasks[target] = {}
+    engine = FakeProbeEngine([None])
+
+    def receiver_dies(address, family):
+        engine.failed = "receiver stopped"
+        return None
+
+    engine.probe = receiver_dies
+    mocker.patch.object(app, "probe_engine", engine)
+    mocker.patch("database.get_or_create_target", return_value=1)
+    mock_save = mocker.patch("database.save_ping")
+    mocker.patch("app.frames.publish")
+    mocker.patch("eventlet.sleep")
+    mock_process = mocker.Mock()
+    mock_process.stdout.readline.side_effect = [
+        "64 bytes from 127.0.0.1: icmp_seq=1 ttl=64 time=0.05 ms",
+        "",
+    ]
+    mock_popen = mocker.patch("subprocess.Popen", return_value=mock_process)
+
+    run_ping(target)
+
+    # The probe lost to the dying receiver is kept, then ping takes over
+    assert mock_popen.called
+    assert [c.args[1] for c in mock_save.call_args_list] == [None, 0.05]
+    assert active_tasks[target]["ping"] is mock_process
+    del active_tasks[target]
+
+
+def test_run_hop_analysis_probes_hops_concurrently(mocker):
+    import time
+    import eventlet
+    import app
+
+    target = "8.8.8.8"
+    active_tasks[target] = {}
+    mocker.patch("database.get_or_create_target", return_value=1)
+    mocker.patch("app.socketio.emit")
+    mocker.patch("app.get_ip_info", return_value={"isp": "-", "location": "-"})
+    mocker.patch.object(app, "HOP_PROBE_CONCURRENCY", 4)
+    mocker.patch.object(app, "HOP_REFRESH_INTERVAL", 0)
+
+    mock_tracepath = mocker.Mock()
+    mock_tracepath.stdout.readline.side_effect = [
+        f" {n}: 10.0.0.{n}" for n in range(1, 9)
+    ] + [""]
+    mocker.patch("subprocess.Popen", return_value=mock_tracepath)
+
+    in_flight, peak = [0], [0]
+
+    def slow_probe(target, ip):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        eventlet.sleep(0.1)
+        in_flight[0] -= 1
+        return 3, [1.0, 2.0], 2
+
+    mocker.patch("app.probe_hop", side_effect=slow_probe)
+
+    saved = []
+
+    def save_hop(*args):
+        saved.append(args)
+        if len(saved) == 8:
+            del active_tasks[target]
+
+    mocker.patch("database.save_hop", side_effect=save_hop)
+
+    started = time.monotonic()
+    run_hop_analysis(target)
+    elapsed = time.monotonic() - started
+
+    assert [s[1] for s in saved] == list(range(1, 9))
+    assert saved[0][3:] == (1.5, 33.33)
+    assert peak[0] == 4
+    # 8 hops at 4 at a time is two probe windows, not eight
+    assert elapsed < 0.5
+    # tracepath's scheduler slot was handed back once the path was known
+    assert app.probe_scheduler.active == 0
+
+
+def test_probe_hop_uses_configured_count(mocker):
+    import app
+
+    mocker.patch.object(app, "HOP_PROBE_COUNT", 5)
+    mocker.patch.object(app, "HOP_PROBE_INTERVAL", 0.5)
+    result = mocker.Mock()
+    result.stdout = "\n".join(
+        f"64 bytes from 10.0.0.1: icmp_seq={i} ttl=64 time=2.0 ms" for i in range(4)
+    )
+    mock_run = mocker.patch("subprocess.run", return_value=result)
+
+    assert app.probe_hop("t", "10.0.0.1") == (5, [2.0] * 4, 4)
+    command = mock_run.call_args.args[0]
+    assert command[command.index("-c") + 1] == "5"
+    assert command[command.index("-i") + 1] == "0.5"
+
+
+def test_hop_probes_fall_back_for_families_the_engine_lacks(mocker):
+    import socket
+
+    import app
+    from icmp_engine import IcmpProbeEngine
+
+    engine = IcmpProbeEngine()
+    engine._sockets[socket.AF_INET] = mocker.Mock()  # no IPv6 socket
+    mocker.patch.object(app, "probe_engine", engine)
+    mocker.patch.object(app, "HOP_PROBE_INTERVAL", 0)
+    result = mocker.Mock()
+    result.stdout = "64 bytes from 2001:db8::1: icmp_seq=1 ttl=64 time=2.0 ms"
+    mock_run = mocker.patch("subprocess.run", return_value=result)
+
+    assert engine.probe("2001:db8::1", socket.AF_INET6) is None
+    assert app.send_hop_probes("2001:db8::1")[2] == 1
+    assert mock_run.call_args.args[0][-1] == "2001:db8::1"
+
+
+def test_run_hop_analysis_enriches_hops_later(mocker):
+    import ip_info
+
+    target = "8.8.8.8"
+    probe = active_tasks[target] = {}
+    mocker.patch("database.get_or_create_target", return_value=1)
+    mocker.patch("database.save_hop")
+    mocker.patch("eventlet.sleep")
+    mock_publish = mocker.patch("app.frames.publish")
+
+    callbacks = []
+
+    def fake_async(ip, callback):
+        callbacks.append(callback)
+        return ip_info.PENDING
+
+    mocker.patch("app.get_ip_info_async", side_effect=fake_async)
+
+    mock_tracepath = mocker.Mock()
+    mock_tracepath.stdout.readline.side_effect = [" 1: 8.8.4.4", ""]
+    mocker.patch("subprocess.Popen", return_value=mock_tracepath)
+
+    def stop_probe(target, ip):
+        del active_tasks[target]
+        return None
+
+    mocker.patch("app.probe_hop", side_effect=stop_probe)
+
+    run_hop_analysis(target)
+    first = mock_publish.call_args_list[0].args[4]
+    assert first["isp"] == ip_info.PENDING["isp"]
+
+    # Metadata arrives after discovery: the hop is re-published enriched
+    active_tasks[target] = probe
+    callbacks[0]({"isp": "Google LLC", "location": "US"})
+    enriched = mock_publish.call_args_list[-1].args[4]
+    assert enriched["ip"] == "8.8.4.4"
+    assert enriched["isp"] == "Google LLC"
+    del active_tasks[target]
+
+
+def test_run_ping_fills_sequence_gaps_at_probe_time(mocker):
+    target = "8.8.8.8"
+    active_tasks[target] = {}
+    mocker.patch("database.get_or_create_target", return_value=1)
+    mock_save = mocker.patch("database.save_ping")
+    mocker.patch("app.frames.publish")
+
+    mock_process = mocker.Mock()
+    mock_process.stdout.readline.side_effect = [
+        "PING 8.8.8.8 (8.8.8.8) 56(84) bytes of data.",
+        "[100.5] 64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=14.5 ms",
+        "[101.5] 64 bytes from 8.8.8.8: icmp_seq=2 ttl=117 time=14.0 ms",
+        "[101.6] 64 bytes from 8.8.8.8: icmp_seq=2 ttl=117 time=14.1 ms (DUP!)",
+        "[104.5] 64 bytes from 8.8.8.8: icmp_seq=5 ttl=117 time=15.0 ms",
+        "",
+    ]
+    popen = mocker.patch("subprocess.Popen", return_value=mock_process)
+
+    run_ping(target)
+
+    assert popen.call_args.args[0][:3] == ["/usr/bin/ping", "-D", "-O"]
+    saved = [(c.args[1], c.args[3]) for c in mock_save.call_args_list]
+    # Sequences 3 and 4 never printed a line; they count as lost when 5 arrives
+    assert saved == [
+        (14.5, 100.5),
+        (14.0, 101.5),
+        (None, 102.5),
+        (None, 103.5),
+        (15.0, 104.5),
+    ]
+
+
+def test_run_hop_analysis_rediscovers_changed_route(mocker):
+    import app
+
+    target = "8.8.8.8"
+    active_tasks[target] = {}
+    mocker.patch("database.get_or_create_target", return_value=1)
+    mocker.patch("database.save_hop")
+    mocker.patch("app.get_ip_info_async", return_value={"isp": "-", "location": "-"})
+    mock_emit = mocker.patch("app.socketio.emit")
+    mocker.patch("app.frames.publish")
+    mocker.patch.object(app, "HOP_REFRESH_INTERVAL", 0)
+    mocker.patch.object(app, "PATH_CHECK_INTERVAL", 1e-6)
+    mocker.patch.object(app.probe_metrics, "path_changes", 0)
+
+    def tracepath(*hops):
+        process = mocker.Mock()
+        process.stdout.readline.side_effect = [
+            f" {n}: {ip}" for n, ip in enumerate(hops, 1)
+        ] + [""]
+        return process
+
+    mocker.patch(
+        "subprocess.Popen",
+        side_effect=[
+            tracepath("10.0.0.1", "10.1.0.1", target),
+            tracepath("10.0.0.1", "10.2.0.1", target),
+        ],
+    )
+    # TTL 2 now answers from a different router
+    mocker.patch(
+        "app.probe_ttl",
+        side_effect=lambda t, ttl: {1: ("10.0.0.1", False), 2: ("10.2.0.1", False)}.get(
+            ttl, (target, True)
+        ),
+    )
+    mock_record = mocker.patch(
+        "database.record_path",
+        side_effect=[None, [(1, "10.0.0.1"), (2, "10.1.0.1"), (3, target)], None],
+    )
+
+    cycles = []
+
+    def probe_hop(target, ip):
+        cycles.append(ip)
+        if len(cycles) == 6:
+            del active_tasks[target]
+        return 1, [1.0], 1
+
+    mocker.patch("app.probe_hop", side_effect=probe_hop)
+
+    run_hop_analysis(target)
+
+    assert cycles[3:] == ["10.0.0.1", "10.2.0.1", target]
+    assert mock_record.call_args_list[1].args == (
+        1,
+        [(1, "10.0.0.1"), (2, "10.2.0.1"), (3, target)],
+    )
+    assert app.probe_metrics.path_changes == 1
+    (event,) = [
+        c.args[1] for c in mock_emit.call_args_list if c.args[0] == "path_change"
+    ]
+    assert event["changes"] == [{"ttl": 2, "old": "10.1.0.1", "new": "10.2.0.1"}]
+    assert [h["ip"] for h in event["hops"]] == ["10.0.0.1", "10.2.0.1", target]
+
+
+def test_ping_processes_do_not_hold_probe_slots(mocker):
+    import eventlet
+    from eventlet.event import Event
+
+    import app
+    from scheduler import ProbeScheduler
+
+    sched = ProbeScheduler(max_concurrent=2, rate=5.5)
+    mocker.patch.object(app, "probe_scheduler", sched)
+    mocker.patch("database.get_or_create_target", return_value=1)
+    mocker.patch("database.save_ping")
+    mocker.patch("app.frames.publish")
+    mock_emit = mocker.patch("app.socketio.emit")
+
+    finished = Event()
+
+    def long_running_ping(*args, **kwargs):
+        process = mocker.Mock()
+        process.stdout.readline.side_effect = lambda: finished.wait() or ""
+        return process
+
+    mocker.patch("subprocess.Popen", side_effect=long_running_ping)
+
+    targets = [f"10.0.0.{n}" for n in range(1, 7)]
+    for target in targets:
+        active_tasks[target] = {}
+    pool = eventlet.GreenPool()
+    for target in targets:
+        pool.spawn(run_ping, target)
+    eventlet.sleep(0.6)
+
+    # Five pings fit in the 5.5 pps budget, three more than max_concurrent;
+    # the sixth is refused straight away rather than queued forever
+    assert sum("ping" in active_tasks[t] for t in targets) == 5
+    assert sched.streams == 5 and sched.active == 0
+    (error,) = [c for c in mock_emit.call_args_list if c.args[0] == "error"]
+    assert "budget" in error.args[1]["message"]
+    assert error.kwargs["to"] == app.target_room(targets[-1])
+
+    # Short probes still get their slots
+    with eventlet.Timeout(1):
+        with sched.slot("10.0.0.1"):
+            pass
+
+    finished.send()
+    pool.waitall()
+    assert sched.streams == 0 and sched.reserved == 0
+    for target in targets:
+        del active_tasks[target]